@@ -325,6 +325,27 @@ class GitInterface:
 
         return tagL
 
+    def listChangedFiles(self, base_ref, untracked=True):
+        """
+        Returns a sorted list of the files that differ between 'base_ref' and
+        the working tree (committed or not), as paths relative to the root
+        directory.  If 'untracked' is True, new files that have not been
+        added are included (but not files ignored by Git).
+        """
+        x,out = self.run( 'diff --name-only -z', pipes.quote( base_ref ), '--',
+                          capture=True )
+        fileS = set( [ f for f in out.split( '\0' ) if f.strip() ] )
+
+        if untracked:
+            x,out = self.run( 'ls-files --others --exclude-standard',
+                              '--full-name -z', capture=True )
+            fileS.update( [ f for f in out.split( '\0' ) if f.strip() ] )
+
+        fileL = list( fileS )
+        fileL.sort()
+
+        return fileL
+
     def gitVersion(self):
         ""
         x,out = self.run( '--version', capture=True )
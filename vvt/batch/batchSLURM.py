@@ -21,7 +21,7 @@ class BatchSLURM( batchitf.BatchInterface ):
 
         self.runcmd = batchitf.run_shell_command
 
-    def writeScriptHeader(self, job, fileobj):
+    def writeScriptHeader(self, job, fileobj, logfile=None):
         ""
         qtime = batchitf.format_time_to_HMS( job.getRunTime() )
 
@@ -29,10 +29,13 @@ class BatchSLURM( batchitf.BatchInterface ):
         if not nnodes:
             nnodes = 1
 
+        if logfile == None:
+            logfile = job.getLogFileName()
+
         batchitf.lineprint( fileobj,
             '#SBATCH --nodes=' + str( nnodes ),
             '#SBATCH --time=' + qtime,
-            '#SBATCH --output=' + job.getLogFileName() )
+            '#SBATCH --output=' + logfile )
 
         qname = job.getQueueName()
         if qname != None:
@@ -53,6 +56,50 @@ class BatchSLURM( batchitf.BatchInterface ):
 
         return jid,out,err
 
+    def writeArrayScript(self, jobs, fileobj, logfile):
+        """
+        The array script runs the job script selected by the task id.  Each
+        job script writes to its own log file, while the batch system output
+        goes to 'logfile' (which can contain %a for the task index).
+        """
+        self.writeScriptShebang( jobs[0], fileobj )
+        self.writeScriptHeader( jobs[0], fileobj, logfile=logfile )
+
+        batchitf.lineprint( fileobj, 'case "$SLURM_ARRAY_TASK_ID" in' )
+        for i,job in enumerate( jobs ):
+            fileobj.write( '  ' + str(i) + ') exec /bin/bash -l "' +
+                           job.getBatchFileName() + '" > "' +
+                           job.getLogFileName() + '" 2>&1 ;;\n' )
+        batchitf.lineprint( fileobj,
+            '  *) echo "unknown array task id $SLURM_ARRAY_TASK_ID"; exit 1 ;;',
+            'esac' )
+
+    def submitJobArray(self, jobs, batchfile):
+        """
+        Writes the array script and submits all the jobs with one sbatch.
+        The task job ids are the array job id, an underscore, and the task
+        index.
+        """
+        logfile = os.path.splitext( os.path.abspath( batchfile ) )[0] + \
+                  '_%a.log'
+
+        fp = open( batchfile, 'w' )
+        try:
+            self.writeArrayScript( jobs, fp, logfile )
+        finally:
+            fp.close()
+
+        cmd = 'sbatch --array=0-' + str( len(jobs)-1 ) + ' ' + batchfile
+        x,out,err = self.runcmd( cmd )
+
+        jid = parse_submit_output_for_job_id( out )
+        if jid == None:
+            return None,out,err
+
+        jobids = [ jid+'_'+str(i) for i in range( len(jobs) ) ]
+
+        return jobids,out,err
+
     def queryQueue(self, jobtable):
         """
         Some squeue -o format codes:
@@ -66,7 +113,8 @@ class BatchSLURM( batchitf.BatchInterface ):
             %S actual or expected start time
             %M time used by the job (an INVALID is possible)
         """
-        x,out,err = self.runcmd( 'squeue --noheader -o "%i _ %t _ %S _ %M"' )
+        x,out,err = self.runcmd( 'squeue --noheader --array '
+                                 '-o "%i _ %t _ %S _ %M"' )
 
         parse_queue_table_output( jobtable, out )
 
@@ -118,6 +166,10 @@ def parse_queue_table_output( jqtab, out ):
                 CF(configuring), CG (completing), CD (completed),
                 F (failed), TO (timeout), NF (node failure),
                 RV (revoked), SE (special exit state)
+
+    Array job tasks are listed as <array id>_<task index>, and pending tasks
+    may be combined, such as 7291810_[3-5,8%2], which sets the state of each
+    task.
     """
     for line in out.strip().split( os.linesep ):
 
@@ -144,7 +196,35 @@ def parse_queue_table_output( jqtab, out ):
                 startdate = parse_date_string( sL[2].strip() )
                 timeused = parse_elapsed_time_string( sL[3].strip() )
 
-                jqtab.setJobInfo( jid, st, startdate, timeused )
+                for tid in expand_array_job_id( jid ):
+                    jqtab.setJobInfo( tid, st, startdate, timeused )
+
+
+def expand_array_job_id( jid ):
+    """
+    Returns a list of job ids.  A plain job id or a single array task (such
+    as 123_4) is returned as is, while a task range like 123_[1-3,7%2] is
+    expanded to 123_1, 123_2, 123_3, 123_7.
+    """
+    if not jid.endswith( ']' ) or '_[' not in jid:
+        return [ jid ]
+
+    base,spec = jid[:-1].split( '_[', 1 )
+    spec = spec.split( '%', 1 )[0]  # remove the throttle limit
+
+    jidL = []
+    try:
+        for rng in spec.split( ',' ):
+            if '-' in rng:
+                i1,i2 = rng.split( '-', 1 )
+                for i in range( int(i1), int(i2)+1 ):
+                    jidL.append( base+'_'+str(i) )
+            elif rng.strip():
+                jidL.append( base+'_'+str( int(rng) ) )
+    except Exception:
+        return [ jid ]
+
+    return jidL
 
 
 def parse_date_string( dstr ):
@@ -24,8 +24,10 @@ construct one of the derived classes, then
     1. Construct BatchJob instances
     2. Write job script with writeJob()
     3. Submit job instances to the queue using submit()
-    4. Call poll() periodically
-    5. Use the BatchJob interface to determine the status of jobs
+    4. Call poll() periodically, or call startPolling() to have a background
+       thread do it
+    5. Use the BatchJob interface to determine the status of jobs, or use
+       wait() and BatchJob.addDoneCallback() to be told when they finish
 
 Concrete implementations (derived classes) interact with a given batch system
 by submitting script files and querying their status using shell commands.
@@ -58,6 +60,8 @@ class BatchInterface:
 
         self.thread_lock = threading.Lock()
 
+        self.poller = None
+
     # job management interface
 
     def writeJob(self, job):
@@ -97,10 +101,50 @@ class BatchInterface:
         job.setQueueDates( submit=time.time() )
         job.setSubmitOutput( out=out, err=err )
 
+    def submitArray(self, jobs, batchfile):
+        """
+        Add a list of BatchJob instances to the queue as a single array job,
+        which avoids a submission for every job.  The jobs must have the same
+        shape (see job_shape()) and their scripts must already be written.
+        The 'batchfile' is the name of the array script to write.
+
+        If the batch system does not support arrays, the jobs are submitted
+        one at a time.
+        """
+        if len( set( [ job_shape( job ) for job in jobs ] ) ) > 1:
+            raise ValueError( 'the jobs in an array must have the same '
+                              'number of nodes, run time, queue and account' )
+
+        try:
+            jobids,out,err = self.submitJobArray( jobs, batchfile )
+
+        except NotImplementedError:
+            for job in jobs:
+                self.submit( job )
+            return
+
+        except Exception:
+            err = traceback.format_exc()
+            out = ''
+            jobids = None
+
+        if jobids == None:
+            err += '\n*** array submit appears to have failed ***\n'
+
+        tm = time.time()
+        for i,job in enumerate( jobs ):
+            if jobids != None:
+                job.setJobId( jobids[i] )
+                self.addJob( job )
+            job.setQueueDates( submit=tm )
+            job.setSubmitOutput( out=out, err=err )
+
     def poll(self):
         """
         Query the queue and update the BatchJob objects that are in flight.
         """
+        finishedL = []
+
         self.thread_lock.acquire()
         try:
             jqtab = JobQueueTable()
@@ -112,10 +156,83 @@ class BatchInterface:
 
                 if job.isFinished():
                     self.removeJob( jid )
+                    finishedL.append( job )
 
         finally:
             self.thread_lock.release()
 
+        # callbacks are run without the lock so they can use this object
+        for job in finishedL:
+            job.notifyFinished()
+
+    def startPolling(self, poll_interval=5):
+        """
+        Start a background thread that calls poll() every 'poll_interval'
+        seconds.  Does nothing if the thread is already running.
+        """
+        if self.poller == None:
+            self.poller = AutoPoller( self.poll, poll_interval )
+
+    def stopPolling(self):
+        """
+        Stop the background polling thread, if running.
+        """
+        if self.poller != None:
+            self.poller.stop()
+            self.poller = None
+
+    def isPolling(self):
+        ""
+        return self.poller != None
+
+    def wait(self, jobs, timeout=None):
+        """
+        Wait for the given BatchJob instances to finish, or until 'timeout'
+        seconds pass.  Returns a pair of lists ( done jobs, not done jobs ).
+
+        If the background poller is not running, then poll() is called from
+        this thread.  Jobs that failed to submit are never done.
+        """
+        tstart = time.time()
+
+        doneL = []
+        waitL = []
+        for job in jobs:
+            if job.isFinished():
+                doneL.append( job )
+            else:
+                waitL.append( job )
+
+        while len(waitL) > 0:
+
+            if not self.isPolling():
+                self.poll()
+
+            stillL = []
+            for job in waitL:
+                if job.getJobId() != None and job.wait( 0 ):
+                    doneL.append( job )
+                else:
+                    stillL.append( job )
+            waitL = stillL
+
+            if len(waitL) == 0:
+                break
+
+            ival = 1
+            if timeout != None:
+                remain = timeout - ( time.time() - tstart )
+                if remain <= 0:
+                    break
+                ival = min( ival, remain )
+
+            if self.isPolling() and waitL[0].getJobId() != None:
+                waitL[0].wait( ival )
+            else:
+                time.sleep( ival )
+
+        return doneL, waitL
+
     def cancel(self, *jobs, **kwargs):
         """
         Cancel a set of jobs, or if no jobs are specified, then cancel all
@@ -166,6 +283,15 @@ class BatchInterface:
         """
         raise NotImplementedError( "Method submit()" )
 
+    def submitJobArray(self, jobs, batchfile):
+        """
+        Optional.  Write and submit an array job that runs each of the given
+        jobs as one task.  Return ( jobids, stdout, stderr ) where 'jobids'
+        is a list of the task job ids (in the order of 'jobs'), or None if
+        the submission fails.
+        """
+        raise NotImplementedError( "Method submitJobArray()" )
+
     def queryQueue(self, jobtable):
         """
         Fill the given JobQueueTable instance with a snapshot of the queue.
@@ -214,7 +340,7 @@ class BatchInterface:
 
         if not stop and curtime-last_check > tm:
 
-            start,stop = self.parseScriptDates( job.getLogFileName() )
+            start,stop = get_script_date_scanner( job ).scan()
 
             job.setScriptDates( start=start, stop=stop )
 
@@ -315,37 +441,76 @@ class BatchInterface:
 
     def parseScriptDates(self, filename):
         ""
-        start = None
-        stop = None
+        return ScriptDateScanner( filename ).scan()
 
-        if os.path.exists( filename ):
 
-            fp = open( filename, 'r' )
-            try:
-                started = False
-                line = fp.readline()
-                while line:
-
-                    if not started:
-                        L = line.split( 'SCRIPT START DATE:', 1 )
-                        if len(L) == 2:
-                            tm = parse_date_string( L[1].strip() )
-                            if tm:
-                                start = tm
-                            started = True
-
-                    L = line.split( 'SCRIPT STOP DATE:', 1 )
-                    if len(L) == 2:
-                        tm = parse_date_string( L[1].strip() )
-                        if tm:
-                            stop = tm
-
-                    line = fp.readline()
+class ScriptDateScanner:
+    """
+    Parses the script start and stop dates out of a job log file.  The file
+    offset is remembered between calls to scan(), so only the lines appended
+    since the last scan are read.
+    """
 
-            finally:
-                fp.close()
+    def __init__(self, filename):
+        ""
+        self.filename = filename
+
+        self.offset = 0
+        self.started = False
+        self.start = None
+        self.stop = None
+
+    def scan(self):
+        """
+        Read any new (complete) lines and return ( start date, stop date ).
+        """
+        try:
+            size = os.path.getsize( self.filename )
+        except Exception:
+            size = None
+
+        if size != None:
+
+            if size < self.offset:
+                # the file was truncated or replaced; start over
+                self.__init__( self.filename )
+
+            if size > self.offset:
+                self._read_new_lines()
+
+        return self.start, self.stop
+
+    def _read_new_lines(self):
+        ""
+        fp = open( self.filename, 'rb' )
+        try:
+            fp.seek( self.offset )
+            buf = fp.read()
+        finally:
+            fp.close()
 
-        return start, stop
+        # a partial last line is left for the next scan
+        n = buf.rfind( b'\n' ) + 1
+        if n > 0:
+            self.offset += n
+            for line in buf[:n].splitlines():
+                self._parse_line( line.decode( 'utf-8', 'replace' ) )
+
+    def _parse_line(self, line):
+        ""
+        if not self.started:
+            L = line.split( 'SCRIPT START DATE:', 1 )
+            if len(L) == 2:
+                tm = parse_date_string( L[1].strip() )
+                if tm:
+                    self.start = tm
+                self.started = True
+
+        L = line.split( 'SCRIPT STOP DATE:', 1 )
+        if len(L) == 2:
+            tm = parse_date_string( L[1].strip() )
+            if tm:
+                self.stop = tm
 
 
 #############################################################################
@@ -427,6 +592,31 @@ class ThreadSafeMap:
         return list( self.store.items() )
 
 
+def job_shape( job ):
+    """
+    Jobs with the same shape can be submitted together as an array job.
+    """
+    ncores,nnodes = job.getProcessors()
+    return ( nnodes, job.getRunTime(), job.getQueueName(), job.getAccount() )
+
+
+def group_jobs_by_shape( jobs ):
+    """
+    Returns a list of lists of jobs, where the jobs in each list have the
+    same shape.  The order of the jobs is otherwise preserved.
+    """
+    groups = {}
+    grpL = []
+    for job in jobs:
+        shape = job_shape( job )
+        if shape not in groups:
+            groups[ shape ] = []
+            grpL.append( groups[ shape ] )
+        groups[ shape ].append( job )
+
+    return grpL
+
+
 def run_shell_command( cmd, verbose=False ):
     ""
     if verbose:
@@ -469,6 +659,19 @@ def set_parse_script_date( job, timevalue ):
     job.parse_script_date = timevalue
 
 
+def get_script_date_scanner( job ):
+    """
+    The ScriptDateScanner for the job log file is kept with the job so the
+    log can be read incrementally.
+    """
+    fname = job.getLogFileName()
+    scan = getattr( job, 'script_date_scanner', None )
+    if scan == None or scan.filename != fname:
+        scan = ScriptDateScanner( fname )
+        job.script_date_scanner = scan
+    return scan
+
+
 def lineprint( fileobj, *lines ):
     """
     """
@@ -590,6 +793,8 @@ def format_time_to_HMS( num_seconds ):
 
 class AutoPoller:
     """
+    Calls 'poll_function' every 'poll_interval' seconds in a daemon thread
+    until stop() is called.
     """
 
     def __init__(self, poll_function, poll_interval):
@@ -612,18 +817,19 @@ class AutoPoller:
 
     def pollLoop(self):
         ""
-        tstart = time.time()
-
         while True:
 
+            # returns early if stop() is called
+            self.stop_event.wait( self.ipoll )
+
             if self.isStopped():
                 break
 
-            if time.time() - tstart > self.ipoll:
+            try:
                 self.pollfunc()
-                tstart = time.time()
-
-            time.sleep(1)
+            except Exception:
+                sys.stderr.write( traceback.format_exc() )
+                sys.stderr.flush()
 
     def isStopped(self):
         ""
@@ -10,6 +10,7 @@ sys.excepthook = sys.__excepthook__
 import os
 import time
 import threading
+import traceback
 
 
 class BatchJob:
@@ -110,6 +111,9 @@ class BatchJob:
 
         self.lock = threading.Lock()
 
+        self.done_event = threading.Event()
+        self.callbacks = []
+
     # job specifications
 
     def setName(self, name): self.name = name
@@ -223,6 +227,51 @@ class BatchJob:
         set_date_attr( self.scriptdates, 'stop', stop )
         set_date_attr( self.scriptdates, 'done', done )
 
+    # completion notification
+
+    def addDoneCallback(self, func):
+        """
+        The function 'func' will be called with this job as the only argument
+        once the job is finished.  If the job is already finished, it is
+        called immediately.  Note that the call may be made from the
+        BatchInterface polling thread.
+        """
+        self.lock.acquire()
+        try:
+            notified = is_event_set( self.done_event )
+            if not notified:
+                self.callbacks.append( func )
+        finally:
+            self.lock.release()
+
+        if notified:
+            call_done_callback( func, self )
+
+    def wait(self, timeout=None):
+        """
+        Block until the job is finished or 'timeout' seconds pass.  Returns
+        True if the job finished.  Something must be polling the queue, such
+        as the BatchInterface background poller.
+        """
+        self.done_event.wait( timeout )
+        return is_event_set( self.done_event )
+
+    def notifyFinished(self):
+        """
+        Called by the BatchInterface once the job is finished.  Wakes up
+        waiting threads and runs the done callbacks.
+        """
+        self.lock.acquire()
+        try:
+            cbL = self.callbacks
+            self.callbacks = []
+            self.done_event.set()
+        finally:
+            self.lock.release()
+
+        for func in cbL:
+            call_done_callback( func, self )
+
     @thread_lock
     def testThreadLock(self, num_seconds):
         """
@@ -231,6 +280,25 @@ class BatchJob:
         time.sleep( num_seconds )
 
 
+def is_event_set( event ):
+    ""
+    if hasattr( event, 'is_set' ):
+        return event.is_set()
+    return event.isSet()
+
+
+def call_done_callback( func, job ):
+    """
+    Exceptions from a callback are printed but otherwise ignored, so one bad
+    callback does not stop the others (or kill the polling thread).
+    """
+    try:
+        func( job )
+    except Exception:
+        sys.stderr.write( traceback.format_exc() )
+        sys.stderr.flush()
+
+
 def set_date_attr( attrs, name, value ):
     """
     """
@@ -5,7 +5,6 @@
 # Government retains certain rights in this software.
 
 import sys
-sys.dont_write_bytecode = True
 sys.excepthook = sys.__excepthook__
 import os
 
@@ -5,7 +5,6 @@
 # Government retains certain rights in this software.
 
 import sys
-sys.dont_write_bytecode = True
 sys.excepthook = sys.__excepthook__
 import os
 
@@ -27,6 +26,10 @@ class RuntimeConfig:
        'include_all',       # boolean to turn off test inclusion filtering
        'runtime_range',     # [ minimum runtime, maximum runtime ]
        'runtime_sum',       # maximum accumulated runtime
+       'shard',             # ( shard index, number of shards )
+       'shard_runtimes',    # runtime history file used to weight the shards
+       'changed_files',     # list of changed files (absolute paths)
+       'input_index',       # an impact.InputIndex for the changed files
        'maxprocs',          # maximum number of processors, np
     ]
 
@@ -40,6 +43,8 @@ class RuntimeConfig:
         'postclean'  : 0,
         'timeout'    : None,
         'multiplier' : 1.0,
+        'idletimeout': None,
+        'failuresfirst': 0,
         'preclean'   : 1,
         'analyze'    : 0,
         'logfile'    : 1,
@@ -5,7 +5,6 @@
 # Government retains certain rights in this software.
 
 import sys
-sys.dont_write_bytecode = True
 sys.excepthook = sys.__excepthook__
 import os
 import re
@@ -33,6 +32,7 @@ class ScriptReader:
         self.speclineL = []  # list of [line number, raw spec string]
         self.specL = []  # list of ScriptSpec objects
         self.shebang = None  # a string, if not None
+        self.insertL = []  # insert directive files read, absolute paths
 
         self.readfile( filename )
 
@@ -54,6 +54,13 @@ class ScriptReader:
                 L.append( sspec )
         return L
 
+    def getInsertFiles(self):
+        """
+        Returns a list of the insert directive files that were read (including
+        files inserted by those files).
+        """
+        return list( self.insertL )
+
     vvtpat = re.compile( '[ \t]*#[ \t]*VVT[ \t]*:' )
 
     def readfile(self, filename):
@@ -216,6 +223,9 @@ class ScriptReader:
             raise TestSpecError( 'at ' + info + ' the insert ' + \
                             'directive failed: ' + str( sys.exc_info()[1] ) )
 
+        self.insertL.append( filename )
+        self.insertL.extend( inclreader.getInsertFiles() )
+
         return inclreader.getSpecList()
 
 
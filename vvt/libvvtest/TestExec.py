@@ -15,21 +15,30 @@ import traceback
 # after that in this number of seconds, it gets sent a SIGKILL
 interrupt_to_kill_timeout = 30
 
+# maximum number of seconds between checks for test activity
+max_activity_check_interval = 30
 
-class TestExec:
+
+class TestExec( object ):
     """
     Runs a test in the background and provides methods to poll and kill it.
     """
+
+    __slots__ = [ 'timeout', 'idlemon', 'rundir', 'resource_obj', 'handler',
+                  'pid', 'tstart', 'tstop', 'rusage',
+                  'timedout', 'hung', 'interrupted' ]
     
     def __init__(self):
         ""
         self.timeout = 0
+        self.idlemon = None
         self.rundir = None
         self.resource_obj = None
 
         self.pid = None
         self.tstart = None
         self.tstop = None
+        self.rusage = None
 
     def setRunDirectory(self, rundir):
         ""
@@ -47,6 +56,23 @@ class TestExec:
         ""
         return self.timeout
 
+    def setIdleTimeout(self, idle_timeout, watch_files=[]):
+        """
+        If 'idle_timeout' is positive, the test is interrupted after it has
+        produced no output (changes to the 'watch_files') and used no CPU
+        time for that many seconds.
+        """
+        if idle_timeout and idle_timeout > 0:
+            self.idlemon = ActivityMonitor( idle_timeout, watch_files )
+        else:
+            self.idlemon = None
+
+    def getIdleTimeout(self):
+        ""
+        if self.idlemon != None:
+            return self.idlemon.getIdleTimeout()
+        return 0
+
     def setExecutionHandler(self, handler):
         ""
         self.handler = handler
@@ -59,6 +85,12 @@ class TestExec:
         ""
         return self.resource_obj
 
+    def isRemote(self):
+        """
+        True if the test is launched on another host (through ssh).
+        """
+        return getattr( self.resource_obj, 'launcher', None ) != None
+
     def start(self, baseline=0):
         """
         Launches the child process.
@@ -66,6 +98,8 @@ class TestExec:
         assert self.pid == None
 
         self.timedout = 0  # holds time.time() if the test times out
+        self.hung = False  # True if interrupted due to inactivity
+        self.interrupted = False  # True if stopped early by interrupt()
         self.tstart = time.time()
 
         sys.stdout.flush() ; sys.stderr.flush()
@@ -75,6 +109,14 @@ class TestExec:
             # child process is the test itself
             self._prepare_and_execute_test( baseline )
 
+        if self.idlemon != None:
+            if self.isRemote():
+                # the local process is ssh, whose CPU time says nothing
+                # about the test, so only the watched files are used
+                self.idlemon.start( None, self.tstart )
+            else:
+                self.idlemon.start( self.pid, self.tstart )
+
     def getStartTime(self):
         ""
         return self.tstart
@@ -90,34 +132,66 @@ class TestExec:
 
         assert self.pid > 0
 
-        cpid,code = os.waitpid( self.pid, os.WNOHANG )
+        cpid,code,rusage = wait_for_process( self.pid )
 
         if cpid > 0:
 
             # test finished
 
             self.tstop = time.time()
+            if not self.isRemote():
+                # for a remote test, this would be the usage of ssh
+                self.rusage = rusage
 
             if self.timedout > 0:
                 exit_status = None
             else:
                 exit_status = decode_subprocess_exit_code( code )
 
-            self.handler.finishExecution( exit_status, self.timedout )
+            self.handler.finishExecution( exit_status, self.timedout,
+                                          self.hung, self.interrupted )
 
-        elif self.timeout > 0:
-            # not done .. check for timeout
+        elif self.timedout == 0:
+            # not done .. check for timeout and inactivity
             tm = time.time()
-            if tm-self.tstart > self.timeout:
-                if self.timedout == 0:
-                    # interrupt all processes in the process group
-                    self.signalJob( signal.SIGINT )
-                    self.timedout = tm
-                elif (tm - self.timedout) > interrupt_to_kill_timeout:
-                    # SIGINT isn't killing fast enough, use stronger method
-                    self.signalJob( signal.SIGTERM )
+            if self.timeout > 0 and tm-self.tstart > self.timeout:
+                # interrupt all processes in the process group
+                self.signalJob( signal.SIGINT )
+                self.timedout = tm
+            elif self.idlemon != None and self.idlemon.isIdle( tm ):
+                self.signalJob( signal.SIGINT )
+                self.timedout = tm
+                self.hung = True
+
+        elif (time.time() - self.timedout) > interrupt_to_kill_timeout:
+            # SIGINT isn't killing fast enough, use stronger method
+            self.signalJob( signal.SIGTERM )
 
         return self.tstop != None
+
+    def isHung(self):
+        """
+        True if the test was interrupted because of inactivity.
+        """
+        return self.tstart != None and self.hung
+
+    def interrupt(self):
+        """
+        Interrupts a running test the same way as a timeout, such as when
+        vvtest stops early.  The poll() method finishes the job as usual.
+        """
+        if self.tstart != None and self.tstop == None and self.timedout == 0:
+            self.signalJob( signal.SIGINT )
+            self.timedout = time.time()
+            self.interrupted = True
+
+    def getResourceUsage(self):
+        """
+        Returns the resource.struct_rusage of the finished test process, or
+        None if not available (os.wait4 is not supported on all platforms,
+        and the usage of a test run on another host is not known).
+        """
+        return self.rusage
     
     def signalJob(self, sig):
         """
@@ -154,7 +228,12 @@ class TestExec:
                 # this can only happen in baseline mode
                 os._exit(0)
             else:
-                x = group_exec_subprocess( cmd_list )
+                launcher = getattr( self.resource_obj, 'launcher', None )
+                if launcher != None:
+                    # the test runs on another host
+                    x = launcher.execute( cmd_list )
+                else:
+                    x = group_exec_subprocess( cmd_list )
                 os._exit(x)
 
         except:
@@ -164,6 +243,125 @@ class TestExec:
             os._exit(1)
 
 
+class ActivityMonitor:
+    """
+    Watches a running test for signs of life, which are changes in the size
+    or modification time of a set of files (such as the execute.log), and
+    increases in the CPU time used by the test process tree (read from /proc
+    when available).  If the process id is None, only the files are used.
+    """
+
+    def __init__(self, idle_timeout, watch_files=[]):
+        ""
+        self.idle = idle_timeout
+        self.files = list( watch_files )
+
+        # no point checking much more often than the timeout
+        self.interval = max( 1, min( max_activity_check_interval,
+                                     int( float(idle_timeout)/10 ) ) )
+
+        self.pid = None
+        self.tlast = None
+        self.tcheck = None
+        self.sig = None
+
+    def getIdleTimeout(self):
+        ""
+        return self.idle
+
+    def start(self, pid, start_time):
+        ""
+        self.pid = pid
+        self.tlast = start_time
+        self.tcheck = start_time
+        self.sig = None
+
+    def isIdle(self, curtime):
+        """
+        Returns True if no activity has been seen for the idle timeout.
+        """
+        if curtime - self.tcheck >= self.interval:
+
+            self.tcheck = curtime
+
+            sig = self.getActivitySignature()
+            if sig != self.sig:
+                self.sig = sig
+                self.tlast = curtime
+
+        return curtime - self.tlast > self.idle
+
+    def getActivitySignature(self):
+        ""
+        sig = []
+
+        for fn in self.files:
+            try:
+                st = os.stat( fn )
+                sig.append( ( st.st_size, st.st_mtime ) )
+            except Exception:
+                sig.append( None )
+
+        if self.pid != None:
+            sig.append( get_process_tree_cpu_time( self.pid ) )
+
+        return sig
+
+
+def get_process_tree_cpu_time( pid ):
+    """
+    Returns the total user plus system CPU time in seconds used by the given
+    process and all its descendants, or None if /proc is not available.
+    """
+    if not os.path.isdir( '/proc' ):
+        return None
+
+    ppids = {}  # process id -> parent process id
+    ticks = {}  # process id -> user + system + child user + child system
+
+    for name in os.listdir( '/proc' ):
+        if name.isdigit():
+            try:
+                fp = open( '/proc/'+name+'/stat', 'r' )
+                try:
+                    buf = fp.read()
+                finally:
+                    fp.close()
+                # the command name is in parens and may contain spaces
+                L = buf.rsplit( ')', 1 )[1].split()
+                ppids[ int(name) ] = int( L[1] )
+                ticks[ int(name) ] = sum( [ int(v) for v in L[11:15] ] )
+            except Exception:
+                pass
+
+    if pid not in ticks:
+        return None
+
+    tree = set( [ pid ] )
+    nprev = 0
+    while len(tree) > nprev:
+        nprev = len(tree)
+        for cpid,ppid in ppids.items():
+            if ppid in tree:
+                tree.add( cpid )
+
+    total = sum( [ ticks[cpid] for cpid in tree ] )
+
+    return float( total ) / float( os.sysconf( 'SC_CLK_TCK' ) )
+
+
+def wait_for_process( pid ):
+    """
+    Non-blocking wait on the given child process.  Returns ( child pid, exit
+    code, rusage ), where the rusage is None if os.wait4 is not available.
+    """
+    if hasattr( os, 'wait4' ):
+        return os.wait4( pid, os.WNOHANG )
+
+    cpid,code = os.waitpid( pid, os.WNOHANG )
+    return cpid, code, None
+
+
 def decode_subprocess_exit_code( exit_code ):
     ""
     if os.WIFEXITED( exit_code ):
@@ -186,6 +384,10 @@ def group_exec_subprocess( cmd, **kwargs ):
     The SIGTERM and SIGHUP signals are sent to the child group, but they also
     cause a SIGKILL to be sent after a short delay.
 
+    If the 'stdin_data' keyword argument is given, it is written to the
+    standard input of the subprocess, which is then left open until the
+    current process exits.
+
     This function modifies the current environment by registering signal
     handlers, so the intended use is something like this
 
@@ -198,9 +400,19 @@ def group_exec_subprocess( cmd, **kwargs ):
 
     terminate_delay = kwargs.pop( 'terminate_delay', 5 )
 
+    stdin_data = kwargs.pop( 'stdin_data', None )
+    if stdin_data != None:
+        kwargs[ 'stdin' ] = subprocess.PIPE
+
     kwargs[ 'preexec_fn' ] = lambda: os.setpgid( os.getpid(), os.getpid() )
     proc = subprocess.Popen( cmd, **kwargs )
 
+    if stdin_data != None:
+        if sys.version_info[0] > 2:
+            stdin_data = stdin_data.encode( 'utf-8' )
+        proc.stdin.write( stdin_data )
+        proc.stdin.flush()
+
     while True:
         try:
             x = proc.wait()
@@ -131,6 +131,42 @@ class TestList:
                 if xdir not in self.tcasemap:
                     self.tcasemap[ xdir ] = tcase
 
+    def writeBatchSpecs(self, filename):
+        """
+        Writes the tests in this container, fully constructed, to the given
+        file (see testlistio.write_batch_specs).
+        """
+        check_make_directory_containing_file( filename )
+        testlistio.write_batch_specs( filename,
+                                      list( self.tcasemap.values() ),
+                                      self.rundate )
+
+    def readBatchSpecs(self, filename):
+        """
+        Loads the tests written by writeBatchSpecs().  Returns False if the
+        file does not exist or could not be read, in which case the test
+        list file should be read instead.
+        """
+        if not os.path.exists( filename ):
+            return False
+
+        try:
+            rundate,tcaseL = testlistio.read_batch_specs( filename )
+        except Exception:
+            print3( '*** warning: could not read batch test specs file',
+                    filename+':', str( sys.exc_info()[1] ) )
+            return False
+
+        if rundate:
+            self.rundate = rundate
+
+        for tcase in tcaseL:
+            tspec = tcase.getSpec()
+            if tspec.getID() not in self.tcasemap:
+                self.tcasemap[ tspec.getID() ] = tcase
+
+        return True
+
     def readTestResults(self, resultsfilename=None):
         ""
         if resultsfilename == None:
@@ -7,18 +7,36 @@
 import os
 from os.path import basename
 
+try:
+    from sys import intern as intern_string
+except ImportError:
+    intern_string = intern  # python 2
+
 varname_chars_list = "abcdefghijklmnopqrstuvwxyz" + \
                      "ABCDEFGHIJKLMNOPQRSTUVWXYZ" + "0123456789_"
 
 
-class TestSpec:
+class TestSpec( object ):
     """
     Holds the contents of a test specification in memory.  Also stores
     arbitrary attributes, such as the results of an execution of the test.
     
     Many specifications allow filtering by platform, parameter value, and
     environment variable, and are referred to as "standard filtering".
+
+    There can be a very large number of these objects, so the data members
+    are slots, the strings are interned, and the file lists, execute
+    fragments and keywords are immutable (tuples and frozensets) so they
+    can be shared by the parameter instances of a test file.
     """
+
+    __slots__ = [ 'ctor_done', 'name', 'rootpath', 'filepath',
+                  'enabled', 'plat_enable', 'option_enable',
+                  'keywords', 'params', 'analyze_spec', 'timeout', 'memory',
+                  'preload', 'execL', 'lnfiles', 'cpfiles', 'baseline_files',
+                  'baseline_spec', 'src_files', 'insert_files', 'deps',
+                  'attrs', 'paramset', 'staged', 'first_stage', 'last_stage',
+                  'xdir', 'testid', 'displ' ]
     
     def getName(self):
         """
@@ -194,6 +212,13 @@ class TestSpec:
         """
         return self.timeout
 
+    def getMemory(self):
+        """
+        Returns the memory requirement of the test, in kilobytes (an integer).
+        Or None if not specified.
+        """
+        return self.memory
+
     def getPreloadLabel(self):
         ""
         return self.preload
@@ -205,7 +230,7 @@ class TestSpec:
         filename may be None if it was not specified (meaning the name should
         be the same as the name in the source directory).
         """
-        return [] + self.lnfiles
+        return list( self.lnfiles )
     
     def getCopyFiles(self):
         """
@@ -214,7 +239,7 @@ class TestSpec:
         filename may be None if it was not specified (meaning the name should
         be the same as the name in the source directory).
         """
-        return [] + self.cpfiles
+        return list( self.cpfiles )
 
     def getExecutionList(self):
         """
@@ -223,7 +248,7 @@ class TestSpec:
           ( name, fragment, exit status, analyze boolean )
         where 'name' is None for raw fragments and 'exit status' is a string.
         """
-        return [] + self.execL
+        return list( self.execL )
 
     def hasBaseline(self):
         """
@@ -237,7 +262,7 @@ class TestSpec:
         of files to be copied from the testing directory to the source
         directory.
         """
-        return self.baseline_files
+        return list( self.baseline_files )
 
     def getBaselineScript(self):
         """
@@ -322,6 +347,13 @@ class TestSpec:
         for tf,f in self.getBaselineFiles(): D[f] = None
         for f in self.src_files: D[f] = None
         return list( D.keys() )
+
+    def getInsertFiles(self):
+        """
+        Returns a list of the insert directive files (absolute paths) read
+        while parsing the test specification file.
+        """
+        return list( self.insert_files )
     
     ##########################################################
     
@@ -334,29 +366,31 @@ class TestSpec:
 
         self.ctor_done = False
 
-        self.name = name
-        self.rootpath = rootpath
-        self.filepath = filepath
+        self.name = intern_string( name )
+        self.rootpath = intern_string( rootpath )
+        self.filepath = intern_string( filepath )
 
         self.enabled = True
         self.plat_enable = []      # list of WordExpression
         self.option_enable = []    # list of WordExpression
 
-        self.keywords = set()      # set of strings
+        self.keywords = frozenset()  # frozenset of strings
         self.params = {}           # name string to value string
         self.analyze_spec = None
         self.timeout = None        # timeout value in seconds (an integer)
+        self.memory = None         # memory requirement in KB (an integer)
         self.preload = None        # a string label
-        self.execL = []            # list of
+        self.execL = ()            # tuple of
                                    #   (name, fragment, exit status, analyze)
                                    # where name is None when the
                                    # fragment is a raw fragment, exit status
                                    # is any string, and analyze is true/false
-        self.lnfiles = []          # list of (src name, test name)
-        self.cpfiles = []          # list of (src name, test name)
-        self.baseline_files = []   # list of (test name, src name)
+        self.lnfiles = ()          # tuple of (src name, test name)
+        self.cpfiles = ()          # tuple of (src name, test name)
+        self.baseline_files = ()   # tuple of (test name, src name)
         self.baseline_spec = None
-        self.src_files = []        # extra source files listed by the test
+        self.src_files = ()        # extra source files listed by the test
+        self.insert_files = ()     # insert directive files read by the test
         self.deps = []             # list of (xdir pattern, result expr)
         self.attrs = {}            # maps name string to value string; the
                                    # allowed characters are restricted
@@ -370,17 +404,37 @@ class TestSpec:
         self._set_identifiers()
 
         # always add the test specification file to the linked file list
-        self.lnfiles.append( (basename(self.filepath),None) )
+        self.lnfiles = ( (basename(self.filepath),None), )
     
     def __str__(self):
         return 'TestSpec(name=' + str(self.name) + ', xdir=' + self.xdir + ')'
 
+    def shareData(self, pool):
+        """
+        Replaces the immutable data members with equal values stored in the
+        'pool' dictionary (and adds the ones not there yet).  Using the same
+        pool for the parameter instances of a test file means each instance
+        references one copy of the file lists, execute fragments and
+        keywords instead of its own.
+        """
+        self.keywords = pool.setdefault( self.keywords, self.keywords )
+        self.execL = pool.setdefault( self.execL, self.execL )
+        self.lnfiles = pool.setdefault( self.lnfiles, self.lnfiles )
+        self.cpfiles = pool.setdefault( self.cpfiles, self.cpfiles )
+        self.baseline_files = pool.setdefault( self.baseline_files,
+                                               self.baseline_files )
+        self.src_files = pool.setdefault( self.src_files, self.src_files )
+        self.insert_files = pool.setdefault( self.insert_files,
+                                             self.insert_files )
+
     def _set_identifiers(self):
         ""
         idgen = IDGenerator( self.name, self.filepath, self.params, self.staged )
         self.xdir = idgen.computeExecuteDirectory()
         self.testid = idgen.computeID()
         self.displ = idgen.computeDisplayString()
+        if self.displ == self.xdir:
+            self.displ = self.xdir
 
     def setConstructionCompleted(self):
         ""
@@ -421,7 +475,8 @@ class TestSpec:
         """
         A list of strings.
         """
-        self.keywords = set( keyword_list )
+        kwL = [ intern_string( k ) for k in keyword_list ]
+        self.keywords = frozenset( kwL )
 
         # transfer TDD marks to the attributes
         if 'TDD' in self.keywords:
@@ -433,7 +488,8 @@ class TestSpec:
         directory.
         """
         self.params.clear()
-        self.params.update( param_dict )
+        for n,v in param_dict.items():
+            self.params[ intern_string( n ) ] = intern_string( v )
         self._set_identifiers()
 
     def setStagedParameters(self, is_first_stage, is_last_stage,
@@ -465,6 +521,15 @@ class TestSpec:
             timeout = int(timeout)
         self.timeout = timeout
 
+    def setMemory(self, memory):
+        """
+        Sets the memory requirement in kilobytes.  Sending in None will remove
+        the requirement.
+        """
+        if memory != None:
+            memory = int(memory)
+        self.memory = memory
+
     def setPreloadLabel(self, label):
         ""
         self.preload = label
@@ -474,7 +539,7 @@ class TestSpec:
         Append a raw execution fragment to this test.  The exit_status is any
         string.  The 'analyze' is either "yes" or "no".
         """
-        self.execL.append( (None, fragment, exit_status, analyze) )
+        self.execL = self.execL + ( (None, fragment, exit_status, analyze), )
     
     def appendNamedExecutionFragment(self, name, content, exit_status):
         """
@@ -485,7 +550,7 @@ class TestSpec:
         """
         assert name
         s = ' '.join( content.split() )  # remove embedded newlines
-        self.execL.append( (name, s, exit_status, False) )
+        self.execL = self.execL + ( (name, s, exit_status, False), )
    
     def addLinkFile(self, srcname, destname=None):
         """
@@ -497,7 +562,7 @@ class TestSpec:
         """
         assert srcname and not os.path.isabs( srcname )
         if (srcname,destname) not in self.lnfiles:
-            self.lnfiles.append( (srcname,destname) )
+            self.lnfiles = self.lnfiles + ( (srcname,destname), )
     
     def addCopyFile(self, srcname, destname=None):
         """
@@ -509,7 +574,7 @@ class TestSpec:
         """
         assert srcname and not os.path.isabs( srcname )
         if (srcname,destname) not in self.cpfiles:
-            self.cpfiles.append( (srcname,destname) )
+            self.cpfiles = self.cpfiles + ( (srcname,destname), )
     
     def addBaselineFile(self, test_dir_name, source_dir_name):
         """
@@ -517,7 +582,8 @@ class TestSpec:
         directory during baselining.
         """
         assert test_dir_name and source_dir_name
-        self.baseline_files.append( (test_dir_name, source_dir_name) )
+        self.baseline_files = self.baseline_files + \
+                                ( (test_dir_name, source_dir_name), )
 
     def setBaselineScript(self, script_spec):
         ""
@@ -528,7 +594,14 @@ class TestSpec:
         A list of file names needed by this test (this is in addition to the
         files to be copied, linked, and baselined.)
         """
-        self.src_files = [] + files
+        self.src_files = tuple( files )
+
+    def setInsertFiles(self, files):
+        """
+        The list of insert directive files (absolute paths) that contributed
+        to the test specification.
+        """
+        self.insert_files = tuple( files )
 
     def addDependency(self, xdir_pattern, result_word_expr):
         ""
@@ -544,15 +617,17 @@ class TestSpec:
         ts.enabled = self.enabled
         ts.plat_enable = list( self.plat_enable )
         ts.option_enable = list( self.option_enable )
-        ts.keywords = set( self.keywords )
+        ts.keywords = self.keywords
         ts.setParameters({})  # skip ts.params
         ts.analyze_spec = self.analyze_spec
         ts.timeout = self.timeout
-        ts.execL = list( self.execL )
-        ts.lnfiles = list( self.lnfiles )
-        ts.cpfiles = list( self.cpfiles )
-        ts.baseline_files = list( self.baseline_files )
+        ts.memory = self.memory
+        ts.execL = self.execL
+        ts.lnfiles = self.lnfiles
+        ts.cpfiles = self.cpfiles
+        ts.baseline_files = self.baseline_files
         ts.baseline_spec = self.baseline_spec
+        ts.insert_files = self.insert_files
         ts.deps = list( self.deps )
         ts.attrs.clear() ; self.attrs.update( self.attrs )
         return ts
@@ -605,7 +680,8 @@ class IDGenerator:
     def computeID(self):
         ""
         lst = [ self.filepath, self.name ]
-        lst.extend( self._get_parameters_as_list() )
+        for nv in self._get_parameters_as_list():
+            lst.append( intern_string( nv ) )
         return tuple( lst )
 
     def _get_parameters_as_list(self, compress_stage=False):
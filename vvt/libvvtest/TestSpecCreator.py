@@ -15,6 +15,7 @@ from . import FilterExpressions
 from .paramset import ParameterSet
 from .ScriptReader import ScriptReader, check_parse_attributes_section
 from .errors import TestSpecError
+from .vvplatform import parse_memory_size
 
 
 class TestCreator:
@@ -186,13 +187,16 @@ def createXmlTest( tname, filedoc, rootpath, relpath, force_params, evaluator ):
 
     # parse and set the rest of the XML file for each test
     
+    pool = {}
     for t in testL:
         parseKeywords          ( t, filedoc, tname )
         parse_include_platform ( t, filedoc )
         parseTimeouts          ( t, filedoc, evaluator )
+        parseMemory            ( t, filedoc, evaluator )
         parseExecuteList       ( t, filedoc, evaluator )
         parseFiles             ( t, filedoc, evaluator )
         parseBaseline          ( t, filedoc, evaluator )
+        t.shareData( pool )
 
     return testL
 
@@ -208,14 +212,18 @@ def createScriptTest( tname, vspecs, rootpath, relpath,
 
     check_add_analyze_test( paramset, testL, vspecs, evaluator )
 
+    pool = {}
     for t in testL:
+        t.setInsertFiles      ( vspecs.getInsertFiles() )
         parseKeywords_scr     ( t, vspecs, tname )
         parse_enable          ( t, vspecs )
         parseFiles_scr        ( t, vspecs, evaluator )
         parseTimeouts_scr     ( t, vspecs, evaluator )
+        parseMemory_scr       ( t, vspecs, evaluator )
         parseBaseline_scr     ( t, vspecs, evaluator )
         parseDependencies_scr ( t, vspecs, evaluator )
         parse_preload_label   ( t, vspecs, evaluator )
+        t.shareData( pool )
 
     return testL
 
@@ -377,6 +385,7 @@ def reparse_test_object( evaluator, testobj ):
         parseKeywords    ( testobj, filedoc, tname )
         parseFiles       ( testobj, filedoc, evaluator )
         parseTimeouts    ( testobj, filedoc, evaluator )
+        parseMemory      ( testobj, filedoc, evaluator )
         parseExecuteList ( testobj, filedoc, evaluator )
         parseBaseline    ( testobj, filedoc, evaluator )
 
@@ -401,9 +410,12 @@ def reparse_test_object( evaluator, testobj ):
             if not analyze_spec.startswith('-'):
                 testobj.addLinkFile( analyze_spec )
 
+        testobj.setInsertFiles( vspecs.getInsertFiles() )
+
         parseKeywords_scr ( testobj, vspecs, tname )
         parseFiles_scr    ( testobj, vspecs, evaluator )
         parseTimeouts_scr ( testobj, vspecs, evaluator )
+        parseMemory_scr   ( testobj, vspecs, evaluator )
         parseBaseline_scr ( testobj, vspecs, evaluator )
         parseDependencies_scr ( testobj, vspecs, evaluator )
         parse_preload_label   ( testobj, vspecs, evaluator )
@@ -860,6 +872,27 @@ def parseTimeouts_scr( t, vspecs, evaluator ):
             t.setTimeout( ival )
 
 
+def parseMemory_scr( t, vspecs, evaluator ):
+    """
+      #VVT: memory : 2G
+      #VVT: memory (parameters="np=8") : 500MB
+
+    where a plain number is in megabytes
+    """
+    tname = t.getName()
+    params = t.getParameters()
+    for spec in vspecs.getSpecList( 'memory' ):
+        if filterAttr_scr( spec.attrs, tname, params, evaluator, spec.lineno ):
+            sval = spec.value
+            try:
+                mem = parse_memory_size( sval )
+            except Exception:
+                raise TestSpecError( 'memory value must be a positive ' + \
+                            'size, such as 512 or 2G: "' + str(sval) + \
+                            '", line ' + str(spec.lineno) )
+            t.setMemory( mem )
+
+
 def parseBaseline_scr( t, vspecs, evaluator ):
     """
       #VVT: baseline : copyfrom,copyto copyfrom,copyto
@@ -1452,6 +1485,34 @@ def parseTimeouts( t, filedoc, evaluator ):
           t.setTimeout( to )
 
 
+def parseMemory( t, filedoc, evaluator ):
+    """
+    Parse test memory requirements for the test XML file.
+
+      <memory value="2G"/>
+      <memory parameters="np=8" value="500MB"/>
+    """
+    for nd in filedoc.matchNodes(['memory$']):
+
+      skip = 0
+      for n,v in nd.getAttrs().items():
+        isfa, istrue = filterAttr( n, v, t.getName(), t.getParameters(),
+                                   evaluator, str(nd.getLineNumber()) )
+        if isfa and not istrue:
+          skip = 1
+          break
+
+      if not skip and nd.hasAttr('value'):
+        val = nd.getAttr("value").strip()
+        try:
+          mem = parse_memory_size( val )
+        except Exception:
+          raise TestSpecError( 'memory value must be a positive size, ' + \
+                               'such as 512 or 2G: "' + val + \
+                               '", line ' + str(nd.getLineNumber()) )
+        t.setMemory( mem )
+
+
 def parseExecuteList( t, filedoc, evaluator ):
     """
     Parse the execute list for the test XML file.
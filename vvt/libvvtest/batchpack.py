@@ -0,0 +1,335 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import sys
+
+
+class BatchPacker:
+    """
+    Groups tests into batch jobs.  Tests connected by dependencies (such as
+    an analyze test and its children, or a chain of "depends on" tests) form
+    a unit that is kept within one job.  The units are packed with a first
+    fit decreasing algorithm on their processor-seconds (number of
+    processors times predicted runtime) into jobs that are a whole number
+    of nodes wide and whose estimated length is at most 'batch_length'.
+    The tests of a job run concurrently, so the length of each job is
+    estimated by simulating the schedule of its tests.
+
+    The predicted runtime of a test is the runtime recorded from previous
+    runs, or its timeout if no runtime is known.  Tests without a timeout
+    (and the tests connected to them) go into their own job with the
+    'no_timeout' length.
+
+    The time limit of a job is estimated the same way but with each test
+    running until its timeout, so that a test running longer than predicted
+    is stopped by its own timeout rather than by the batch system.
+    """
+
+    def __init__(self, node_size=1, batch_length=30*60, no_timeout=21*60*60):
+        ""
+        self.node_size = max( 1, int( node_size ) )
+        self.qlen = batch_length
+        self.no_timeout = no_timeout
+        self.numjobs = 0
+
+    def pack(self, tcaseL):
+        """
+        Returns a list of PackedJob objects, longest first.
+        """
+        jobL = []
+
+        unitL = []
+        for tests in find_dependency_units( tcaseL ):
+            unit = PackingUnit( tests )
+            if unit.runtimeUnknown():
+                jobL.append( self._make_job( unit, self.no_timeout ) )
+            elif not self.qlen or self.qlen <= 0:
+                # each test in its own job (except connected tests)
+                jobL.append( self._make_job( unit ) )
+            else:
+                unitL.append( unit )
+
+        unitL.sort( key=lambda u: ( -u.area, u.name ) )
+
+        openL = []
+        for unit in unitL:
+            for job in openL:
+                if job.fits( unit, self.qlen ):
+                    job.add( unit )
+                    break
+            else:
+                openL.append( self._make_job( unit ) )
+
+        for job in openL:
+            job.schedule()
+            jobL.append( job )
+
+        jobL.sort( key=lambda j: ( -j.length, j.index ) )
+
+        return jobL
+
+    def _make_job(self, unit, length=None):
+        ""
+        ncores = round_up( unit.width, self.node_size )
+        job = PackedJob( ncores, index=self.numjobs )
+        self.numjobs += 1
+        job.add( unit )
+        if length == None:
+            job.schedule()
+        else:
+            job.length = length
+            job.timelimit = length
+        return job
+
+
+class PackedJob:
+
+    def __init__(self, ncores, index=0):
+        ""
+        self.ncores = ncores
+        self.index = index
+        self.units = []
+        self.area = 0
+        self.length = 0
+        self.timelimit = 0
+
+    def getTests(self):
+        """
+        Returns the list of TestCase objects in this job.
+        """
+        tL = []
+        for unit in self.units:
+            tL.extend( unit.tests )
+        return tL
+
+    def getNumCores(self):
+        ""
+        return self.ncores
+
+    def getLength(self):
+        """
+        The estimated time in seconds to run all the tests in the job.
+        """
+        return self.length
+
+    def getTimeLimit(self):
+        """
+        The estimated time in seconds to run all the tests in the job if each
+        test runs until its timeout.
+        """
+        return self.timelimit
+
+    def fits(self, unit, max_length):
+        ""
+        if unit.width > self.ncores:
+            return False
+        if self.area + unit.area > self.ncores * max_length:
+            return False
+        return unit.critical <= max_length
+
+    def add(self, unit):
+        ""
+        self.units.append( unit )
+        self.area += unit.area
+
+    def schedule(self):
+        """
+        Estimates the job length and time limit by simulating a list schedule
+        of the tests (longest first, respecting dependencies) on the job's
+        processors.
+        """
+        tests = self.getTests()
+        self.length = simulate_schedule( tests, self.ncores )
+        self.timelimit = max( self.length,
+                              simulate_schedule( tests, self.ncores,
+                                                 timeout_runtime ) )
+        return self.length
+
+
+class PackingUnit:
+
+    def __init__(self, tests):
+        ""
+        self.tests = tests
+
+        self.width = 1
+        self.area = 0
+        self.unknown = False
+
+        rtD = {}
+        toD = {}
+        for tcase in tests:
+            np = get_num_procs( tcase )
+            rt = predicted_runtime( tcase )
+            if rt == None:
+                self.unknown = True
+                rt = 0
+            rtD[ id(tcase) ] = rt
+            toD[ id(tcase) ] = timeout_runtime( tcase ) or 0
+            self.width = max( self.width, np )
+            self.area += np * rt
+
+        self.critical = critical_path_length( tests, rtD )
+        self.critical_timeout = critical_path_length( tests, toD )
+
+        self.name = min( [ t.getSpec().getDisplayString() for t in tests ] )
+
+    def runtimeUnknown(self):
+        ""
+        return self.unknown
+
+
+def find_dependency_units( tcaseL ):
+    """
+    Partitions the tests into lists of tests connected by dependencies (in
+    either direction).  Dependencies on tests not in 'tcaseL' are ignored.
+    """
+    parent = {}
+    for tcase in tcaseL:
+        parent[ id(tcase) ] = id(tcase)
+
+    def find( i ):
+        while parent[i] != i:
+            parent[i] = parent[ parent[i] ]
+            i = parent[i]
+        return i
+
+    for tcase in tcaseL:
+        for dep in tcase.getDependencies():
+            if id(dep) in parent:
+                r1 = find( id(tcase) )
+                r2 = find( id(dep) )
+                if r1 != r2:
+                    parent[r1] = r2
+
+    unitD = {}
+    unitL = []
+    for tcase in tcaseL:
+        r = find( id(tcase) )
+        if r not in unitD:
+            unitD[r] = []
+            unitL.append( unitD[r] )
+        unitD[r].append( tcase )
+
+    return unitL
+
+
+def critical_path_length( tests, runtimes ):
+    """
+    Returns the longest sum of runtimes along a dependency chain.  The
+    'runtimes' maps id(TestCase) to seconds.
+    """
+    memo = {}
+
+    def finish( tcase ):
+        k = id(tcase)
+        if k not in memo:
+            memo[k] = 0  # guards against cycles
+            start = 0
+            for dep in tcase.getDependencies():
+                if id(dep) in runtimes:
+                    start = max( start, finish( dep ) )
+            memo[k] = start + runtimes[k]
+        return memo[k]
+
+    cp = 0
+    for tcase in tests:
+        cp = max( cp, finish( tcase ) )
+    return cp
+
+
+def simulate_schedule( tests, ncores, runtime_func=None ):
+    """
+    Returns the time to run the tests on 'ncores' processors, where a test
+    starts when its dependencies are done and enough processors are free,
+    longest tests first.  A test needing more than 'ncores' processors runs
+    alone.  The runtime of each test is given by 'runtime_func', which
+    defaults to predicted_runtime().
+    """
+    if runtime_func == None:
+        runtime_func = predicted_runtime
+
+    ids = set( [ id(t) for t in tests ] )
+
+    waiting = sorted( tests, key=lambda t: ( -( runtime_func(t) or 0 ),
+                                             t.getSpec().getDisplayString() ) )
+    done = set()
+    running = []  # list of ( finish time, np, id )
+    free = ncores
+    tnow = 0
+
+    while waiting or running:
+
+        started = False
+        for tcase in list( waiting ):
+            np = min( get_num_procs( tcase ), ncores )
+            ready = True
+            for dep in tcase.getDependencies():
+                if id(dep) in ids and id(dep) not in done:
+                    ready = False
+                    break
+            if ready and np <= free:
+                rt = runtime_func( tcase ) or 0
+                running.append( ( tnow + rt, np, id(tcase) ) )
+                free -= np
+                waiting.remove( tcase )
+                started = True
+
+        if running:
+            running.sort()
+            tfin,np,tid = running.pop(0)
+            tnow = max( tnow, tfin )
+            free += np
+            done.add( tid )
+        elif waiting and not started:
+            # only dependency cycles are left; run them in sequence
+            tcase = waiting.pop(0)
+            tnow += runtime_func( tcase ) or 0
+            done.add( id(tcase) )
+
+    return tnow
+
+
+def predicted_runtime( tcase ):
+    """
+    The runtime from previous runs, else the timeout.  None is returned for
+    tests without a timeout (a timeout of zero), because they may run for
+    any length of time.
+    """
+    tout = tcase.getSpec().getAttr( 'timeout', None )
+    if tout != None and tout < 1:
+        return None
+
+    rt = tcase.getStat().getRuntime( None )
+    if rt != None and rt >= 0:
+        return rt
+
+    return tout
+
+
+def timeout_runtime( tcase ):
+    """
+    The timeout of the test, else the predicted runtime.  None is returned
+    for tests without a timeout (a timeout of zero).
+    """
+    tout = tcase.getSpec().getAttr( 'timeout', None )
+    if tout != None:
+        if tout < 1:
+            return None
+        return tout
+
+    return predicted_runtime( tcase )
+
+
+def get_num_procs( tcase ):
+    ""
+    np = int( tcase.getSpec().getParameters().get( 'np', 0 ) )
+    return max( 1, np )
+
+
+def round_up( num, multiple ):
+    ""
+    return ( ( num + multiple - 1 ) // multiple ) * multiple
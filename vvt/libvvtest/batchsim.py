@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import sys
+import random
+
+from .batchpack import predicted_runtime, get_num_procs, round_up
+from .outpututils import pretty_time
+
+
+"""
+A batch queue simulated on a virtual clock.  The batch jobs made by the
+Batcher (the same ones a real --batch run would submit) "run" for their
+predicted length, which comes from the previous runtimes of their tests.
+The result is a prediction of the wall time (makespan) of the whole run and
+of how well the nodes are used, without spending any real queue time.
+"""
+
+
+class SimulatedCluster:
+
+    def __init__(self, num_nodes=None, ppn=1, queue_wait=None, seed=1):
+        """
+        If 'num_nodes' is None, the cluster has as many nodes as needed.  The
+        'queue_wait' is a QueueWaitModel (defaults to no wait).
+        """
+        self.nnodes = num_nodes
+        self.ppn = max( 1, int( ppn ) )
+        if queue_wait == None:
+            queue_wait = QueueWaitModel()
+        self.wait = queue_wait
+        self.rand = random.Random( seed )
+
+    def getNumNodes(self): return self.nnodes
+    def getCoresPerNode(self): return self.ppn
+    def getQueueWait(self): return self.wait
+
+    def sampleQueueWait(self):
+        ""
+        return self.wait.sample( self.rand )
+
+    def numNodesForCores(self, ncores):
+        ""
+        return max( 1, round_up( ncores, self.ppn ) // self.ppn )
+
+
+class QueueWaitModel:
+    """
+    The time a job waits in the queue before it can start.  The spec string
+    is one of
+
+        SECONDS            : a fixed wait
+        uniform:MIN:MAX    : uniformly distributed between MIN and MAX
+        exp:MEAN           : exponentially distributed with the given mean
+    """
+
+    def __init__(self, spec='0'):
+        ""
+        self.spec = spec.strip()
+
+        L = self.spec.split( ':' )
+        if len(L) == 1:
+            self.kind = 'fixed'
+            self.args = [ float( L[0] ) ]
+        elif L[0] == 'uniform' and len(L) == 3:
+            self.kind = 'uniform'
+            self.args = [ float( L[1] ), float( L[2] ) ]
+            if self.args[0] > self.args[1]:
+                raise ValueError( 'uniform wait minimum is more than the '
+                                  'maximum: '+repr(spec) )
+        elif L[0] == 'exp' and len(L) == 2:
+            self.kind = 'exp'
+            self.args = [ float( L[1] ) ]
+        else:
+            raise ValueError( 'invalid queue wait: '+repr(spec) )
+
+        for val in self.args:
+            if val < 0:
+                raise ValueError( 'queue wait cannot be negative: '+repr(spec) )
+
+    def sample(self, rand):
+        ""
+        if self.kind == 'uniform':
+            return rand.uniform( self.args[0], self.args[1] )
+        elif self.kind == 'exp':
+            if self.args[0] > 0:
+                return rand.expovariate( 1.0/self.args[0] )
+            return 0.0
+        return self.args[0]
+
+    def __str__(self):
+        return self.spec
+
+
+def parse_cluster_spec( spec ):
+    """
+    Parses a comma separated list of settings, such as
+
+        "nodes=16,ppn=36,wait=exp:600,seed=2"
+
+    and returns a dict with keys 'nodes', 'ppn', 'wait' (a QueueWaitModel)
+    and 'seed'.  Settings not given are None.  Raises ValueError on error.
+    """
+    D = { 'nodes':None, 'ppn':None, 'wait':None, 'seed':None }
+
+    for item in spec.split( ',' ):
+        item = item.strip()
+        if not item:
+            continue
+
+        L = item.split( '=', 1 )
+        name = L[0].strip()
+        if len(L) != 2 or name not in D:
+            raise ValueError( 'expected nodes=, ppn=, wait=, or seed=, '
+                              'got '+repr(item) )
+
+        val = L[1].strip()
+        if name == 'wait':
+            D[name] = QueueWaitModel( val )
+        else:
+            try:
+                ival = int( val )
+            except Exception:
+                raise ValueError( 'expected an integer for '+name+
+                                  ', got '+repr(val) )
+            if ival < 0 or ( ival == 0 and name != 'seed' ):
+                raise ValueError( name+' must be positive, got '+repr(val) )
+            D[name] = ival
+
+    return D
+
+
+class BatchSimulator:
+
+    def __init__(self, cluster, batch_limit=5, time_limit=None):
+        """
+        At most 'batch_limit' jobs are in the queue (waiting or running) at
+        one time.  If 'time_limit' is given, jobs are stopped at that length
+        (as --max-timeout does to the batch job time).
+        """
+        self.cluster = cluster
+        self.limit = max( 1, batch_limit )
+        self.tlimit = time_limit
+
+    def run(self, pjobL):
+        """
+        Simulates running the list of batchpack.PackedJob objects, which are
+        submitted in order.  Returns a SimulationReport.
+        """
+        nnodes = self.cluster.getNumNodes()
+
+        jobL = []
+        for i,pjob in enumerate( pjobL ):
+            nodes = self.cluster.numNodesForCores( pjob.getNumCores() )
+            if nnodes != None:
+                nodes = min( nodes, nnodes )
+            length = pjob.getLength()
+            if self.tlimit:
+                length = min( length, float( self.tlimit ) )
+            jobL.append( SimulatedJob( i, nodes, length ) )
+
+        tnow = 0.0
+        tosubmit = list( jobL )
+        queued = []
+        running = []
+        free = nnodes
+        peak = 0
+
+        while tosubmit or queued or running:
+
+            while tosubmit and len(queued)+len(running) < self.limit:
+                sjob = tosubmit.pop(0)
+                sjob.submit = tnow
+                sjob.eligible = tnow + self.cluster.sampleQueueWait()
+                queued.append( sjob )
+
+            # start the jobs that are through the queue and fit on the free
+            # nodes, in the order they became eligible
+            queued.sort( key=lambda j: ( j.eligible, j.index ) )
+            for sjob in list( queued ):
+                if sjob.eligible <= tnow and ( free == None or
+                                               sjob.nodes <= free ):
+                    sjob.start = tnow
+                    sjob.stop = tnow + sjob.length
+                    queued.remove( sjob )
+                    running.append( sjob )
+                    if free != None:
+                        free -= sjob.nodes
+
+            peak = max( peak, sum( [ j.nodes for j in running ] ) )
+
+            # advance the clock to the next event
+            tL = [ j.stop for j in running ] + \
+                 [ j.eligible for j in queued if j.eligible > tnow ]
+            if len(tL) == 0:
+                break
+            tnow = min( tL )
+
+            for sjob in list( running ):
+                if sjob.stop <= tnow:
+                    running.remove( sjob )
+                    if free != None:
+                        free += sjob.nodes
+
+        return SimulationReport( self.cluster, self.limit, jobL, pjobL, peak )
+
+
+class SimulatedJob:
+
+    def __init__(self, index, nodes, length):
+        ""
+        self.index = index
+        self.nodes = nodes
+        self.length = length
+
+        self.submit = None
+        self.eligible = None
+        self.start = None
+        self.stop = None
+
+
+class SimulationReport:
+
+    def __init__(self, cluster, batch_limit, simjobs, pjobL, peak_nodes):
+        ""
+        self.cluster = cluster
+        self.limit = batch_limit
+        self.jobs = simjobs
+        self.peak = peak_nodes
+
+        self.makespan = 0.0
+        for sjob in simjobs:
+            self.makespan = max( self.makespan, sjob.stop )
+
+        ppn = cluster.getCoresPerNode()
+        self.node_time = sum( [ j.nodes*j.length for j in simjobs ] )
+        self.core_time = ppn * self.node_time
+
+        # in pilot mode the jobs share the same tests, so count each once
+        self.test_time = 0.0
+        self.num_tests = 0
+        self.num_unknown = 0
+        seen = set()
+        for pjob in pjobL:
+            for tcase in pjob.getTests():
+                if id(tcase) not in seen:
+                    seen.add( id(tcase) )
+                    self.num_tests += 1
+                    rt = predicted_runtime( tcase )
+                    if rt == None:
+                        self.num_unknown += 1
+                    else:
+                        self.test_time += get_num_procs( tcase ) * rt
+
+    def getMakespan(self):
+        """
+        Time from the first job submission to the last job finish.
+        """
+        return self.makespan
+
+    def getQueueWaits(self):
+        ""
+        return [ j.start - j.submit for j in self.jobs ]
+
+    def getNodeUtilization(self):
+        """
+        The fraction of the cluster node-seconds over the makespan that were
+        allocated to the jobs, or None if the number of nodes is unlimited.
+        """
+        nnodes = self.cluster.getNumNodes()
+        if nnodes == None or self.makespan <= 0:
+            return None
+        return self.node_time / float( nnodes * self.makespan )
+
+    def getCoreUtilization(self):
+        """
+        The fraction of the core-seconds allocated to the jobs that were
+        used by the tests (how well the tests were packed into the jobs).
+        """
+        if self.core_time <= 0:
+            return None
+        return min( 1.0, self.test_time / float( self.core_time ) )
+
+    def write(self, fileobj=sys.stdout):
+        ""
+        nnodes = self.cluster.getNumNodes()
+        ppn = self.cluster.getCoresPerNode()
+
+        if nnodes == None:
+            nodestr = 'unlimited nodes'
+        else:
+            nodestr = str(nnodes)+' nodes'
+
+        waitL = self.getQueueWaits()
+
+        lines = [
+            'Batch simulation: ' + str( len(self.jobs) ) + ' jobs, ' + \
+                str(self.num_tests) + ' tests, on ' + nodestr + \
+                ' of ' + str(ppn) + ' cores, batch limit ' + str(self.limit),
+            '    queue wait model  : ' + str( self.cluster.getQueueWait() ),
+            '    predicted makespan: ' + pretty_time( self.makespan ),
+        ]
+
+        if len(waitL) > 0:
+            mean = sum(waitL) / float( len(waitL) )
+            lines.append( '    job queue wait    : mean ' + pretty_time( mean ) + \
+                          ', max ' + pretty_time( max(waitL) ) )
+
+        lines.append( '    peak nodes in use : ' + str(self.peak) )
+
+        util = self.getNodeUtilization()
+        if util != None:
+            lines.append( '    node utilization  : %.1f%%' % (100*util) )
+
+        util = self.getCoreUtilization()
+        if util != None:
+            lines.append( '    core utilization  : %.1f%% ' % (100*util) + \
+                          '(of the cores allocated to the jobs)' )
+
+        if self.num_unknown > 0:
+            lines.append( '    *** ' + str(self.num_unknown) + ' test(s) have '
+                          'no runtime or timeout, so their jobs use the '
+                          'maximum batch time' )
+
+        fileobj.write( '\n'.join( lines ) + '\n' )
+        fileobj.flush()
@@ -12,6 +12,9 @@ import glob
 from . import TestList
 from . import testlistio
 from . import pathutil
+from .batchpack import BatchPacker, PackedJob, PackingUnit
+from .batchpack import find_dependency_units, round_up
+from .workqueue import WorkQueue
 
 
 class Batcher:
@@ -19,7 +22,7 @@ class Batcher:
     def __init__(self, vvtestcmd, testlist_name,
                        plat, tlist, xlist, perms,
                        test_dir, qsublimit,
-                       batch_length, max_timeout):
+                       batch_length, max_timeout, num_pilots=None):
         ""
         clean_exit_marker = "queue job finished cleanly"
 
@@ -42,7 +45,12 @@ class Batcher:
                                 max_timeout,
                                 clean_exit_marker )
 
-        self.batscriptor.createTestGroups()
+        if num_pilots:
+            self.batscriptor.createPilotJobs( num_pilots )
+            self.scheduler.setWorkQueue(
+                        WorkQueue( self.namer.getWorkQueueName() ) )
+        else:
+            self.batscriptor.createTestGroups()
 
     def getScheduler(self):
         return self.scheduler
@@ -67,6 +75,12 @@ class Batcher:
         ""
         return self.batscriptor.getIncludeFiles()
 
+    def getPackedJobs(self):
+        """
+        The list of batchpack.PackedJob objects, in submission order.
+        """
+        return self.batscriptor.qsublists
+
 
 class BatchScriptWriter:
 
@@ -88,6 +102,7 @@ class BatchScriptWriter:
         self.Tzero = 21*60*60  # no timeout in batch mode is 21 hours
 
         self.qsub_testfilenames = []
+        self.workitems = None
 
         # allow these values to be set by environment variable, mainly for
         # unit testing; if setting these is needed more regularly then a
@@ -102,38 +117,66 @@ class BatchScriptWriter:
         return self.qsub_testfilenames
 
     def createTestGroups(self):
-        ""
+        """
+        Packs the tests into batch jobs using their predicted runtimes and
+        number of processors.  See batchpack.BatchPacker.
+        """
+        qlen = self.batch_length
+        if qlen == None:
+            qlen = 30*60
+
+        packer = BatchPacker( self.plat.getNodeSize(), qlen, self.Tzero )
+        self.qsublists = packer.pack( self.xlist.getTestExecList() )
+
+    def createPilotJobs(self, num_pilots):
+        """
+        Rather than a fixed list of tests in each batch job, each of the
+        'num_pilots' jobs pulls work from a queue shared by all the jobs
+        until the queue is empty.  The work items are the tests connected
+        by dependencies, longest first.
+        """
         qlen = self.batch_length
         if qlen == None:
             qlen = 30*60
 
-        qL = []
-        for np in self.xlist.getTestExecProcList():
-          xL = []
-          for tcase in self.xlist.getTestExecList(np):
-            xdir = tcase.getSpec().getDisplayString()
-            xL.append( (tcase.getSpec().getAttr('timeout'),xdir,tcase) )
-          xL.sort()
-          grpL = []
-          tsum = 0
-          for rt,xdir,tcase in xL:
-            tspec = tcase.getSpec()
-            if tcase.numDependencies() > 0 or tspec.getAttr('timeout') < 1:
-              # analyze tests and those with no timeout get their own group
-              qL.append( [ self.Tzero, len(qL), [tcase] ] )
+        tcaseL = self.xlist.getTestExecList()
+
+        units = [ PackingUnit( tL ) for tL in find_dependency_units( tcaseL ) ]
+        units.sort( key=lambda u: ( -u.area, u.name ) )
+
+        self.workitems = []
+        nodesize = self.plat.getNodeSize()
+        ncores = nodesize
+        area = 0
+        longest = 0
+        longest_timeout = 0
+        for unit in units:
+            tL = sort_by_runtime( unit.tests )
+            self.workitems.append( [ t.getSpec().getDisplayString() for t in tL ] )
+            ncores = max( ncores, round_up( unit.width, nodesize ) )
+            if unit.runtimeUnknown():
+                longest = self.Tzero
+                longest_timeout = self.Tzero
             else:
-              if len(grpL) > 0 and tsum + rt > qlen:
-                qL.append( [ tsum, len(qL), grpL ] )
-                grpL = []
-                tsum = 0
-              grpL.append( tcase )
-              tsum += rt
-          if len(grpL) > 0:
-            qL.append( [ tsum, len(qL), grpL ] )
-
-        qL.sort()
-        qL.reverse()
-        self.qsublists = map( lambda L: L[2], qL )
+                area += unit.area
+                longest = max( longest, unit.critical )
+                longest_timeout = max( longest_timeout,
+                                       unit.critical_timeout )
+
+        num_pilots = max( 1, min( num_pilots, len( units ) ) )
+
+        self.qsublists = []
+        for i in range( num_pilots ):
+            pjob = PackedJob( ncores, index=i )
+            for unit in units:
+                pjob.add( unit )
+            # the pilots share the work, but any one of them may claim the
+            # longest work item last, and its tests may run to their timeouts
+            share = area / float( num_pilots * ncores )
+            pjob.length = min( self.Tzero, share + longest )
+            pjob.timelimit = min( self.Tzero,
+                                  share + max( longest, longest_timeout ) )
+            self.qsublists.append( pjob )
 
     def removeBatchDirectories(self):
         ""
@@ -147,9 +190,14 @@ class BatchScriptWriter:
 
         qsubids = {}  # maps batch id to max num processors for that batch
 
+        if self.workitems != None:
+            wq = WorkQueue( self.namer.getWorkQueueName() )
+            wq.create( self.workitems )
+            self.perms.recurse( wq.getDirectory() )
+
         qid = 0
-        for qL in self.qsublists:
-          self.make_queue_batch( qid, qL, qsubids, rundate )
+        for pjob in self.qsublists:
+          self.make_queue_batch( qid, pjob, qsubids, rundate )
           qid += 1
 
         qidL = list( qsubids.keys() )
@@ -162,7 +210,7 @@ class BatchScriptWriter:
             d = self.namer.getSubdir( i )
             self.perms.recurse( d )
 
-    def make_queue_batch(self, qnumber, qlist, npD, rundate):
+    def make_queue_batch(self, qnumber, pjob, npD, rundate):
         ""
         qidstr = str(qnumber)
 
@@ -171,32 +219,20 @@ class BatchScriptWriter:
         tl = TestList.TestList( testlistfname )
         tl.setRunDate( rundate )
 
-        tL = []
-        maxnp = 0
-        qtime = 0
+        qlist = pjob.getTests()
         for tcase in qlist:
-            tspec = tcase.getSpec()
-            np = int( tspec.getParameters().get('np', 0) )
-            if np <= 0: np = 1
-            maxnp = max( maxnp, np )
             tl.addTest( tcase )
-            tL.append( tcase )
-            qtime += int( tspec.getAttr('timeout') )
+        tL = list( qlist )
+
+        maxnp = pjob.getNumCores()
 
-        if qtime == 0:
-            qtime = self.Tzero  # give it the "no timeout" length of time
+        # the tests keep their own timeouts, so the time limit allows each
+        # test to run until its timeout
+        qtime = pjob.getTimeLimit()
+        if qtime >= self.Tzero:
+            qtime = self.Tzero  # the "no timeout" length of time
         else:
-            # allow more time in the queue than calculated. This overhead time
-            # monotonically increases with increasing qtime and plateaus at
-            # about 16 minutes of overhead.
-            if qtime < 60:
-                qtime += 60
-            elif qtime < 10*60:
-                qtime += qtime
-            elif qtime < 30*60:
-                qtime += 10*60 + int( float(qtime-10*60) * 0.3 )
-            else:
-                qtime += 10*60 + int( float(30*60-10*60) * 0.3 )
+            qtime = add_queue_overhead( int( qtime ) )
 
         if self.max_timeout:
             qtime = min( qtime, float(self.max_timeout) )
@@ -206,10 +242,13 @@ class BatchScriptWriter:
         tout = self.namer.getTestListName( qnumber ) + '.' + rundate
 
         jb = BatchJob( maxnp, pout, tout, tL,
-                       self.read_interval, self.read_timeout )
+                       self.read_interval, self.read_timeout,
+                       predicted_length=pjob.getLength(),
+                       time_limit=qtime )
         self.accountant.addJob( qnumber, jb )
 
         tl.stringFileWrite( extended=True )
+        tl.writeBatchSpecs( self.namer.getTestSpecsName( qidstr ) )
 
         fn = self.namer.getBatchScriptName( qidstr )
         fp = open( fn, "w" )
@@ -221,13 +260,24 @@ class BatchScriptWriter:
                          'echo "job start time = `date`"\n' + \
                          'echo "job time limit = ' + str(qtime) + '"\n' ] )
 
-        # set the environment variables from the platform into the script
+        # set the environment variables from the platform on the command
+        # (using "env" works in both csh and Bourne shells)
+        envL = []
         for k,v in self.plat.getEnvironment().items():
-          fp.write( 'setenv ' + k + ' "' + v  + '"\n' )
+            envL.append( k + '="' + v + '"' )
 
         cmd = self.vvtestcmd + ' --qsub-id=' + qidstr
+        if len( envL ) > 0:
+            cmd = 'env ' + ' '.join( envL ) + ' ' + cmd
 
-        if len(qlist) == 1:
+        if len(qlist) > 1 and maxnp > 1:
+          # run the tests concurrently on the processors of the job
+          cmd += ' -n ' + str(maxnp)
+
+        if self.workitems != None:
+          cmd += ' --batch-pilots=' + str( len( self.qsublists ) )
+
+        elif len(qlist) == 1:
           # force a timeout for batches with only one test
           if qtime < 600: cmd += ' -T ' + str(qtime*0.90)
           else:           cmd += ' -T ' + str(qtime-120)
@@ -241,6 +291,49 @@ class BatchScriptWriter:
         fp.close()
 
 
+def file_stat( filename ):
+    """
+    Returns ( size, modification time ) of the file, or None if it does not
+    exist.
+    """
+    try:
+        st = os.stat( filename )
+    except OSError:
+        return None
+    return ( st.st_size, st.st_mtime )
+
+
+def sort_by_runtime( tcaseL ):
+    """
+    Returns a list of the tests sorted by runtime, longest first.
+    """
+    sortL = []
+    for tcase in tcaseL:
+        tm = tcase.getStat().getRuntime( None )
+        if tm == None: tm = 0
+        sortL.append( ( -tm, tcase.getSpec().getDisplayString(), tcase ) )
+    sortL.sort( key=lambda T: T[:2] )
+    return [ T[2] for T in sortL ]
+
+
+def add_queue_overhead( qtime ):
+    """
+    Allow more time in the queue than calculated.  This overhead time
+    monotonically increases with increasing qtime and plateaus at about 16
+    minutes of overhead.
+    """
+    if qtime < 60:
+        qtime += 60
+    elif qtime < 10*60:
+        qtime += qtime
+    elif qtime < 30*60:
+        qtime += 10*60 + int( float(qtime-10*60) * 0.3 )
+    else:
+        qtime += 10*60 + int( float(30*60-10*60) * 0.3 )
+
+    return qtime
+
+
 class BatchScheduler:
 
     def __init__(self, tlist, xlist,
@@ -256,6 +349,22 @@ class BatchScheduler:
         self.maxjobs = maxjobs
         self.clean_exit_marker = clean_exit_marker
 
+        # the batch queue is queried at most this often (in seconds); in
+        # between, the job states from the last query are used
+        val = os.environ.get( 'VVTEST_BATCH_SLEEP_LENGTH', 15 )
+        val = float( os.environ.get( 'VVTEST_BATCH_QUERY_INTERVAL', val ) )
+        self.query_interval = val
+        self.tquery = None
+        self.qstates = {}
+
+        self.workq = None
+
+    def setWorkQueue(self, workqueue):
+        """
+        Set when the batch jobs are pilots taking work from 'workqueue'.
+        """
+        self.workq = workqueue
+
     def numInFlight(self):
         """
         Returns the number of batch jobs are still running or stopped but
@@ -283,18 +392,57 @@ class BatchScheduler:
     def checkstart(self):
         """
         Launches a new batch job if possible.  If it does, the batch id is
-        returned.
+        returned.  Other jobs ready to start with the same shape (number of
+        processors and time limit) are submitted with it as one array job,
+        if the batch system supports arrays.
         """
-        if self.accountant.numStarted() < self.maxjobs:
+        navail = self.maxjobs - self.accountant.numStarted()
+        if navail > 0:
+
+            readyL = []
             for qid,bjob in self.accountant.getNotStarted():
                 if self.getBlockingDependency( bjob ) == None:
-                    pin = self.namer.getBatchScriptName( qid )
-                    tdir = self.namer.getTestResultsRoot()
-                    jobid = self.plat.Qsubmit( tdir, bjob.outfile, pin )
-                    self.accountant.markJobStarted( qid, jobid )
+                    readyL.append( ( qid, bjob ) )
+
+            if len( readyL ) > 0:
+                qid,bjob = readyL[0]
+
+                shape = bjob.getShape()
+                grpL = [ T for T in readyL if T[1].getShape() == shape ]
+                if len( grpL ) > 1 and self.submitArray( grpL[:navail] ):
                     return qid
+
+                pin = self.namer.getBatchScriptName( qid )
+                tdir = self.namer.getTestResultsRoot()
+                jobid = self.plat.Qsubmit( tdir, bjob.outfile, pin )
+                self.accountant.markJobStarted( qid, jobid )
+                return qid
+
         return None
 
+    def submitArray(self, grpL):
+        """
+        Submits the ( batch id, BatchJob ) pairs as one array job.  Returns
+        False if the batch system does not support arrays or the submission
+        failed.
+        """
+        qid0,bjob0 = grpL[0]
+
+        pinL = [ self.namer.getBatchScriptName( qid ) for qid,bjob in grpL ]
+        outL = [ bjob.outfile for qid,bjob in grpL ]
+        arrayname = self.namer.getArrayScriptName( qid0 )
+        tdir = self.namer.getTestResultsRoot()
+
+        jobidL = self.plat.Qsubmit_array( tdir, outL, pinL, arrayname,
+                                          bjob0.maxnp, bjob0.qtime )
+        if jobidL == None:
+            return False
+
+        for i,( qid, bjob ) in enumerate( grpL ):
+            self.accountant.markJobStarted( qid, jobidL[i] )
+
+        return True
+
     def checkdone(self):
         """
         Uses the platform to find batch jobs that ran but are now no longer
@@ -311,19 +459,28 @@ class BatchScheduler:
         qdoneL = []
         startlist = self.accountant.getStarted()
         if len(startlist) > 0:
-            jobidL = [ jb.jobid for qid,jb in startlist ]
-            statusD = self.plat.Qquery( jobidL )
+            statusD = self.queryQueue( startlist )
             tnow = time.time()
             for qid,bjob in list( startlist ):
-                if self.checkJobDone( bjob, statusD[ bjob.jobid ], tnow ):
+                if statusD != None:
+                    st = statusD[ bjob.jobid ]
+                    stopped = self.checkJobDone( bjob, st, tnow )
+                else:
+                    # between queue queries, look for jobs that finished
+                    stopped = self.checkJobFinishedEarly( bjob )
+                if stopped:
                     self.accountant.markJobStopped( qid )
                     qdoneL.append( qid )
 
         tnow = time.time()
         tdoneL = []
         for qid,bjob in list( self.accountant.getStopped() ):
-            if bjob.timeToCheckIfFinished( tnow ):
-                if self.checkJobFinished( bjob.outfile, bjob.resultsfile ):
+            if bjob.seenfinished or bjob.timeToCheckIfFinished( tnow ):
+                # the files are always read here (not only when their stat
+                # changed), because on NFS the stat can be updated before
+                # the content is
+                if bjob.seenfinished or \
+                   self.checkJobFinished( bjob.outfile, bjob.resultsfile ):
                     # load the results into the TestList
                     tdoneL.extend( self.finalizeJob( qid, bjob, 'clean' ) )
                 else:
@@ -334,6 +491,70 @@ class BatchScheduler:
 
         return qdoneL, tdoneL
 
+    def queryQueue(self, startlist):
+        """
+        Queries the batch queue for the state of all the started jobs in one
+        command, but no more often than the query interval.  Returns a map
+        of job id to state, or None if it is not time to query.
+        """
+        tnow = time.time()
+        if self.tquery != None and tnow - self.tquery < self.query_interval:
+            return None
+
+        jobidL = [ jb.jobid for qid,jb in startlist ]
+        statusD = self.plat.Qquery( jobidL )
+
+        self.tquery = tnow
+        self.qstates = dict( statusD )
+
+        for qid,bjob in startlist:
+            if statusD.get( bjob.jobid, '' ) == 'running':
+                bjob.markRunning( tnow )
+
+        return statusD
+
+    def checkJobFinishedEarly(self, bjob):
+        """
+        Returns True if the job's files show that it finished, even though
+        it was still in the batch queue at the last query.  The files are
+        only read if their size or modification time changed.
+        """
+        if bjob.filesChanged():
+            if self.checkJobFinished( bjob.outfile, bjob.resultsfile ):
+                bjob.seenfinished = True
+        return bjob.seenfinished
+
+    def getPollInterval(self, nominal):
+        """
+        Returns the number of seconds to wait before checking the jobs
+        again.  The wait is shorter than 'nominal' when a job has stopped or
+        a running job is near its predicted finish, and longer while all
+        the jobs are waiting in the queue.
+        """
+        fast = max( 1, nominal/5.0 )
+        slow = min( 4*nominal, max( nominal, 2*60 ) )
+
+        if len( self.accountant.getStopped() ) > 0:
+            return fast
+
+        startlist = self.accountant.getStarted()
+        if len( startlist ) == 0:
+            return nominal
+
+        tnow = time.time()
+        pending = True
+        for qid,bjob in startlist:
+            if self.qstates.get( bjob.jobid, '' ) != 'pending':
+                pending = False
+            tfin = bjob.predictedFinishTime()
+            if bjob.trun != None and tfin != None and tfin - tnow < nominal:
+                return fast
+
+        if pending:
+            return slow
+
+        return nominal
+
     def checkJobDone(self, bjob, queue_status, current_time):
         """
         If either the output file exists or enough time has elapsed since the
@@ -442,6 +663,36 @@ class BatchScheduler:
 
         return notrun, notdone, notrunL
 
+    def getUnfinishedWork(self):
+        """
+        For pilot batch jobs, a pilot that dies or reaches its time limit
+        leaves the tests in its work item unfinished, and the items nobody
+        claimed unrun.  Returns a list of ( test, reason ) for each test in
+        the work queue that did not finish.
+        """
+        leftL = []
+
+        if self.workq != None and os.path.isdir( self.workq.getDirectory() ):
+
+            tcasemap = {}
+            for tcase in self.tlist.getTests():
+                tcasemap[ tcase.getSpec().getDisplayString() ] = tcase
+
+            owners = dict( self.workq.getClaims() )
+
+            for idx,names in enumerate( self.workq.getItems() ):
+                for name in names:
+                    tcase = tcasemap.get( name, None )
+                    if tcase != None and not tcase.getStat().isDone():
+                        if idx in owners:
+                            reason = 'claimed by pilot job "' + \
+                                     owners[idx] + '" which did not finish it'
+                        else:
+                            reason = 'not claimed by any pilot job'
+                        leftL.append( ( tcase, reason ) )
+
+        return leftL
+
     def finalizeJob(self, qid, bjob, mark=None):
         ""
         tL = []
@@ -480,10 +731,12 @@ class BatchScheduler:
         """
         If a dependency of any of the tests in the current list have not run or
         ran but did not pass or diff, then that dependency test is returned.
-        Otherwise None is returned.
+        Otherwise None is returned.  Dependencies on tests in the same job
+        are handled by the job itself.
         """
+        jobtests = set( bjob.testL )
         for tcase in bjob.testL:
-            deptx = tcase.getBlockingDependency()
+            deptx = tcase.getBlockingDependency( jobtests )
             if deptx != None:
                 return deptx
         return None
@@ -492,18 +745,30 @@ class BatchScheduler:
 class BatchJob:
     
     def __init__(self, maxnp, fout, resultsfile, testL,
-                       read_interval, read_timeout):
+                       read_interval, read_timeout, predicted_length=None,
+                       time_limit=None):
         self.maxnp = maxnp
+        self.qtime = time_limit
         self.outfile = fout
         self.resultsfile = resultsfile
         self.testL = testL  # list of TestCase objects
         self.jobid = None
         self.tstart = None
+        self.trun = None
         self.tstop = None
         self.tcheck = None
         self.result = None
         self.read_interval = read_interval
         self.read_timeout = read_timeout
+        self.predicted_length = predicted_length
+        self.filestats = None
+        self.seenfinished = False
+
+    def getShape(self):
+        """
+        Jobs with the same shape can be submitted together as an array job.
+        """
+        return ( self.maxnp, self.qtime )
 
     def start(self, jobid):
         """
@@ -511,6 +776,34 @@ class BatchJob:
         self.jobid = jobid
         self.tstart = time.time()
 
+    def markRunning(self, current_time):
+        """
+        Records the first time the job was seen running in the queue.
+        """
+        if self.trun == None:
+            self.trun = current_time
+
+    def predictedFinishTime(self):
+        """
+        The time the job is expected to finish, or None if not known.
+        """
+        if self.predicted_length == None or self.tstart == None:
+            return None
+        if self.trun != None:
+            return self.trun + self.predicted_length
+        return self.tstart + self.predicted_length
+
+    def filesChanged(self):
+        """
+        Returns True if the size or modification time of the batch output
+        or results file changed since the last call.  This is a cheap check
+        done before reading the files.
+        """
+        stats = ( file_stat( self.outfile ), file_stat( self.resultsfile ) )
+        changed = ( stats != self.filestats )
+        self.filestats = stats
+        return changed
+
     def stop(self):
         """
         """
@@ -530,8 +823,8 @@ class BatchJob:
         if current_time < self.tstop+self.read_timeout:
             # set the time for the next read attempt
             self.tcheck = current_time + self.read_interval
-            return False
-        return True
+            return True
+        return False
 
     def finished(self, result):
         """
@@ -557,11 +850,29 @@ class BatchFileNamer:
         """
         return self.getPath( self.listbasename, qid, relative )
 
+    def getTestSpecsName(self, qid):
+        """
+        The file containing the fully constructed tests of the batch.
+        """
+        return self.getPath( 'tspecs', qid )
+
+    def getWorkQueueName(self):
+        """
+        The directory of the work queue shared by pilot batch jobs.
+        """
+        return os.path.join( self.rootdir, 'batchset_workqueue' )
+
     def getBatchScriptName(self, qid):
         """
         """
         return self.getPath( 'qbat', qid )
 
+    def getArrayScriptName(self, qid):
+        """
+        The array job script that submits the batch 'qid' along with others.
+        """
+        return self.getPath( 'qbat-array', qid )
+
     def getBatchOutputName(self, qid):
         """
         """
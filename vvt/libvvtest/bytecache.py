@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+
+
+# values of VVTEST_BYTECODE_CACHE that turn off the cache
+DISABLE_VALUES = [ '0', 'off', 'no', 'false', 'none' ]
+
+
+def enable_bytecode_cache( environ=None ):
+    """
+    The vvtest scripts set sys.dont_write_bytecode so that .pyc files are
+    not written into the (possibly shared) source tree, which means all the
+    modules are compiled on every invocation.  With Python 3.8 or later,
+    this function instead writes the byte code into a per-user cache
+    directory using sys.pycache_prefix.
+
+    The VVTEST_BYTECODE_CACHE environment variable can be set to a directory
+    to use, or to "off" to not write byte code.  Returns the cache directory,
+    or None if byte code writing was not turned on.
+    """
+    if environ == None:
+        environ = os.environ
+
+    if not hasattr( sys, 'pycache_prefix' ):
+        return None
+
+    val = environ.get( 'VVTEST_BYTECODE_CACHE', '' ).strip()
+    if val.lower() in DISABLE_VALUES:
+        return None
+
+    if sys.pycache_prefix:
+        # already set with PYTHONPYCACHEPREFIX or -X pycache_prefix
+        cachedir = sys.pycache_prefix
+    elif val:
+        cachedir = os.path.abspath( os.path.expanduser( val ) )
+    else:
+        cachedir = default_cache_directory( environ )
+
+    if not cachedir or not make_cache_directory( cachedir ):
+        return None
+
+    sys.pycache_prefix = cachedir
+    sys.dont_write_bytecode = False
+
+    return cachedir
+
+
+def default_cache_directory( environ ):
+    """
+    Returns $XDG_CACHE_HOME/vvtest/pycache or ~/.cache/vvtest/pycache, or
+    None if the home directory is not known.
+    """
+    base = environ.get( 'XDG_CACHE_HOME', '' ).strip()
+
+    if not base or not os.path.isabs( base ):
+        home = os.path.expanduser( '~' )
+        if not home or home == '~':
+            return None
+        base = os.path.join( home, '.cache' )
+
+    return os.path.join( base, 'vvtest', 'pycache' )
+
+
+def make_cache_directory( cachedir ):
+    """
+    Creates the directory (readable only by the user) if it does not exist.
+    Returns True if the directory is writable.
+    """
+    try:
+        if not os.path.isdir( cachedir ):
+            os.makedirs( cachedir, 0o700 )
+    except Exception:
+        return False
+
+    return os.access( cachedir, os.W_OK | os.X_OK )
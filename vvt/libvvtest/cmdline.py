@@ -62,6 +62,21 @@ platform names.
 Also, the -s, --search option can be used to search input files for regular
 expression patterns.
 
+The --changed and --changed-since options select only the tests affected by
+a set of changed files.  The --changed option gives the files (it can be
+repeated, and the names can be comma separated).  The --changed-since option
+gives a Git reference, such as "origin/master", and uses the files that
+differ from it in the repository containing the first scan directory
+(committed or not, plus new files).  A test is affected if a changed file is
+the test file, an insert directive file, or a file it links, copies,
+baselines or lists as needed.  The tests that must run with an affected test
+are also selected (an analyze test and its parameterized tests, the stages
+of a staged test, and tests connected by "depends on", in both directions).
+The input files of each test are kept in a "test_inputs.index" file (in
+TESTING_DIRECTORY if defined, otherwise the test results directory), which
+is updated from the test files scanned when these options are given.  Tests
+that are not in the index are always selected.
+
 The "TDD" keyword is special.  If a test adds TDD to its keyword list, then
 that test is not run by default.  To run tests that have the TDD keyword, add
 the --include-tdd option.  The idea is that these tests are a work-in-progress
@@ -164,6 +179,22 @@ Using --tsum will filter tests by accumulated previous runtime.  Tests will be
 sorted by previous runtime (in ascending order), then accumulated
 until the sum of the runtimes is above the --tsum value.  Tests
 that do not have a previous runtime are given the value zero.
+
+Using --shard I/N splits the tests into N parts of about the same total
+runtime and only runs part I (from 1 to N), such as for spreading a test
+suite over N machines.  The tests selected by the other filters are split,
+so each machine should use the same options.  Tests that must run together
+(an analyze test and its parameterized tests, the stages of a staged test,
+and tests connected by "depends on") are kept in the same shard.  The work
+of a test is its number of processors (np) times its runtime.  By default,
+the runtime is the timeout in the test specification (or the default
+timeout), because runtimes from previous runs differ between machines.  To
+use measured runtimes, give the same runtime history file to every shard
+with --shard-runtimes (such as a copy of "runtimes.history" from a previous
+run); tests not in the file use their timeout.  The split only depends on
+the tests and these inputs, so every machine computes the same assignment.
+The shard is added to the --save-results file name, so the results files of the
+shards can be merged with "results.py merge".
 """
 
 
@@ -233,6 +264,36 @@ The -C or --postclean option will clean out the test directory of each test
 after it shows a "pass".  Only those tests that "pass" are cleaned out after
 they run.  The execute.log file is not removed.
 
+The --result-cache option turns on a cache of passing test results, kept in
+the given directory (which can be shared by many test results directories).
+The inputs of each test are hashed: the test file, the files it links,
+copies or needs, its parameters, the platform, compiler and options, the
+project executables in the --bin-dir, the tests it depends on, and a string
+returned by the function test_cache_salt(specs) in the user plugin, if
+defined (for inputs vvtest cannot see, such as modules or libraries).  A test
+whose hash matches a previous passing result is marked as passed without
+being run, and shows from_cache="<hash>" in the test listing.  Tests that a
+test to be run depends on are always run.
+
+The --failures-first option starts the tests that failed, diffed or timed out
+the last time they were run first, then new tests (no previous result or
+runtime), then the rest, each longest running first.  The previous result
+is taken from the test results directory, or else from the runtime history
+or runtimes file.  The --fail-fast option stops starting new tests after the
+given number of tests fail, diff or time out; the tests left are "notrun".
+Tests still running are allowed to finish, unless --fail-fast-interrupt is
+also given, in which case they are interrupted and marked as a "timeout".
+These options are meant for quick feedback, such as for pre-merge checks.
+
+The --watch option keeps vvtest running after the tests finish.  The files
+used by the tests (the test files, insert files, and the files they link,
+copy, baseline or need) are checked for changes every few seconds, and the
+tests affected by a change are run again in the same test results directory
+(whatever their previous result).  Tests that must run with an affected test
+are run too, as with --changed.  Tests added to a test file, or new
+parameter values, are not picked up until vvtest is run again without
+--watch.  Use Control-C to stop watching.
+
 The --force option will force vvtest to run.  When vvtest finishes running
 tests, a mark is placed in the testlist file.  If another vvtest execution is
 started while the first is still running, the second will refuse
@@ -286,6 +347,54 @@ The -N option will wet the maximum number of processers available on the
 current platform.  By default, the system is probed to determine this value.
 Note that tests requiring more than this number of processors are not run.
       
+The --max-memory option sets the memory available to the tests running at
+the same time, such as "--max-memory 64G".  A plain number is in megabytes.
+By default, the physical memory of the machine is used.  A test can declare
+its memory requirement with a "#VVT: memory : 2G" directive (or a <memory>
+element in XML tests); otherwise the peak memory recorded in the runtimes
+history is used, if any.  The recorded value is the peak memory of the
+largest process of the test, so for a parallel test it is multiplied by the
+"np" parameter value (an approximation that assumes the processes are about
+the same size).  A test is only launched when both its processors and its
+memory are available.
+
+The --bind-cores option pins each test to a set of processor cores not used
+by any other running test, preferring cores on a single NUMA node.  The
+cores are given in the VVTEST_CPU_LIST environment variable and, if the
+platform writes an MPI machine file, are passed to the MPI launcher.
+
+The --throttle-cpu and --throttle-mem options hold back new test launches
+while other load on a shared machine is high, and resume launching once the
+pressure drops below 80% of the limit.  The pressures are percentages from
+the Linux pressure stall information (/proc/pressure/cpu and memory, the
+"some avg10" value).  If that is not available, the CPU pressure is the load
+average in excess of the processors used by vvtest, as a percentage of the
+number of cores, and the memory pressure is the percentage of memory in use.
+Each hold and resume is written to the output.
+
+The --hosts option runs the tests on a pool of hosts instead of only the
+current machine.  The hosts must share the file system with the current
+machine.  The value is a comma separated list of host names, each
+optionally followed by a colon and its number of processors, such as
+"--hosts localhost:4,node2:16,node3", or the name of a file with one host
+per line.  Each host is checked at startup using ssh, which also counts the
+processors of hosts not given a number; unreachable hosts are dropped.
+Each test is prepared locally, then run on a host with enough free
+processors using ssh, with the same environment and in the same test
+directory.  The number of processors (-n) becomes the total over the hosts,
+and the maximum (-N) the size of the largest host.  The ssh program can be set with the VVTEST_SSH environment
+variable.  Note that --idle-timeout only sees the output of remote tests,
+not their CPU use.
+
+The --replay option helps choose -n and -N for a machine.  Run from within a
+finished test results directory, the tests are replayed through the vvtest
+scheduler on a virtual clock (nothing is run) using their recorded runtimes,
+results, processor counts and dependencies.  The value is a comma separated
+list of processor counts, such as "--replay 8,16,32".  For each count and
+each scheduling policy (longest first, shortest first, longest dependency
+chain first, and by name) the makespan, idle processor-seconds and
+utilization are printed, along with the critical path of the tests.
+
 The --plat option sets the platform name for use by plugins and default
 resource settings. This can be used to specify the platform name,
 thus overriding the default platform name.  For example, you could use
@@ -307,6 +416,18 @@ apply a float multiplier to the timeout value for each test.
 The --max-timeout option will
 apply a maximum timeout value for each test and for batch jobs.
 It is the last operation performed when computing timeouts.
+
+The runtimes of recent test executions are kept for each platform and
+number of processors in a "runtimes.history" file (in TESTING_DIRECTORY if
+defined, otherwise the test results directory).  Tests are scheduled using
+a moving average of these runtimes, and a timeout is computed from an upper
+quantile of them.  The --timeout-quantile option sets that quantile, a
+number between zero and one.  The default is 0.95.
+
+The --idle-timeout option turns on a watchdog for hung tests.  A test that
+produces no output to its log file and uses no CPU time for the given number
+of seconds is interrupted (the same as a timeout).  Such tests are marked
+with a "timeout" result and can be selected with the "hung" results keyword.
 """
 
 
@@ -324,12 +445,39 @@ The --batch-limit option will will limit the number of batch jobs submitted
 to the queue at any one time.  The default is 5 concurrent batch jobs.
 
 The --batch-length option limits the
-number of tests that are placed into each batch set.  The sum
-of the timeouts of the tests in each set will be less than the
-given number of seconds.  The default is 30 minutes.  The longer
-the length, the more tests will go in each batch job; the shorter
-the length, the fewer.  A value of zero will force each test to
-run in a separate batch job.
+number of tests that are placed into each batch set.  Tests are packed
+into batch jobs a whole number of nodes wide, and run concurrently within
+each job, such that the predicted runtime of each job is less than the
+given number of seconds.  The predicted runtime of a test is its runtime
+from a previous run, or its timeout if it has not been run before.  Tests
+connected by dependencies are kept in the same job.  The default is 30
+minutes.  The longer the length, the more tests will go in each batch
+job; the shorter the length, the fewer.  A value of zero will force each
+test to run in a separate batch job.
+
+The --batch-pilots option changes how tests are given to batch jobs.  The
+given number of batch jobs are submitted, each of which takes the next
+tests from a work queue in the test results directory (shared by all the
+jobs) until the queue is empty.  A slow test then only delays the job
+running it, while the other jobs keep working through the queue.  If the
+pilot jobs stop early (such as at their time limit), the tests they did not
+finish and the tests left in the queue are listed with a warning.
+
+The --batch-simulate option predicts how a batch run would go, without
+submitting anything.  The tests in an existing test results directory are
+grouped into batch jobs as --batch would (using the --batch-length,
+--batch-limit and --batch-pilots options), then the jobs are run on a
+simulated cluster using the previous runtimes of the tests.  The predicted
+makespan (total wall time), queue waits, and node and core utilization are
+printed.  The cluster is given as comma separated settings:
+
+    nodes=NUM   : number of compute nodes (default is unlimited)
+    ppn=NUM     : cores per node (default is the platform node size)
+    wait=WAIT   : time each job waits in the queue before it can start; a
+                  number of seconds, "uniform:MIN:MAX", or "exp:MEAN"
+    seed=NUM    : random number seed for the queue wait (default 1)
+
+For example, "--batch-simulate nodes=16,ppn=36,wait=exp:600".
 """
 
 
@@ -401,6 +549,25 @@ used to pull tests that can be distributed to various customers.
 """
 
 
+help_daemon = """
+
+The --daemon option starts a vvtest daemon, which keeps running and serves
+vvtest commands, so that each command does not start from scratch.  It scans
+the given directories (or the current directory) and keeps the parsed tests,
+then creates a socket file named .vvtest_daemon in the current directory.
+While it runs, vvtest commands started in that directory or below it are
+sent to the daemon, which runs them and sends back the output and exit
+status.  Test files that have not changed (nor their insert files) are not
+parsed again.  The daemon runs one command at a time.  Use Control-C on the
+daemon to stop it.
+
+The daemon is not used by vvtest commands run by tests or batch jobs, or
+when the --no-daemon option is given.  The command runs with the environment
+and current directory of the vvtest command, but the daemon must be
+restarted to pick up changes to vvtest itself or its configuration.
+"""
+
+
 help_deprecated = """
 
 >DEPRECATED BUT STILL AVAILABLE:
@@ -502,6 +669,12 @@ def create_parser( argvlist, vvtest_version ):
     grp.add_argument( '--tsum',
         help='Include as many tests as possible such that the sum of their '
              'runtimes is less than the given number of seconds.' )
+    grp.add_argument( '--shard', metavar='I/N',
+        help='Split the tests into N parts with about the same total '
+             'runtime and only run part I, such as "--shard 2/4".' )
+    grp.add_argument( '--shard-runtimes', metavar='FILE',
+        help='Weight the --shard split with the runtimes in this runtime '
+             'history file, instead of the test timeouts.' )
 
     # more filtering
     grp.add_argument( '-s', '--search', metavar='REGEX', dest='search',
@@ -511,6 +684,12 @@ def create_parser( argvlist, vvtest_version ):
     grp.add_argument( '--include-tdd', action='store_true',
         help='Include tests that contain the keyword "TDD", which are '
              'normally not included.' )
+    grp.add_argument( '--changed', metavar='FILES', action='append',
+        help='Only include tests affected by these changed files '
+             '(subhelp: filters).' )
+    grp.add_argument( '--changed-since', metavar='REF',
+        help='Only include tests affected by the files that differ from '
+             'this Git reference, such as "origin/master".' )
 
     # behavior
     grp = psr.add_argument_group( 'Runtime behavior (subhelp: behavior)' )
@@ -546,6 +725,20 @@ def create_parser( argvlist, vvtest_version ):
         help='Pass options and/or arguments to each test script.' )
     grp.add_argument( '--encode-exit-status', action='store_true',
         help='Exit nonzero if at least one test did not pass or did not run.' )
+    grp.add_argument( '--result-cache', metavar='DIRECTORY',
+        help='Do not run tests that passed before with the same inputs, '
+             'using a cache of passing results kept in DIRECTORY '
+             '(subhelp: behavior).' )
+    grp.add_argument( '--failures-first', action='store_true',
+        help='Run tests that failed the last time first, then new tests '
+             '(subhelp: behavior).' )
+    grp.add_argument( '--fail-fast', type=int, metavar='N',
+        help='Stop starting new tests after N tests fail, diff or timeout.' )
+    grp.add_argument( '--fail-fast-interrupt', action='store_true',
+        help='With --fail-fast, also interrupt the tests still running.' )
+    grp.add_argument( '--watch', action='store_true',
+        help='After running, keep rerunning the tests affected by changes '
+             'to their files until interrupted (subhelp: behavior).' )
 
     # resources
     grp = psr.add_argument_group( 'Resource controls (subhelp: resources)' )
@@ -554,6 +747,21 @@ def create_parser( argvlist, vvtest_version ):
     grp.add_argument( '-N', dest='dash_N', type=int,
         help='Set the maximum number of processors to use, and filter out '
              'tests requiring more.' )
+    grp.add_argument( '--max-memory', metavar='SIZE',
+        help='Set the memory available to tests running at the same time, '
+             'such as "64G" or "2000" (megabytes).  Default is the '
+             'physical memory of the machine.' )
+    grp.add_argument( '--bind-cores', action='store_true',
+        help='Pin each running test to its own set of processor cores.' )
+    grp.add_argument( '--throttle-cpu', type=float, metavar='PERCENT',
+        help='Hold back test launches while the CPU pressure on the '
+             'machine is above this percentage.' )
+    grp.add_argument( '--throttle-mem', type=float, metavar='PERCENT',
+        help='Hold back test launches while the memory pressure on the '
+             'machine is above this percentage.' )
+    grp.add_argument( '--hosts', metavar='HOSTS',
+        help='Run the tests on these hosts using ssh, such as '
+             '"node1:8,node2:8" or the name of a file listing the hosts.' )
     grp.add_argument( '--plat',
         help='Use this platform name for defaults and plugins.' )
     grp.add_argument( '--platopt', action='append',
@@ -565,6 +773,12 @@ def create_parser( argvlist, vvtest_version ):
         help='Apply a float multiplier to the timeout value for each test.' )
     grp.add_argument( '--max-timeout',
         help='Maximum timeout value for each test and for batch jobs.' )
+    grp.add_argument( '--timeout-quantile', type=float,
+        help='The quantile of previous runtimes used to compute timeouts. '
+             'Default is 0.95.' )
+    grp.add_argument( '--idle-timeout', type=float, metavar='SECONDS',
+        help='Interrupt tests that show no output or CPU activity for '
+             'this many seconds.' )
 
     # config
     grp = psr.add_argument_group( 'Runtime configuration (subhelp: config)' )
@@ -591,10 +805,18 @@ def create_parser( argvlist, vvtest_version ):
         help='Deprecated; use --batch-limit.' )
     grp.add_argument( '--batch-length', type=int,
         help='Limit the number of tests in each job group such that the '
-             'sum of their runtimes is less than the given value. '
+             'predicted length of the job is less than the given value. '
              'Default is 30 minutes.' )
     grp.add_argument( '--qsub-length', type=int,
         help='Deprecated; use --batch-length.' )
+    grp.add_argument( '--batch-pilots', type=int, metavar='NUM',
+        help='Submit NUM batch jobs that each pull tests from a shared '
+             'work queue until it is empty, rather than a fixed list of '
+             'tests per batch job.' )
+    grp.add_argument( '--batch-simulate', metavar='CLUSTER',
+        help='Predict the makespan and utilization of a batch run of the '
+             'tests in a test results directory on a simulated cluster, '
+             'such as "nodes=16,ppn=36,wait=exp:600".' )
     psr.add_argument( '--qsub-id', type=int, help=argutil.SUPPRESS )
 
     # results
@@ -615,6 +837,10 @@ def create_parser( argvlist, vvtest_version ):
              'output formats. Can be seconds since epoch or a date string.' )
     grp.add_argument( '--junit', metavar='FILENAME',
         help='Writes a test summary file in the JUnit XML format.' )
+    grp.add_argument( '--trace', metavar='FILENAME',
+        help='Write the time spent in each phase of the run and the start '
+             'and stop of each test to a file in the Chrome trace event '
+             '(JSON) format, and print a phase time summary.' )
     grp.add_argument( '--html', metavar='FILENAME',
         help='Write a test summary file in HTML format.' )
     grp.add_argument( '--gitlab', metavar='LOCATION',
@@ -640,6 +866,15 @@ def create_parser( argvlist, vvtest_version ):
     grp.add_argument( '--files', action='store_true',
         help='Gather and print the file names that would be run, after '
              'filtering (subhelp: keywords).' )
+    grp.add_argument( '--replay', metavar='NUMPROCS',
+        help='Replay the tests of a test results directory on a virtual '
+             'clock for a comma separated list of processor counts '
+             '(subhelp: resources).' )
+    grp.add_argument( '--daemon', action='store_true',
+        help='Serve vvtest commands run in or below the current directory, '
+             'keeping the parsed tests in memory (subhelp: daemon).' )
+    grp.add_argument( '--no-daemon', action='store_true',
+        help='Do not send this command to a running vvtest daemon.' )
 
     psr.add_argument( 'directory', nargs='*' )
 
@@ -725,6 +960,20 @@ def adjust_options_and_create_derived_options( opts ):
         if opts.batch_length != None and opts.batch_length < 0:
             raise Exception( 'length cannot be negative' )
 
+        errtype = 'batch-pilots'
+        if opts.batch_pilots != None and opts.batch_pilots <= 0:
+            raise Exception( 'number of pilots must be positive' )
+
+        errtype = 'batch-simulate'
+        simD = None
+        if opts.batch_simulate != None:
+            from .batchsim import parse_cluster_spec
+            simD = parse_cluster_spec( opts.batch_simulate )
+        derived_opts['batch_sim'] = simD
+
+        errtype = 'replay'
+        derived_opts['replay_procs'] = create_replay_processor_list( opts.replay )
+
         errtype = 'on/off options'
         onL,offL = clean_on_off_options( opts.dash_o, opts.dash_O )
         derived_opts['onopts'] = onL
@@ -744,6 +993,16 @@ def adjust_options_and_create_derived_options( opts ):
         if opts.dash_N != None and float(opts.dash_N) <= 0:
             raise Exception( 'must be positive' )
 
+        errtype = 'max memory'
+        if opts.max_memory != None:
+            from .vvplatform import parse_memory_size
+            opts.max_memory = parse_memory_size( opts.max_memory )
+
+        errtype = 'throttle percentage'
+        for val in [ opts.throttle_cpu, opts.throttle_mem ]:
+            if val != None and not ( val > 0.0 and val <= 100.0 ):
+                raise Exception( 'must be greater than zero and at most 100' )
+
         errtype = 'timeout'
         if opts.dash_T and float(opts.dash_T) < 0.0:
             opts.dash_T = 0.0
@@ -756,6 +1015,55 @@ def adjust_options_and_create_derived_options( opts ):
         if opts.max_timeout and not float(opts.max_timeout) > 0.0:
             raise Exception( 'must be positive' )
 
+        errtype = 'timeout quantile'
+        if opts.timeout_quantile != None:
+            q = float( opts.timeout_quantile )
+            if not ( q > 0.0 and q <= 1.0 ):
+                raise Exception( 'must be greater than zero and at most one' )
+
+        errtype = 'idle timeout'
+        if opts.idle_timeout != None and not opts.idle_timeout > 0.0:
+            raise Exception( 'must be positive' )
+
+        errtype = '--hosts'
+        hosts = None
+        if opts.hosts != None:
+            if opts.batch:
+                raise Exception( 'cannot be used with --batch' )
+            from .hostpool import parse_host_list
+            hosts = parse_host_list( opts.hosts )
+        derived_opts['hosts'] = hosts
+
+        errtype = 'shard'
+        shard = None
+        if opts.shard != None:
+            from .sharding import parse_shard_spec
+            shard = parse_shard_spec( opts.shard )
+        derived_opts['shard'] = shard
+
+        errtype = '--shard-runtimes'
+        shardrt = None
+        if opts.shard_runtimes != None:
+            if opts.shard == None:
+                raise Exception( 'can only be used with --shard' )
+            shardrt = os.path.abspath( opts.shard_runtimes )
+            if not os.path.isfile( shardrt ):
+                raise Exception( 'file does not exist: '+opts.shard_runtimes )
+        derived_opts['shard_runtimes'] = shardrt
+
+        errtype = '--changed'
+        changed = None
+        if opts.changed or opts.changed_since:
+            changed = []
+            for arg in ( opts.changed or [] ):
+                for fn in arg.split( ',' ):
+                    if fn.strip():
+                        changed.append( os.path.normpath(
+                                            os.path.abspath( fn.strip() ) ) )
+            if opts.changed_since != None and not opts.changed_since.strip():
+                raise Exception( 'empty Git reference' )
+        derived_opts['changed_files'] = changed
+
         errtype = 'tmin/tmax/tsum'
         mn,mx,sm = convert_test_time_options( opts.tmin, opts.tmax, opts.tsum )
         opts.tmin = mn
@@ -766,6 +1074,28 @@ def adjust_options_and_create_derived_options( opts ):
         if opts.bin_dir != None:
             opts.bin_dir = os.path.normpath( os.path.abspath( opts.bin_dir ) )
 
+        errtype = '--fail-fast'
+        if opts.fail_fast != None:
+            if not opts.fail_fast > 0:
+                raise Exception( 'must be a positive integer' )
+            if opts.batch:
+                raise Exception( 'cannot be used with --batch' )
+        elif opts.fail_fast_interrupt:
+            raise Exception( '--fail-fast-interrupt requires --fail-fast' )
+
+        errtype = '--watch'
+        if opts.watch:
+            if opts.changed or opts.changed_since:
+                raise Exception( 'cannot be used with --changed or '
+                                 '--changed-since' )
+            if opts.batch:
+                raise Exception( 'cannot be used with --batch' )
+
+        errtype = '--result-cache'
+        if opts.result_cache != None:
+            opts.result_cache = os.path.normpath(
+                                    os.path.abspath( opts.result_cache ) )
+
         errtype = 'config directory'
         if opts.config != None:
             for i,d in enumerate( opts.config ):
@@ -952,6 +1282,31 @@ def clean_sort_options( sort ):
     return letters
 
 
+def create_replay_processor_list( replay ):
+    """
+    Returns a list of the processor counts given to --replay, or None.
+    """
+    if replay == None:
+        return None
+
+    npL = []
+    for val in replay.split( ',' ):
+        val = val.strip()
+        if val:
+            try:
+                np = int( val )
+            except Exception:
+                raise Exception( 'expected a list of integers: '+repr(replay) )
+            if np <= 0:
+                raise Exception( 'processor counts must be positive: '+val )
+            npL.append( np )
+
+    if len( npL ) == 0:
+        raise Exception( 'no processor counts given' )
+
+    return npL
+
+
 def create_platform_options( platopt ):
     ""
     pD = {}
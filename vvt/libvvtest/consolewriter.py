@@ -8,6 +8,7 @@ import os, sys
 import time
 
 from . import outpututils
+from . import pathutil
 
 
 class ConsoleWriter:
@@ -51,6 +52,7 @@ class ConsoleWriter:
         if atestlist.numActive() > 0:
             self.writeResultsList( atestlist )
             self.writeListSummary( atestlist, 'Summary:' )
+            self.writeResourceUsage( atestlist )
 
         fin = runinfo['finishepoch']
         fdate = time.ctime( fin )
@@ -71,6 +73,39 @@ class ConsoleWriter:
         self.write( label )
         self._write_summary( atestlist )
 
+    def writeResourceUsage(self, atestlist):
+        """
+        Writes the total CPU time of the tests, and the tests that used the
+        most CPU time and memory.  Nothing is written if no test has
+        resource usage recorded.
+        """
+        tcaseL = atestlist.getActiveTests()
+
+        total,cpuL,memL = outpututils.top_resource_users( tcaseL )
+
+        if len( cpuL ) > 0:
+
+            cwd = os.getcwd()
+
+            self.write( 'Resource usage:' )
+            self.iwrite( 'cpu time:', outpututils.pretty_time( total ), 'total' )
+            for tcase in cpuL:
+                tm = outpututils.pretty_time( tcase.getStat().getCPUTime() )
+                self._write_resource_line( tm, tcase, cwd )
+
+            if len( memL ) > 0:
+                self.iwrite( 'max memory:' )
+                for tcase in memL:
+                    mem = tcase.getStat().getMaxMemory()
+                    mem = outpututils.pretty_memory( mem )
+                    self._write_resource_line( mem, tcase, cwd )
+
+    def _write_resource_line(self, value, tcase, cwd):
+        ""
+        xdir = tcase.getSpec().getDisplayString()
+        path = pathutil.relative_execute_directory( xdir, self.testdir, cwd )
+        self.iwrite( '   %10s ' % value, path )
+
     def writeActiveList(self, atestlist, abbreviate):
         ""
         if self.verbose > 1:
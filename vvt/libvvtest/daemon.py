@@ -0,0 +1,803 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import time
+import errno
+import stat
+import signal
+import socket
+import select
+import struct
+import json
+import copy
+import pickle
+import fcntl
+import traceback
+from os.path import join as pjoin, normpath, dirname
+
+from .errors import FatalError
+
+
+"""
+A vvtest daemon serves vvtest commands over a Unix domain socket, so that
+repeated commands skip the Python start up and module imports, and reuse the
+test specifications parsed by previous commands.
+
+The daemon is started with "vvtest --daemon" and creates the socket file
+named by 'socket_filename' in the current directory.  Only the user running
+the daemon can connect to it: the socket file is readable and writable by
+the owner only, and connections from other users are closed.  A vvtest command run
+in that directory (or below it) finds the socket and sends its command line,
+working directory and environment to the daemon, then writes out the output
+it gets back and exits with the same exit status.
+
+Each request is handled by a forked child of the daemon, which runs the
+command in its own forked child, in its own process group.  So a command
+cannot change the state of the daemon, and an interrupt (Control-C) of the
+client is sent to the command the same way it would be when running vvtest
+directly.  Commands that run tests are run one at a time, in the order
+received, while information queries (such as -i) are run right away.
+
+The test files parsed by the command are sent back to the daemon and cached,
+keyed by the test file name, the platform and options, and the modification
+time and size of the test file and its insert files.  The test files found
+in each scanned directory and the outcome of the filters that only depend on
+the test file are cached the same way, and kept while the directories and
+the test files are not modified.  The runtime history and test results files
+are read by each command, as other vvtest processes may change them.
+
+The request includes the path to the vvtest script run by the client, and
+the daemon refuses the request if it is not the vvtest it runs (so another
+vvtest version never runs the command).  The client then runs the command
+itself.
+
+Messages are frames: a kind byte, eight hex digits giving the length, then
+the data.  The client sends a request (R) then optionally interrupts (I).
+The daemon sends standard output (O) and error (E) data, then the exit
+status (X), or it refuses the request (N) with the reason.
+"""
+
+socket_filename = '.vvtest_daemon'
+
+# seconds to wait for the output of processes left over by a command
+LEFTOVER_OUTPUT_TIMEOUT = 2
+
+# seconds to wait for a client to send its request
+REQUEST_TIMEOUT = 10
+
+
+def find_daemon_socket( argv, environ ):
+    """
+    Returns the daemon socket file in the current directory or a parent
+    directory, or None if there is not one or the daemon should not be used.
+    The daemon is not used by vvtest commands run by tests or batch jobs
+    (they would wait on the command running them), nor when the --daemon or
+    --no-daemon option is given.
+    """
+    if environ.get( 'VVTEST_TEST_ROOT', None ) != None:
+        return None
+
+    for arg in argv[1:]:
+        if arg in [ '--daemon', '--no-daemon' ] or arg.startswith( '--qsub-id' ):
+            return None
+
+    d = os.getcwd()
+    while True:
+        fn = pjoin( d, socket_filename )
+        try:
+            if stat.S_ISSOCK( os.stat( fn ).st_mode ):
+                return fn
+        except OSError:
+            pass
+        nextd = dirname( d )
+        if nextd == d:
+            return None
+        d = nextd
+
+
+def run_client( sockfile, argv, exepath ):
+    """
+    Has the daemon listening on 'sockfile' run the vvtest command line
+    'argv', where 'exepath' is the path to the vvtest script.  Returns the
+    exit status, or None if the daemon did not respond or refused the
+    command (a warning is printed), in which case the command should be
+    run without the daemon.
+    """
+    sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+    try:
+        # a relative path avoids the length limit on socket file names
+        sock.connect( os.path.relpath( sockfile ) )
+    except socket.error:
+        sock.close()
+        print3( '*** warning: the vvtest daemon at', sockfile,
+                'is not responding; running without it' )
+        return None
+
+    def interrupt( signum, frame ):
+        send_frame( sock, b'I', b'' )
+
+    prev = signal.signal( signal.SIGINT, interrupt )
+    try:
+        req = { 'argv':argv, 'cwd':os.getcwd(), 'environ':dict( os.environ ),
+                'exepath':exepath }
+        send_frame( sock, b'R', json.dumps( req ).encode( 'utf-8' ) )
+
+        while True:
+            frame = recv_frame( sock )
+            if frame == None:
+                sys.stderr.write( '*** vvtest error: '
+                                  'lost connection to the vvtest daemon\n' )
+                return 1
+
+            kind,data = frame
+            if kind == b'O':
+                sys.stdout.flush()
+                write_all( 1, data )
+            elif kind == b'E':
+                sys.stderr.flush()
+                write_all( 2, data )
+            elif kind == b'X':
+                return int( data.decode( 'ascii' ) )
+            elif kind == b'N':
+                print3( '*** warning:', data.decode( 'utf-8' )+';',
+                        'running without the vvtest daemon' )
+                return None
+
+    finally:
+        signal.signal( signal.SIGINT, prev )
+        sock.close()
+
+
+class VvtestDaemon:
+
+    def __init__(self, run_func, cache, exepath):
+        """
+        The 'run_func' is called with a vvtest command line (a list) in the
+        child process, and returns the exit status.  The 'cache' is the
+        ParseCache used by 'run_func'.  Only requests from clients running
+        the vvtest script 'exepath' are served.
+        """
+        self.run_func = run_func
+        self.cache = cache
+        self.exepath = exepath
+
+        self.sock = None
+
+    def bind(self):
+        """
+        Creates the socket file in the current directory.  A socket file left
+        by a daemon that is no longer running is replaced.
+        """
+        if os.path.exists( socket_filename ):
+            probe = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+            try:
+                probe.connect( socket_filename )
+            except socket.error:
+                os.remove( socket_filename )
+            else:
+                raise FatalError( 'a vvtest daemon is already running '
+                                  'in this directory' )
+            finally:
+                probe.close()
+
+        self.sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+
+        # only the owner may connect, as commands run with the daemon's rights
+        mask = os.umask( 0o077 )
+        try:
+            self.sock.bind( socket_filename )
+        finally:
+            os.umask( mask )
+        os.chmod( socket_filename, stat.S_IRUSR | stat.S_IWUSR )
+
+        self.sock.listen( 5 )
+
+        self.sockfile = os.path.abspath( socket_filename )
+
+    def getSocketFilename(self):
+        ""
+        return self.sockfile
+
+    def serve(self):
+        """
+        Serves requests until interrupted.  Each request is handled by a
+        forked process.  Commands that run tests are run one at a time, but
+        information queries (such as -i) are served while a run is in
+        progress.  The socket file is removed on return.
+        """
+        # a daemon started in the background may inherit an ignored SIGINT
+        signal.signal( signal.SIGINT, signal.default_int_handler )
+        signal.signal( signal.SIGTERM, exit_on_signal )
+
+        self.handlers = {}  # result pipe -> [ pid, is a run, list of data ]
+        self.pending = []   # ( conn, request ) of runs waiting their turn
+
+        try:
+            while True:
+                fdL = [ self.sock ] + list( self.handlers.keys() )
+                try:
+                    rdL = select.select( fdL, [], [] )[0]
+                except select.error:
+                    if sys.exc_info()[1].args[0] == errno.EINTR:
+                        continue
+                    raise
+
+                for fd in rdL:
+                    if fd == self.sock:
+                        self.acceptRequest()
+                    else:
+                        self.readHandlerResult( fd )
+
+        finally:
+            self.sock.close()
+            for conn,req in self.pending:
+                conn.close()
+            if os.path.exists( self.sockfile ):
+                os.remove( self.sockfile )
+
+    def acceptRequest(self):
+        ""
+        try:
+            conn,addr = self.sock.accept()
+        except socket.error:
+            if sys.exc_info()[1].args[0] == errno.EINTR:
+                return
+            raise
+
+        try:
+            req = self.readRequest( conn )
+        except Exception:
+            print3( '*** warning: vvtest daemon request failed:',
+                    sys.exc_info()[1] )
+            req = None
+
+        if req == None:
+            conn.close()
+        elif is_information_query( req['argv'] ) or not self.isRunning():
+            self.startHandler( conn, req )
+        else:
+            print3( 'Waiting on the current run:', ' '.join( req['argv'][1:] ) )
+            self.pending.append( ( conn, req ) )
+
+    def readRequest(self, conn):
+        """
+        Returns the request sent on 'conn', or None if it is refused.
+        """
+        uid = get_peer_uid( conn )
+        if uid != None and uid != os.getuid():
+            print3( '*** warning: vvtest daemon refused a connection '
+                    'from user id', uid )
+            return None
+
+        # a client that never sends its request must not hold up the daemon
+        conn.settimeout( REQUEST_TIMEOUT )
+        frame = recv_frame( conn )
+        conn.settimeout( None )
+        if frame == None or frame[0] != b'R':
+            return None
+
+        req = json.loads( frame[1].decode( 'utf-8' ) )
+
+        if req.get( 'exepath', None ) != self.exepath:
+            msg = 'the vvtest daemon runs '+str(self.exepath) + \
+                  ', not '+str( req.get( 'exepath', None ) )
+            print3( '*** warning: vvtest daemon refused a request:', msg )
+            send_frame( conn, b'N', msg.encode( 'utf-8' ) )
+            return None
+
+        return req
+
+    def isRunning(self):
+        """
+        True if a command that runs tests is in progress.
+        """
+        for pid,isrun,bufL in self.handlers.values():
+            if isrun:
+                return True
+        return False
+
+    def startHandler(self, conn, req):
+        ""
+        resultr,resultw = os.pipe()
+
+        sys.stdout.flush() ; sys.stderr.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            os.close( resultr )
+            self._run_handler( conn, req, resultw )
+
+        os.close( resultw )
+        conn.close()
+
+        isrun = not is_information_query( req['argv'] )
+        self.handlers[ resultr ] = [ pid, isrun, [] ]
+
+    def readHandlerResult(self, fd):
+        """
+        Reads the cache additions sent by a request handler.  Once the
+        handler is done, they are merged into the cache, and the next run
+        waiting its turn is started.
+        """
+        pid,isrun,bufL = self.handlers[ fd ]
+
+        buf = os.read( fd, 65536 )
+        if buf:
+            bufL.append( buf )
+            return
+
+        os.close( fd )
+        self.handlers.pop( fd )
+        os.waitpid( pid, 0 )
+
+        data = b''.join( bufL )
+        if data:
+            try:
+                self.cache.merge( pickle.loads( data ) )
+            except Exception:
+                print3( '*** warning: could not read the parsed tests '
+                        'of the request:', sys.exc_info()[1] )
+
+        if isrun and len( self.pending ) > 0:
+            conn,req = self.pending.pop( 0 )
+            self.startHandler( conn, req )
+
+    def _run_handler(self, conn, req, resultw):
+        """
+        Runs the request, sends the cache additions of the command to the
+        daemon on the 'resultw' pipe, and exits (it never returns).
+        """
+        try:
+            # a Control-C of the daemon lets the request finish
+            signal.signal( signal.SIGINT, signal.SIG_IGN )
+            signal.signal( signal.SIGTERM, signal.SIG_DFL )
+
+            self.sock.close()
+            for fd in self.handlers.keys():
+                os.close( fd )
+            for pconn,preq in self.pending:
+                pconn.close()
+
+            self.resultw = resultw
+
+            data = self.handleRequest( conn, req )
+            write_all( resultw, data )
+
+        except BaseException:
+            traceback.print_exc()
+
+        try:
+            sys.stdout.flush() ; sys.stderr.flush()
+        finally:
+            os._exit( 0 )
+
+    def handleRequest(self, conn, req):
+        """
+        Runs the command of the request in a child process, relaying its
+        output to the client.  Returns the cache additions of the command.
+        """
+        print3( 'Request:', ' '.join( req['argv'][1:] ),
+                '(in '+req['cwd']+')' )
+        t0 = time.time()
+
+        outr,outw = os.pipe()
+        errr,errw = os.pipe()
+        cacher,cachew = os.pipe()
+
+        sys.stdout.flush() ; sys.stderr.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            os.close( outr ) ; os.close( errr ) ; os.close( cacher )
+            conn.close()
+            self._run_child( req, outw, errw, cachew )
+
+        os.close( outw ) ; os.close( errw ) ; os.close( cachew )
+
+        x,data = relay_child_output( conn, pid, outr, errr, cacher )
+
+        try:
+            send_frame( conn, b'X', str(x).encode( 'ascii' ) )
+        except socket.error:
+            pass
+
+        print3( 'Exit status', x, 'after %.2f seconds' % ( time.time()-t0 ) )
+
+        return data
+
+    def _run_child(self, req, outw, errw, cachew):
+        """
+        Runs the request and exits (it never returns).
+        """
+        x = 1
+        try:
+            signal.signal( signal.SIGINT, signal.default_int_handler )
+            signal.signal( signal.SIGTERM, signal.SIG_DFL )
+            os.setpgid( 0, 0 )
+
+            os.close( self.resultw )
+
+            fd = os.open( os.devnull, os.O_RDONLY )
+            os.dup2( fd, 0 ) ; os.close( fd )
+            os.dup2( outw, 1 ) ; os.close( outw )
+            os.dup2( errw, 2 ) ; os.close( errw )
+
+            # tests launched by the command do not need the cache pipe
+            fcntl.fcntl( cachew, fcntl.F_SETFD, fcntl.FD_CLOEXEC )
+
+            os.chdir( req['cwd'] )
+            os.environ.clear()
+            os.environ.update( req['environ'] )
+            sys.argv = list( req['argv'] )
+
+            self.cache.clearAdditions()
+
+            x = run_command( self.run_func, sys.argv )
+
+            data = pickle.dumps( self.cache.getAdditions(), 2 )
+            write_all( cachew, data )
+
+        except BaseException:
+            traceback.print_exc()
+
+        try:
+            sys.stdout.flush() ; sys.stderr.flush()
+        finally:
+            os._exit( x )
+
+
+def is_information_query( argv ):
+    """
+    True if the vvtest command line 'argv' only prints information about
+    the tests (it does not run them).
+    """
+    for arg in argv[1:]:
+        if arg in [ '-i', '--keys', '--files' ]:
+            return True
+    return False
+
+
+def run_command( run_func, argv ):
+    """
+    Calls 'run_func' with 'argv' and returns the exit status, the same as
+    the exit status of a vvtest process.
+    """
+    try:
+        x = run_func( argv )
+    except SystemExit:
+        x = sys.exc_info()[1].code
+        if x != None and type(x) != type(0):
+            sys.stderr.write( str(x)+'\n' )
+            x = 1
+    except KeyboardInterrupt:
+        x = 1
+    except Exception:
+        traceback.print_exc()
+        x = 1
+
+    if not x:
+        x = 0
+
+    return x
+
+
+def relay_child_output( conn, pid, outr, errr, cacher ):
+    """
+    Sends the output of the child to the client, and passes interrupts from
+    the client to the child process group, until the child exits.  Returns
+    the exit status of the child and the data written to the 'cacher' pipe.
+    """
+    kinds = { outr:b'O', errr:b'E' }
+    fdL = [ conn, outr, errr, cacher ]
+    cacheL = []
+    client_ok = True
+
+    x = None
+    tdone = None
+    while True:
+
+        pipeL = [ fd for fd in fdL if fd != conn ]
+
+        if x == None:
+            # once the output is closed, the child is done or nearly so
+            opts = os.WNOHANG if len( pipeL ) > 0 else 0
+            cpid,status = os.waitpid( pid, opts )
+            if cpid == pid:
+                x = decode_exit_status( status )
+                tdone = time.time()
+
+        if x != None and ( len( pipeL ) == 0 or
+                           time.time()-tdone > LEFTOVER_OUTPUT_TIMEOUT ):
+            break
+
+        try:
+            rdL = select.select( fdL, [], [], 0.5 )[0]
+        except select.error:
+            rdL = []
+
+        for fd in rdL:
+            if fd == conn:
+                frame = recv_frame( conn )
+                if frame == None:
+                    # the client went away, so interrupt the command
+                    client_ok = False
+                    fdL.remove( conn )
+                    interrupt_process_group( pid )
+                elif frame[0] == b'I':
+                    interrupt_process_group( pid )
+            else:
+                buf = os.read( fd, 65536 )
+                if not buf:
+                    fdL.remove( fd )
+                elif fd == cacher:
+                    cacheL.append( buf )
+                elif client_ok:
+                    try:
+                        send_frame( conn, kinds[fd], buf )
+                    except socket.error:
+                        client_ok = False
+
+    for fd in [ outr, errr, cacher ]:
+        os.close( fd )
+
+    return x, b''.join( cacheL )
+
+
+def exit_on_signal( signum, frame ):
+    ""
+    raise SystemExit( 1 )
+
+
+def interrupt_process_group( pid ):
+    ""
+    try:
+        os.kill( -pid, signal.SIGINT )
+    except Exception:
+        pass
+
+
+def decode_exit_status( status ):
+    ""
+    if os.WIFEXITED( status ):
+        return os.WEXITSTATUS( status )
+    return 1
+
+
+def get_peer_uid( conn ):
+    """
+    Returns the user id of the process connected to the Unix socket 'conn',
+    or None if the platform does not provide it.
+    """
+    if hasattr( socket, 'SO_PEERCRED' ):
+        fmt = '3i'  # pid, uid, gid
+        cred = conn.getsockopt( socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                struct.calcsize( fmt ) )
+        return struct.unpack( fmt, cred )[1]
+
+    return None
+
+
+def send_frame( sock, kind, data ):
+    ""
+    sock.sendall( kind + ( '%08x' % len(data) ).encode( 'ascii' ) + data )
+
+
+def recv_frame( sock ):
+    """
+    Returns ( kind, data ), or None if the connection was closed.
+    """
+    hdr = recv_bytes( sock, 9 )
+    if hdr == None:
+        return None
+
+    data = recv_bytes( sock, int( hdr[1:].decode( 'ascii' ), 16 ) )
+    if data == None:
+        return None
+
+    return hdr[:1], data
+
+
+def recv_bytes( sock, num ):
+    ""
+    bufL = []
+    while num > 0:
+        try:
+            buf = sock.recv( num )
+        except socket.error:
+            if sys.exc_info()[1].args[0] == errno.EINTR:
+                continue
+            return None
+        if not buf:
+            return None
+        bufL.append( buf )
+        num -= len(buf)
+
+    return b''.join( bufL )
+
+
+def write_all( fd, data ):
+    ""
+    while data:
+        n = os.write( fd, data )
+        data = data[n:]
+
+
+class ParseCache:
+    """
+    Keeps the test specifications parsed from each test file, for as long
+    as the test file and its insert files are not modified.  Other values
+    computed from files are kept the same way, under their own 'kind' of
+    entry (see ScanCache and FilterCache).
+    """
+
+    def __init__(self):
+        ""
+        self.entries = {}  # ( kind, key ) -> ( file stats, value )
+        self.added = {}    # the entries added since clearAdditions()
+
+    def numEntries(self, kind='parse'):
+        ""
+        return len( [ k for k in self.entries.keys() if k[0] == kind ] )
+
+    def get(self, key, kind='parse'):
+        """
+        Returns the value (a list of TestSpec by default) stored for 'key',
+        or None if there is none or a file was modified since.
+        """
+        ent = self.entries.get( ( kind, key ), None )
+        if ent != None:
+            stats,value = ent
+            if get_file_stats( stats.keys() ) == stats:
+                return value
+        return None
+
+    def put(self, key, stats, value, kind='parse'):
+        ""
+        self.entries[ ( kind, key ) ] = ( stats, value )
+        self.added[ ( kind, key ) ] = ( stats, value )
+
+    def clearAdditions(self):
+        ""
+        self.added = {}
+
+    def getAdditions(self):
+        ""
+        return self.added
+
+    def merge(self, entries):
+        ""
+        self.entries.update( entries )
+
+
+class ScanCache:
+    """
+    Keeps the test files found by scanning each directory, for as long as
+    none of the directories scanned are modified (which happens when a file
+    or directory in it is added, removed or renamed).
+    """
+
+    def __init__(self, cache):
+        ""
+        self.cache = cache
+
+    def get(self, path):
+        """
+        Returns the list of test files (relative to 'path') found in the scan
+        of directory 'path', or None.
+        """
+        fileL = self.cache.get( path, 'scan' )
+        if fileL != None:
+            return list( fileL )
+        return None
+
+    def put(self, path, dirs, files):
+        """
+        Stores the test 'files' found in 'path', where 'dirs' are all the
+        directories scanned.
+        """
+        self.cache.put( path, get_file_stats( dirs ), list( files ), 'scan' )
+
+
+class FilterCache:
+    """
+    Keeps the outcome of the filters that only depend on the test file and
+    the filter options (see TestFilter.checkSpecification), for as long as
+    the test file and its insert files are not modified.
+    """
+
+    def __init__(self, cache, rtconfig):
+        ""
+        self.cache = cache
+        self.rtconfig = rtconfig
+
+    def get(self, tspec):
+        ""
+        return self.cache.get( self._make_key( tspec ), 'filter' )
+
+    def put(self, tspec, outcome):
+        ""
+        fname = normpath( pjoin( tspec.getRootpath(), tspec.getFilepath() ) )
+        stats = get_file_stats( [ fname ] + list( tspec.getInsertFiles() ) )
+        self.cache.put( self._make_key( tspec ), stats, outcome, 'filter' )
+
+    def _make_key(self, tspec):
+        ""
+        # the options can change after the filter is made (in -i mode)
+        attrs = []
+        for name in [ 'param_expr_list', 'keyword_expr', 'option_list',
+                      'platform_name', 'ignore_platforms', 'set_platform_expr',
+                      'include_tdd' ]:
+            attrs.append( ( name, str( self.rtconfig.getAttr( name, None ) ) ) )
+
+        return repr( ( attrs, tspec.getRootpath(), tspec.getFilepath(),
+                       tspec.getID() ) )
+
+
+class CachingTestCreator:
+    """
+    Wraps a TestCreator so that test files are only parsed if they are not
+    in the ParseCache.  Each caller gets its own copy of the tests.
+    """
+
+    def __init__(self, creator, cache, platname, optionlist):
+        ""
+        self.creator = creator
+        self.cache = cache
+        self.config = ( platname, tuple( optionlist ) )
+
+    def fromFile(self, rootpath, relpath, force_params):
+        ""
+        params = None
+        if force_params != None:
+            params = list( force_params.items() )
+            params.sort()
+
+        key = repr( ( self.config, rootpath, relpath, params ) )
+
+        testL = self.cache.get( key )
+
+        if testL == None:
+            fname = normpath( pjoin( rootpath, relpath ) )
+            stats = get_file_stats( [ fname ] )
+
+            # tests that fail to parse are not cached
+            testL = self.creator.fromFile( rootpath, relpath, force_params )
+
+            inserts = set()
+            for tspec in testL:
+                inserts.update( tspec.getInsertFiles() )
+            stats.update( get_file_stats( inserts ) )
+
+            self.cache.put( key, stats, testL )
+
+        return copy.deepcopy( testL )
+
+    def reparse(self, tspec):
+        ""
+        self.creator.reparse( tspec )
+
+
+def get_file_stats( filenames ):
+    """
+    Returns a dict mapping each file to its ( modification time, size ), or
+    None if it does not exist.
+    """
+    stats = {}
+    for fn in filenames:
+        try:
+            st = os.stat( fn )
+        except OSError:
+            stats[ fn ] = None
+        else:
+            stats[ fn ] = ( st.st_mtime, st.st_size )
+    return stats
+
+
+def print3( *args ):
+    ""
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
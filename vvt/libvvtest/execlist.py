@@ -22,6 +22,9 @@ class TestExecList:
         self.started = {}  # TestSpec ID -> TestCase object
         self.stopped = {}  # TestSpec ID -> TestCase object
 
+        self.priority = {}  # TestSpec ID -> launch priority (lowest first)
+        self.levels = [ 0 ]  # the distinct priority values, sorted
+
     def createTestExecs(self, test_dir, platform, rtconfig, perms):
         """
         Creates the set of TestExec objects from the active test list.
@@ -30,14 +33,23 @@ class TestExecList:
                                         rtconfig, self.plugin,
                                         perms )
 
-        self._createTestExecList( perms )
-        
+        self._createTestExecList( perms,
+                                  rtconfig.getAttr( 'failuresfirst', False ) )
+
         for tcase in self.getTestExecList():
             runner.initialize_for_execution( tcase )
 
-    def _createTestExecList(self, perms):
+    def createTestExecListOnly(self):
+        """
+        Creates the TestExec list and connects the dependencies, but leaves
+        the tests and their previous results alone (nothing will be run).
+        """
+        self._createTestExecList( None )
+
+    def _createTestExecList(self, perms, failures_first=False):
         ""
         self.xtlist = {}
+        self.priority = {}
 
         for tcase in self.tlist.getTests():
 
@@ -55,6 +67,14 @@ class TestExecList:
                 else:
                     self.xtlist[np] = [ tcase ]
 
+                if failures_first:
+                    # must be done before the previous results are reset
+                    self.priority[ tspec.getID() ] = \
+                                    failures_first_priority( tcase )
+
+        self.levels = list( set( [ 0 ] + list( self.priority.values() ) ) )
+        self.levels.sort()
+
         # sort tests longest running first; 
         self.sortTestExecList()
 
@@ -75,23 +95,33 @@ class TestExecList:
 
             depend.check_connect_dependencies( tcase, tmap )
 
-    def sortTestExecList(self):
+    def sortTestExecList(self, sortkey=None):
         """
         Sort the TestExec objects by runtime, descending order.  This is so
         popNext() will try to avoid launching long running tests at the end
         of the testing sequence, which can add significantly to the total wall
         time.
+
+        Tests with a launch priority (see --failures-first) are sorted by
+        priority first, then by runtime.
+
+        If 'sortkey' is given, it is a function of a TestCase used to sort
+        instead (ascending order), such as for trying other policies.
         """
         for np,tcaseL in self.xtlist.items():
+            if sortkey != None:
+                tcaseL.sort( key=sortkey )
+                continue
             sortL = []
             for tcase in tcaseL:
                 tm = tcase.getStat().getRuntime( None )
                 if tm == None: tm = 0
                 xdir = tcase.getSpec().getDisplayString()
-                sortL.append( (tm,xdir,tcase) )
+                pri = self._get_priority( tcase )
+                sortL.append( (-pri,tm,xdir,tcase) )
             sortL.sort()
             sortL.reverse()
-            tcaseL[:] = [ tcase for tm,xdir,tcase in sortL ]
+            tcaseL[:] = [ T[-1] for T in sortL ]
 
     def getTestExecProcList(self):
         """
@@ -121,7 +151,8 @@ class TestExecList:
         Finds a test to execute.  Returns a TestExec object, or None if no
         test can run.  In this case, one of the following is true
         
-            1. there are not enough free processors to run another test
+            1. there are not enough free processors (or memory) to run
+               another test
             2. the only tests left are parent tests that cannot be run
                because one or more of their children did not pass or diff
 
@@ -131,10 +162,12 @@ class TestExecList:
         npL.sort()
         npL.reverse()
 
-        # find longest runtime test such that the num procs is available
+        # find the highest priority, longest runtime test such that the num
+        # procs and memory are available
         tcase = self._pop_next_test( npL, platform )
         if tcase == None and len(self.started) == 0:
-            # search for tests that need more processors than platform has
+            # search for tests that need more processors or memory than the
+            # platform has
             tcase = self._pop_next_test( npL )
 
         if tcase != None:
@@ -149,7 +182,7 @@ class TestExecList:
 
         np = int( tspec.getParameters().get('np', 0) )
 
-        obj = platform.obtainProcs( np )
+        obj = platform.obtainProcs( np, get_test_memory( tcase ) )
         texec.setResourceObject( obj )
 
         texec.start( baseline )
@@ -167,16 +200,43 @@ class TestExecList:
             self.xtlist.pop( np )
         return tL
 
+    def addTest(self, tcase):
+        """
+        Puts a test (previously removed with popRemaining()) back into the
+        run list.
+        """
+        np = int( tcase.getSpec().getParameters().get('np', 0) )
+        if np in self.xtlist:
+            self.xtlist[np].append( tcase )
+        else:
+            self.xtlist[np] = [ tcase ]
+
+    def removeTest(self, tcase):
+        """
+        Removes a test from the run list.  Returns True if it was there.
+        """
+        np = int( tcase.getSpec().getParameters().get('np', 0) )
+        tcaseL = self.xtlist.get( np, [] )
+        for i,tc in enumerate( tcaseL ):
+            if tc is tcase:
+                self._pop_test_exec( np, i )
+                return True
+        return False
+
     def getRunning(self):
         """
         Return the list of TestCase that are still running.
         """
         return self.started.values()
 
-    def testDone(self, tcase):
-        ""
+    def testDone(self, tcase, record=True):
+        """
+        Moves the test from the running to the done list.  If 'record' is
+        True, the test result is appended to the TestList results file.
+        """
         xid = tcase.getSpec().getID()
-        self.tlist.appendTestResult( tcase )
+        if record:
+            self.tlist.appendTestResult( tcase )
         self.started.pop( xid, None )
         self.stopped[ xid ] = tcase
 
@@ -194,22 +254,64 @@ class TestExecList:
 
     def _pop_next_test(self, npL, platform=None):
         ""
-        for np in npL:
-            if platform == None or platform.queryProcs(np):
-                tcaseL = self.xtlist[np]
-                N = len(tcaseL)
-                i = 0
-                while i < N:
-                    tcase = tcaseL[i]
-                    if tcase.getBlockingDependency() == None:
-                        self._pop_test_exec( np, i )
-                        return tcase
-                    i += 1
+        for level in self.levels:
+            for np in npL:
+                if platform == None or platform.queryProcs(np):
+                    tcaseL = self.xtlist[np]
+                    N = len(tcaseL)
+                    i = 0
+                    while i < N:
+                        tcase = tcaseL[i]
+                        if self._get_priority( tcase ) <= level and \
+                           tcase.getBlockingDependency() == None and \
+                           ( platform == None or
+                             platform.queryMemory( get_test_memory( tcase ) ) ):
+                            self._pop_test_exec( np, i )
+                            return tcase
+                        i += 1
         return None
 
+    def _get_priority(self, tcase):
+        ""
+        return self.priority.get( tcase.getSpec().getID(), 0 )
+
     def _pop_test_exec(self, np, i):
         ""
         tcaseL = self.xtlist[np]
         del tcaseL[i]
         if len(tcaseL) == 0:
             self.xtlist.pop( np )
+
+
+def failures_first_priority( tcase ):
+    """
+    Returns 0 for a test that failed, diffed or timed out the last time it
+    was run (in the test results directory, or else as recorded in the
+    runtime history or runtimes file), 1 for a new test (no previous result
+    or runtime), and 2 otherwise.  A test interrupted by vvtest (see
+    --fail-fast) is treated as not done.
+    """
+    tstat = tcase.getStat()
+
+    result = tstat.getResultStatus()
+    runtime = tstat.getRuntime( None )
+    if tstat.isInterrupted():
+        # neither its result nor its runtime is known
+        result = 'notdone'
+        runtime = None
+
+    if result in [ 'notrun', 'notdone' ]:
+        result = tcase.getPreviousResult()
+
+    if result in [ 'fail', 'diff', 'timeout' ]:
+        return 0
+    elif result == None and runtime == None:
+        return 1
+    return 2
+
+
+def get_test_memory( tcase ):
+    """
+    The memory requirement of the test in kilobytes, or None if not known.
+    """
+    return tcase.getSpec().getAttr( 'memory', None )
@@ -46,7 +46,7 @@ def run_batch( batch, tlist, xlist, perms, results_writer,
             elif schedule.numInFlight() == 0:
                 break
             else:
-                sleep_with_info_check( info, qsleep )
+                sleep_with_info_check( info, schedule.getPollInterval( qsleep ) )
 
             qidL,doneL = schedule.checkdone()
             
@@ -77,6 +77,7 @@ def run_batch( batch, tlist, xlist, perms, results_writer,
 
         # any remaining tests cannot be run; flush then print warnings
         NS, NF, nrL = schedule.flush()
+        leftL = schedule.getUnfinishedWork()
 
     finally:
         tlist.writeFinished()
@@ -85,7 +86,7 @@ def run_batch( batch, tlist, xlist, perms, results_writer,
 
     perms.set( os.path.abspath( rfile ) )
 
-    if len(NS)+len(NF)+len(nrL) > 0:
+    if len(NS)+len(NF)+len(nrL)+len(leftL) > 0:
         print3()
     if len(NS) > 0:
       print3( "*** Warning: these batch numbers did not seem to start:",
@@ -99,18 +100,34 @@ def run_batch( batch, tlist, xlist, perms, results_writer,
         xdir1 = tcase1.getSpec().getDisplayString()
         print3( '*** Warning: test "'+xdir0+'"',
                 'notrun due to dependency "' + xdir1 + '"' )
+    for tcase,reason in leftL:
+        xdir = tcase.getSpec().getDisplayString()
+        if tcase.getStat().isNotrun():
+            print3( '*** Warning: test "'+xdir+'" notrun:', reason )
+        else:
+            print3( '*** Warning: test "'+xdir+'" notdone:', reason )
 
 
 def sleep_with_info_check( info, qsleep ):
     ""
-    for i in range( int( qsleep + 0.5 ) ):
+    for i in range( max( 1, int( qsleep + 0.5 ) ) ):
         info.checkPrint()
         time.sleep( 1 )
 
 
 def run_test_list( qsub_id, tlist, xlist, test_dir, plat,
-                   perms, results_writer ):
-    ""
+                   perms, results_writer, trace=None, workqueue=None,
+                   cache=None, fail_fast=None, fail_interrupt=False ):
+    """
+    Runs the tests in 'xlist'.  If 'workqueue' is given (a pilot batch job),
+    only the tests claimed from the work queue are run.  If 'cache' is given
+    (a ResultCache), tests that passed before with the same inputs are not
+    run, and tests that pass are added to the cache.
+
+    If 'fail_fast' is given, no more tests are started after that many tests
+    fail, diff or time out, and if 'fail_interrupt' is True, the tests still
+    running are interrupted.
+    """
     plat.display()
     starttime = time.time()
     print3( "Start time:", time.ctime() )
@@ -129,9 +146,25 @@ def run_test_list( qsub_id, tlist, xlist, test_dir, plat,
 
         cwd = os.getcwd()
 
+        if cache != None:
+            pass_tests_from_cache( cache, xlist, test_dir )
+
+        feeder = None
+        if workqueue != None:
+            feeder = WorkQueueFeeder( workqueue, xlist,
+                                      'pilot.'+str(qsub_id) )
+
+        numfail = 0
+        stopped = False
+
         while True:
 
-            tnext = xlist.popNext( plat )
+            if stopped or plat.holdLaunches():
+                tnext = None
+            else:
+                tnext = xlist.popNext( plat )
+                if tnext == None and feeder != None and feeder.feed( plat ):
+                    tnext = xlist.popNext( plat )
 
             if tnext != None:
                 tspec = tnext.getSpec()
@@ -139,8 +172,11 @@ def run_test_list( qsub_id, tlist, xlist, test_dir, plat,
                 print3( 'Starting:', exec_path( tspec, test_dir ) )
                 xlist.startTest( tnext, plat )
                 tlist.appendTestResult( tnext )
+                if trace != None:
+                    trace.testStarted( tnext )
 
-            elif xlist.numRunning() == 0:
+            elif xlist.numRunning() == 0 and \
+                 ( stopped or feeder == None or feeder.isEmpty() ):
                 break
 
             else:
@@ -154,8 +190,21 @@ def run_test_list( qsub_id, tlist, xlist, test_dir, plat,
                     xs = XstatusString( tcase, test_dir, cwd )
                     print3( "Finished:", xs )
                     xlist.testDone( tcase )
+                    if cache != None:
+                        cache.store( tcase )
+                    if trace != None:
+                        trace.testStopped( tcase )
                     showprogress = True
 
+                    if fail_fast and not stopped and \
+                       tcase.getStat().getResultStatus() in \
+                                            [ 'fail', 'diff', 'timeout' ]:
+                        numfail += 1
+                        if numfail >= fail_fast:
+                            stopped = True
+                            stop_launching_tests( xlist, numfail,
+                                                  fail_interrupt )
+
             uthook.check( xlist.numRunning(), xlist.numDone() )
 
             results_writer.midrun( tlist )
@@ -171,10 +220,21 @@ def run_test_list( qsub_id, tlist, xlist, test_dir, plat,
     finally:
         tlist.writeFinished()
 
+    throttle = plat.getLoadThrottle()
+    if throttle != None and throttle.getNumHolds() > 0:
+        print3( 'Test launches were held back', throttle.getNumHolds(),
+                'time(s) for a total of',
+                pretty_time( throttle.getHeldTime() ),
+                'due to system load' )
+
     # any remaining tests cannot run, so print warnings
     tcaseL = xlist.popRemaining()
     if len(tcaseL) > 0:
         print3()
+    if stopped:
+        print3( '*** Warning:', len(tcaseL), 'test(s) notrun due to',
+                '--fail-fast' )
+        tcaseL = []
     for tcase in tcaseL:
         deptx = tcase.getBlockingDependency()
         assert tcase.numDependencies() > 0 and deptx != None
@@ -184,6 +244,88 @@ def run_test_list( qsub_id, tlist, xlist, test_dir, plat,
                 'notrun due to dependency "' + depxdir + '"' )
 
 
+def stop_launching_tests( xlist, numfail, interrupt ):
+    """
+    Called when the --fail-fast limit is reached.  If 'interrupt' is True,
+    the running tests are interrupted (and end with a "timeout" result).
+    """
+    msg = 'Fail fast: '+str(numfail)+' test(s) did not pass; no more ' + \
+          'tests will be started'
+
+    running = list( xlist.getRunning() )
+    if interrupt and len( running ) > 0:
+        msg += ', interrupting '+str( len(running) )+' running test(s)'
+        for tcase in running:
+            tcase.getExec().interrupt()
+
+    print3( msg )
+
+
+def pass_tests_from_cache( cache, xlist, test_dir ):
+    """
+    Tests in the run list whose inputs match a previous passing result in
+    the ResultCache are marked as passed and not run.
+    """
+    ntot = len( xlist.getTestExecList() )
+
+    tcaseL = cache.selectCachedTests( xlist.getTestExecList() )
+
+    for tcase in tcaseL:
+        cache.markPassed( tcase )
+        xlist.removeTest( tcase )
+        xlist.testDone( tcase )
+        print3( 'Cached:', exec_path( tcase.getSpec(), test_dir ) )
+
+    print3( 'Result cache:', len(tcaseL), 'of', ntot,
+            'test(s) passed from the cache in', cache.getDirectory() )
+
+
+class WorkQueueFeeder:
+    """
+    Used by pilot batch jobs.  All the tests are removed from the TestExecList
+    up front, then added back one work item at a time as they are claimed
+    from the shared work queue.
+    """
+
+    def __init__(self, workqueue, xlist, owner):
+        ""
+        self.workq = workqueue
+        self.xlist = xlist
+        self.owner = owner + '@' + os.uname()[1] + ':' + str( os.getpid() )
+
+        self.tcasemap = {}
+        for tcase in xlist.popRemaining():
+            self.tcasemap[ tcase.getSpec().getDisplayString() ] = tcase
+
+        self.empty = False
+
+    def feed(self, plat):
+        """
+        If a processor is free, claims the next work item and puts its tests
+        into the TestExecList.  Returns True if a work item was claimed.
+        """
+        if self.empty or not plat.queryProcs( 1 ):
+            return False
+
+        names = self.workq.claim( self.owner )
+        if names == None:
+            self.empty = True
+            return False
+
+        for name in names:
+            tcase = self.tcasemap.pop( name, None )
+            if tcase != None:
+                self.xlist.addTest( tcase )
+
+        return True
+
+    def isEmpty(self):
+        """
+        True if the work queue has no more items to claim.
+        """
+        return self.empty
+
+
 def exec_path( testspec, test_dir ):
     ""
     xdir = testspec.getDisplayString()
@@ -8,13 +8,20 @@ import os, sys
 import re
 import fnmatch
 
+from .sharding import select_shard, read_shard_runtimes
+from .impact import select_affected_tests
+
 
 class TestFilter:
 
-    def __init__(self, rtconfig, user_plugin):
-        ""
+    def __init__(self, rtconfig, user_plugin, cache=None):
+        """
+        If 'cache' is not None, it keeps the outcome of checkSpecification()
+        for each test, such as a daemon.FilterCache.
+        """
         self.rtconfig = rtconfig
         self.plugin = user_plugin
+        self.cache = cache
 
     def checkSubdirectory(self, tcase, subdir):
         ""
@@ -158,16 +165,44 @@ class TestFilter:
 
         return ok
 
+    def checkSpecification(self, tcase):
+        """
+        Applies the permanent filters that only depend on the test file and
+        the filter options.  With a cache, the index of the filter that
+        excluded the test (or -1 if none did) is kept, and only that filter
+        is applied while the test file is unchanged.
+        """
+        checkL = [ lambda t: self.checkParameters( t, permanent=True ),
+                   lambda t: self.checkKeywords( t, results_keywords=False ),
+                   self.checkEnabled,
+                   self.checkPlatform,
+                   self.checkOptions,
+                   self.checkTDD ]
+
+        idx = None
+        if self.cache != None:
+            idx = self.cache.get( tcase.getSpec() )
+
+        if idx == None:
+            idx = -1
+            for i,check in enumerate( checkL ):
+                if not check( tcase ):
+                    idx = i
+                    break
+            if self.cache != None:
+                self.cache.put( tcase.getSpec(), idx )
+
+        elif idx >= 0:
+            # marks the test as skipped
+            checkL[idx]( tcase )
+
+        return idx < 0
+
     def applyPermanent(self, tcase_map):
         ""
         for tcase in tcase_map.values():
 
-            self.checkParameters( tcase, permanent=True ) and \
-                self.checkKeywords( tcase, results_keywords=False ) and \
-                self.checkEnabled( tcase ) and \
-                self.checkPlatform( tcase ) and \
-                self.checkOptions( tcase ) and \
-                self.checkTDD( tcase ) and \
+            self.checkSpecification( tcase ) and \
                 self.checkFileSearch( tcase ) and \
                 self.checkMaxProcessors( tcase ) and \
                 self.checkRuntime( tcase ) and \
@@ -207,6 +242,10 @@ class TestFilter:
 
             self.filterByCummulativeRuntime( tcase_map )
 
+            self.filterByChangedFiles( tcase_map )
+
+            self.filterByShard( tcase_map )
+
     def filterByCummulativeRuntime(self, tcase_map):
         ""
         rtsum = self.rtconfig.getAttr( 'runtime_sum', None )
@@ -233,6 +272,48 @@ class TestFilter:
 
                 i += 1
 
+    def filterByChangedFiles(self, tcase_map):
+        ""
+        changed = self.rtconfig.getAttr( 'changed_files', None )
+        if changed != None:
+
+            index = self.rtconfig.getAttr( 'input_index' )
+
+            tL = []
+            for tcase in tcase_map.values():
+                if not tcase.getStat().skipTest():
+                    tL.append( tcase )
+
+            selL = select_affected_tests( tL, tcase_map, changed, index )
+            keep = set( [ id(t) for t in selL ] )
+
+            for tcase in tL:
+                if id(tcase) not in keep:
+                    tcase.getStat().markSkipByChangeImpact()
+
+    def filterByShard(self, tcase_map):
+        ""
+        shard = self.rtconfig.getAttr( 'shard', None )
+        if shard != None:
+
+            tL = []
+            for tcase in tcase_map.values():
+                if not tcase.getStat().skipTest():
+                    tL.append( tcase )
+
+            runtimes = None
+            fname = self.rtconfig.getAttr( 'shard_runtimes', None )
+            if fname != None:
+                runtimes = read_shard_runtimes( fname )
+
+            keep = set( [ id(t) for t in select_shard( tL, tcase_map,
+                                                      shard[0], shard[1],
+                                                      runtimes ) ] )
+
+            for tcase in tL:
+                if id(tcase) not in keep:
+                    tcase.getStat().markSkipByShard()
+
 
 def clean_up_filter_directory( filter_dir ):
     ""
@@ -7,6 +7,8 @@
 import os, sys
 import time
 
+from .teststatus import RESOURCE_ATTRS as resource_attr_names
+
 
 # this is the file name of source tree runtimes files
 runtimes_filename = "runtimes"
@@ -846,6 +848,10 @@ def make_attr_string( attrD ):
           s = s + ' ' + rs
     if 'TDD' in attrD:
         s += ' TDD'
+    for n in resource_attr_names:
+        v = attrD.get( n, None )
+        if v != None:
+            s += ' '+n+'='+str(v)
     return s.strip()
 
 
@@ -879,6 +885,17 @@ def read_attrs( attrL ):
     if i < len(attrL) and attrL[i] == 'TDD':
         i += 1
         attrD['TDD'] = True
+    while i < len(attrL):
+        nv = attrL[i].split( '=', 1 )
+        if len(nv) == 2 and nv[0] in resource_attr_names:
+            try:
+                if nv[0] in ['utime','stime']:
+                    attrD[ nv[0] ] = float( nv[1] )
+                else:
+                    attrD[ nv[0] ] = int( nv[1] )
+            except Exception:
+                pass
+        i += 1
     return attrD
 
 
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+
+try:
+    from shlex import quote as quote_arg
+except ImportError:
+    from pipes import quote as quote_arg
+
+from .errors import FatalError
+from .TestExec import group_exec_subprocess
+
+
+"""
+Runs tests on a pool of hosts that share the file system with the current
+machine.  The processors of each host are tracked separately, and a test is
+only started on a host with enough free processors for it.
+
+Each host is checked once using a remotepython connection, which also
+counts its processors if the number was not given.  Each test is then run
+through its own ssh session: the test is prepared locally (as usual), then
+a small python script on the host starts the test command in the test
+directory with the same environment.  The exit status of the test comes
+back as the exit status of ssh, and if the ssh session is lost (such as
+when the test times out and is interrupted), the script stops the test.
+"""
+
+# seconds allowed to connect to a host and check it
+CONNECT_TIMEOUT = 60
+
+# environment variables specific to the local machine or login session; the
+# values on the remote host are used instead
+local_environ_names = [ 'HOSTNAME', 'HOST', 'DISPLAY', 'XAUTHORITY',
+                        'SSH_CLIENT', 'SSH_CONNECTION', 'SSH_TTY',
+                        'SSH_AUTH_SOCK', 'PWD', 'OLDPWD', 'SHLVL', '_' ]
+
+
+def parse_host_list( spec ):
+    """
+    The 'spec' is a comma or space separated list of "name" or "name:np",
+    or the name of a file containing such a list (with # comments).  Returns
+    a list of ( name, np ), where np is None if not given.  Raises ValueError
+    on error.
+    """
+    if os.path.isfile( spec ):
+        fp = open( spec, 'r' )
+        try:
+            lines = [ line.split('#',1)[0] for line in fp.readlines() ]
+        finally:
+            fp.close()
+        spec = ' '.join( lines )
+
+    hostL = []
+    names = set()
+    for item in spec.replace( ',', ' ' ).split():
+
+        name,sep,val = item.partition( ':' )
+        np = None
+        if sep:
+            try:
+                np = int( val )
+                assert np > 0
+            except Exception:
+                raise ValueError( 'the number of processors for host ' + \
+                        repr(name)+' must be a positive integer: '+repr(item) )
+
+        if not name:
+            raise ValueError( 'empty host name: '+repr(item) )
+        if name in names:
+            raise ValueError( 'host listed more than once: '+repr(name) )
+
+        names.add( name )
+        hostL.append( ( name, np ) )
+
+    if len( hostL ) == 0:
+        raise ValueError( 'no hosts given' )
+
+    return hostL
+
+
+class Host:
+
+    def __init__(self, name, nprocs):
+        ""
+        self.name = name
+        self.nprocs = nprocs
+        self.nfree = nprocs
+
+    def getName(self): return self.name
+    def numProcs(self): return self.nprocs
+    def numFree(self): return self.nfree
+
+
+class HostPool:
+
+    def __init__(self, hostlist, sshexe=None, pyexe=None):
+        """
+        The 'hostlist' is a list of ( name, np ) as returned from
+        parse_host_list().  If 'sshexe' is None, ssh is found in PATH.  The
+        'pyexe' is the python used on the hosts, which defaults to the
+        current python (the file system is shared).
+        """
+        self.hostlist = list( hostlist )
+        self.sshexe = sshexe
+        self.pyexe = pyexe if pyexe else sys.executable
+
+        self.hosts = []
+
+    def connect(self, directory):
+        """
+        Checks each host with a remotepython connection, and determines the
+        number of processors of hosts that were not given one.  Hosts that
+        cannot be reached, or that do not see 'directory' (the file system
+        is not shared), are dropped with a warning.  A FatalError is raised
+        if no hosts are left.
+        """
+        self.hosts = []
+
+        for name,np in self.hostlist:
+            try:
+                cnt = probe_host( name, directory, self.sshexe, self.pyexe )
+            except Exception:
+                print3( '*** warning: dropping host "'+name+'":',
+                        str( sys.exc_info()[1] ).strip().splitlines()[-1] )
+            else:
+                if np == None:
+                    np = cnt
+                self.hosts.append( Host( name, np ) )
+
+        if len( self.hosts ) == 0:
+            raise FatalError( 'none of the hosts could be used' )
+
+    def addHost(self, name, nprocs):
+        """
+        Adds a host without checking it.
+        """
+        self.hosts.append( Host( name, nprocs ) )
+
+    def getHosts(self):
+        ""
+        return list( self.hosts )
+
+    def numProcs(self):
+        """
+        The total number of processors over all hosts.
+        """
+        return sum( [ h.numProcs() for h in self.hosts ] )
+
+    def numFree(self):
+        ""
+        return sum( [ h.numFree() for h in self.hosts ] )
+
+    def maxHostProcs(self):
+        """
+        The number of processors of the largest host, which is the most any
+        one test can use.
+        """
+        return max( [ h.numProcs() for h in self.hosts ] )
+
+    def query(self, np):
+        """
+        True if some host has 'np' free processors.
+        """
+        for host in self.hosts:
+            if np <= host.nfree:
+                return True
+        return False
+
+    def obtain(self, np):
+        """
+        Takes 'np' processors from the host with the most free processors
+        (the first one listed if more than one), and returns the Host.  If no
+        host is large enough, the test gets all of the host it is put on.
+        """
+        host = None
+        for hst in self.hosts:
+            if host == None or hst.nfree > host.nfree:
+                host = hst
+
+        host.nfree = max( 0, host.nfree - np )
+
+        return host
+
+    def release(self, hostname, np):
+        """
+        Gives back 'np' processors to the host with the given name.
+        """
+        for host in self.hosts:
+            if host.name == hostname:
+                host.nfree = min( host.nprocs, host.nfree + np )
+                break
+
+    def getLauncher(self, host):
+        """
+        Returns a RemoteLauncher for running a test on the given Host.
+        """
+        return RemoteLauncher( host.getName(), self.sshexe, self.pyexe )
+
+    def getDescription(self):
+        ""
+        return ' '.join( [ h.getName()+':'+str(h.numProcs())
+                           for h in self.hosts ] )
+
+
+class RemoteLauncher:
+    """
+    Runs a test command on a host using ssh.  The execute() method is called
+    in the forked child process after the test is prepared to run.
+    """
+
+    def __init__(self, hostname, sshexe=None, pyexe=None):
+        ""
+        self.host = hostname
+        self.sshexe = sshexe
+        self.pyexe = pyexe if pyexe else sys.executable
+
+    def getHost(self):
+        ""
+        return self.host
+
+    def execute(self, cmd_list):
+        """
+        Runs 'cmd_list' on the host in the current working directory and with
+        the current environment, and returns the exit status.
+        """
+        sshL = self.makeCommand( cmd_list, os.getcwd() )
+        envline = repr( make_remote_environ( os.environ ) ) + '\n'
+
+        return group_exec_subprocess( sshL, stdin_data=envline )
+
+    def makeCommand(self, cmd_list, rundir):
+        ""
+        sshL = make_ssh_command( self.sshexe, self.host )
+
+        remL = [ self.pyexe, '-u', '-E', '-c', remote_exec_script, rundir ]
+        remL.extend( cmd_list )
+
+        sshL.append( ' '.join( [ quote_arg(s) for s in remL ] ) )
+
+        return sshL
+
+
+def make_ssh_command( sshexe, hostname ):
+    ""
+    if sshexe:
+        ssh = sshexe
+    else:
+        ssh = 'ssh'
+
+    # -x means do not forward X11, -T means do not allocate a pseudo-tty
+    return [ ssh, '-x', '-T', hostname ]
+
+
+def make_remote_environ( environ ):
+    ""
+    envD = {}
+    for n,v in environ.items():
+        if n not in local_environ_names:
+            envD[n] = v
+    return envD
+
+
+def probe_host( hostname, directory, sshexe, pyexe ):
+    """
+    Connects to the host with remotepython and returns its number of
+    processors.  An exception is raised if the connection fails or the
+    host does not see 'directory'.
+    """
+    from remotepython import RemotePython
+
+    rpy = RemotePython( hostname, sshexe=sshexe, remotepy=pyexe )
+    rpy.addRemoteContent( remote_probe_content )
+    try:
+        rpy.timeout( CONNECT_TIMEOUT ).connect()
+        cnt,found = rpy.timeout( CONNECT_TIMEOUT ).x_probe_host( directory )
+    finally:
+        rpy.shutdown()
+
+    if not found:
+        raise Exception( 'directory not found on host (the file system '
+                         'must be shared): '+directory )
+
+    return max( 1, cnt )
+
+
+remote_probe_content = """
+def probe_host( directory ):
+    cnt = 1
+    try:
+        cnt = int( os.sysconf( 'SC_NPROCESSORS_ONLN' ) )
+    except Exception:
+        try:
+            import multiprocessing
+            cnt = multiprocessing.cpu_count()
+        except Exception:
+            pass
+    return cnt, os.path.isdir( directory )
+"""
+
+
+# run on the host by python -c with arguments: rundir, command...; the first
+# line of stdin is the environment, then stdin is kept open by the local side
+# until the test finishes, so reaching the end means the connection was lost
+remote_exec_script = """
+import os, sys, time, signal, select, subprocess
+env = dict( os.environ )
+env.update( eval( sys.stdin.readline() ) )
+os.chdir( sys.argv[1] )
+proc = subprocess.Popen( sys.argv[2:], env=env, preexec_fn=os.setpgrp )
+def forward( signum, frame ):
+    try: os.killpg( proc.pid, signum )
+    except Exception: pass
+for sig in [ signal.SIGINT, signal.SIGTERM, signal.SIGHUP ]:
+    signal.signal( sig, forward )
+fd = sys.stdin.fileno()
+while proc.poll() == None:
+    try:
+        rd = select.select( [fd], [], [], 1 )[0]
+    except Exception:
+        rd = []
+    if rd and not os.read( fd, 1024 ):
+        forward( signal.SIGINT, None )
+        t0 = time.time()
+        while proc.poll() == None and time.time()-t0 < 10:
+            time.sleep( 0.5 )
+        forward( signal.SIGKILL, None )
+        break
+x = proc.wait()
+if x < 0: x = 1
+sys.exit( x )
+"""
+
+
+def print3( *args ):
+    ""
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
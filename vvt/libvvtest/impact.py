@@ -0,0 +1,383 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import json
+import fnmatch
+from os.path import join as pjoin, normpath, abspath, dirname
+
+from .errors import FatalError
+from .sharding import find_shard_groups
+from . import depend
+
+
+"""
+Selects the tests affected by a set of changed files.  A test is affected if
+a changed file is the test file, an insert directive file it reads, or one of
+the files it links, copies, baselines or lists as needed (or is inside one
+of these, if a directory).  Tests that must run together with an affected
+test (a parameterize/analyze group, the stages of a staged test, and tests
+connected by "depends on") are selected too.
+
+The input files of each test are kept in a persistent index which maps each
+file to the tests that use it, so that finding the affected tests is a few
+lookups per changed file.  The index also records the test file of each test
+and the tests it depends on, so that only the test files of the affected
+tests (and the tests connected to them by "depends on") need to be parsed,
+plus any test files not in the index.  The index is updated from the test
+files that are parsed, and is used as is when tests are not scanned (such as
+in restart mode, where the test specifications are not available).  Tests
+that are not in the index are always selected.
+"""
+
+INDEX_VERSION = 2
+
+index_filename = 'test_inputs.index'
+
+
+def get_index_filename( testing_dir, test_dir ):
+    """
+    The index is stored in the TESTING_DIRECTORY, if defined, so that it
+    spans test results directories.  Otherwise it goes in the test results
+    directory.
+    """
+    if testing_dir and os.path.isdir( testing_dir ):
+        return pjoin( testing_dir, index_filename )
+    return pjoin( test_dir, index_filename )
+
+
+def git_changed_files( base_ref, directory ):
+    """
+    Returns a list of the files (absolute paths) that differ from 'base_ref'
+    in the Git repository containing 'directory', including uncommitted and
+    untracked files.
+    """
+    from gitinterface import GitInterface, GitInterfaceError
+
+    try:
+        git = GitInterface( rootdir=directory )
+        root = git.getRootDir()
+        fileL = git.listChangedFiles( base_ref )
+    except GitInterfaceError:
+        raise FatalError( 'failed to list the files changed since "' + \
+                          base_ref+'": '+str( sys.exc_info()[1] ) )
+
+    return [ normpath( pjoin( root, f ) ) for f in fileL ]
+
+
+def test_key( tspec ):
+    """
+    A string identifying a test across test results directories, which is
+    the test display string under the scan root.
+    """
+    return pjoin( tspec.getRootpath(), tspec.getDisplayString() )
+
+
+def test_input_files( tspec ):
+    """
+    Returns a sorted list of the files (absolute paths) used by the test.
+    These may contain glob patterns.
+    """
+    srcdir = tspec.getDirectory()
+
+    inpS = set( [ normpath( tspec.getFilename() ) ] )
+    for fn in tspec.getInsertFiles():
+        inpS.add( normpath( fn ) )
+    for fn in tspec.getSourceFiles():
+        inpS.add( normpath( pjoin( srcdir, fn ) ) )
+
+    inpL = list( inpS )
+    inpL.sort()
+
+    return inpL
+
+
+class InputIndex:
+
+    def __init__(self, filename):
+        ""
+        self.filename = filename
+
+        self.tests = {}   # test key -> list of input files
+        self.inputs = {}  # input file -> set of test keys
+        self.globs = {}   # input file with a glob pattern -> set of test keys
+        self.files = {}   # test key -> [ scan root, test file relative path ]
+        self.depends = {} # test key -> list of test keys it depends on
+
+        self.modified = False
+
+    def getFilename(self):
+        ""
+        return self.filename
+
+    def readFile(self):
+        """
+        Reads the index file, if it exists.  A file that cannot be read is
+        ignored with a warning (the index is rebuilt as tests are scanned).
+        """
+        if os.path.exists( self.filename ):
+            try:
+                with open( self.filename, 'r' ) as fp:
+                    data = json.load( fp )
+                assert data['version'] == INDEX_VERSION
+                tests = data['tests']
+                inputs = data['inputs']
+                files = data['files']
+                depends = data['depends']
+            except Exception:
+                print3( '*** warning: ignoring test input index file',
+                        self.filename+':', sys.exc_info()[1] )
+            else:
+                self.tests = tests
+                self.files = files
+                self.depends = depends
+                self.inputs = {}
+                for fn,keyL in inputs.items():
+                    self.inputs[fn] = set( keyL )
+                self._collect_glob_inputs()
+
+    def writeFile(self):
+        """
+        Writes the index file if anything changed.  The file is replaced
+        atomically so other vvtest processes see the old or the new index.
+        """
+        if self.modified:
+
+            inputs = {}
+            for fn,keyS in self.inputs.items():
+                keyL = list( keyS )
+                keyL.sort()
+                inputs[fn] = keyL
+
+            data = { 'version': INDEX_VERSION,
+                     'tests': self.tests,
+                     'inputs': inputs,
+                     'files': self.files,
+                     'depends': self.depends }
+
+            tmpf = self.filename + '.' + str( os.getpid() )
+            with open( tmpf, 'w' ) as fp:
+                json.dump( data, fp )
+            os.rename( tmpf, self.filename )
+
+            self.modified = False
+
+    def update(self, tcaseL, tcasemap=None):
+        """
+        Records the input files of each test in 'tcaseL' whose specification
+        was constructed by parsing the test file.  If the 'tcasemap' (TestSpec
+        ID to TestCase) is given, the dependencies of these tests are
+        resolved with it and recorded too.
+        """
+        for tcase in tcaseL:
+            tspec = tcase.getSpec()
+            if tspec.constructionCompleted():
+                key = test_key( tspec )
+
+                inpL = test_input_files( tspec )
+                if self.tests.get( key, None ) != inpL:
+                    self._remove_test( key )
+                    self._add_test( key, inpL )
+                    self.modified = True
+
+                tfile = [ tspec.getRootpath(), tspec.getFilepath() ]
+                if self.files.get( key, None ) != tfile:
+                    self.files[key] = tfile
+                    self.modified = True
+
+                if tcasemap != None:
+                    depL = resolve_dependency_keys( tspec, tcasemap )
+                    if self.depends.get( key, [] ) != depL:
+                        self.depends[key] = depL
+                        self.modified = True
+
+    def hasTest(self, key):
+        ""
+        return key in self.tests
+
+    def getInputFiles(self):
+        """
+        Returns a list of all the input files in the index (some may be glob
+        patterns).
+        """
+        return list( self.inputs.keys() )
+
+    def findTests(self, filenames):
+        """
+        Returns the set of test keys using any of the given files (absolute
+        paths).  A test that uses a directory uses every file under it.
+        """
+        keyS = set()
+
+        for fn in filenames:
+            fn = normpath( abspath( fn ) )
+
+            path = fn
+            while True:
+                keyS.update( self.inputs.get( path, () ) )
+                nextpath = dirname( path )
+                if nextpath == path:
+                    break
+                path = nextpath
+
+            for pat,keys in self.globs.items():
+                if fnmatch.fnmatch( fn, pat ):
+                    keyS.update( keys )
+
+        return keyS
+
+    def getTestFiles(self):
+        """
+        Returns a set of ( scan root, test file relative path ) of every test
+        in the index.
+        """
+        return set( [ tuple(T) for T in self.files.values() ] )
+
+    def findTestFiles(self, filenames):
+        """
+        Returns a set of ( scan root, test file relative path ) of the tests
+        using any of the given files, and of the tests connected to those by
+        "depends on" (in either direction, transitively).
+        """
+        users = {}
+        for key,depL in self.depends.items():
+            for dep in depL:
+                users.setdefault( dep, [] ).append( key )
+
+        keyS = self.findTests( filenames )
+        stack = list( keyS )
+        while len( stack ) > 0:
+            key = stack.pop()
+            for k in self.depends.get( key, [] ) + users.get( key, [] ):
+                if k not in keyS:
+                    keyS.add( k )
+                    stack.append( k )
+
+        fileS = set()
+        for key in keyS:
+            tfile = self.files.get( key, None )
+            if tfile != None:
+                fileS.add( tuple( tfile ) )
+
+        return fileS
+
+    def _add_test(self, key, inpL):
+        ""
+        self.tests[key] = inpL
+        for fn in inpL:
+            keyS = self.inputs.setdefault( fn, set() )
+            keyS.add( key )
+            if is_glob_pattern( fn ):
+                self.globs[fn] = keyS
+
+    def _remove_test(self, key):
+        ""
+        for fn in self.tests.pop( key, [] ):
+            keyS = self.inputs.get( fn, None )
+            if keyS != None:
+                keyS.discard( key )
+                if len( keyS ) == 0:
+                    self.inputs.pop( fn )
+                    self.globs.pop( fn, None )
+
+    def _collect_glob_inputs(self):
+        ""
+        self.globs = {}
+        for fn,keyS in self.inputs.items():
+            if is_glob_pattern( fn ):
+                self.globs[fn] = keyS
+
+
+def resolve_dependency_keys( tspec, tcasemap ):
+    """
+    Returns a sorted list of the keys of the tests in 'tcasemap' that the
+    test depends on.
+    """
+    keyS = set()
+
+    xdir = tspec.getExecuteDirectory()
+    for dep_pat,expr in tspec.getDependencies():
+        for dep_id in depend.find_tests_by_pattern( xdir, dep_pat, tcasemap ):
+            dep = tcasemap.get( dep_id, None )
+            if dep != None:
+                keyS.add( test_key( dep.getSpec() ) )
+
+    keyL = list( keyS )
+    keyL.sort()
+
+    return keyL
+
+
+def make_scan_filter( index, changed ):
+    """
+    Returns a function( scan root, relative file ) that is True for the test
+    files that must be parsed to select the tests affected by the 'changed'
+    files, which are the files of the affected tests and the tests connected
+    to them by "depends on", and the files that are not in the index.
+    """
+    needed = index.findTestFiles( changed )
+    known = index.getTestFiles()
+
+    def parse_file( basedir, relfile ):
+        tfile = ( normpath( basedir ), normpath( relfile ) )
+        return tfile in needed or tfile not in known
+
+    return parse_file
+
+
+def has_unresolved_dependencies( tcaseL, tcasemap ):
+    """
+    True if one of the parsed tests has a dependency that does not match any
+    test in the 'tcasemap' (which may be a test whose file was not parsed).
+    """
+    for tcase in tcaseL:
+        tspec = tcase.getSpec()
+        if tspec.constructionCompleted():
+            xdir = tspec.getExecuteDirectory()
+            for dep_pat,expr in tspec.getDependencies():
+                if len( depend.find_tests_by_pattern( xdir, dep_pat,
+                                                      tcasemap ) ) == 0:
+                    return True
+
+    return False
+
+
+def is_glob_pattern( path ):
+    ""
+    for c in '*?[':
+        if c in path:
+            return True
+    return False
+
+
+def select_affected_tests( tcaseL, tcasemap, changed, index ):
+    """
+    Returns the list of tests in 'tcaseL' affected by the 'changed' files
+    (absolute paths), using the InputIndex 'index'.  The 'tcasemap' (TestSpec
+    ID to TestCase) is used to resolve dependency patterns.
+    """
+    keyS = index.findTests( changed )
+
+    affected = set()
+    for tcase in tcaseL:
+        key = test_key( tcase.getSpec() )
+        if key in keyS or not index.hasTest( key ):
+            affected.add( id(tcase) )
+
+    keep = set()
+    for tests in find_shard_groups( tcaseL, tcasemap ):
+        for tcase in tests:
+            if id(tcase) in affected:
+                keep.update( [ id(t) for t in tests ] )
+                break
+
+    return [ t for t in tcaseL if id(t) in keep ]
+
+
+def print3( *args ):
+    ""
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
@@ -9,6 +9,7 @@ import time
 from os.path import join as pjoin
 
 from . import outpututils
+from .teststatus import RESOURCE_ATTRS
 print3 = outpututils.print3
 
 
@@ -118,6 +119,8 @@ class JUnitWriter:
         fp.write( '<testcase name="'+xdir+'"' + \
                            ' classname="'+pkgclass+'" time="'+str(xt)+'">\n' )
 
+        self.write_resource_properties( fp, tcase )
+
         if result == 'fail' or result == 'timeout':
             fp.write( '<failure message="'+result.upper()+'"/>\n' )
             buf = self.make_execute_log_section( tcase, max_KB )
@@ -131,6 +134,20 @@ class JUnitWriter:
 
         fp.write( '</testcase>\n' )
 
+    def write_resource_properties(self, fp, tcase):
+        """
+        The CPU time, memory, and I/O of the test are written as properties
+        of the testcase (as done by pytest, for example).
+        """
+        useD = tcase.getStat().getResourceUsage()
+        if useD:
+            fp.write( '<properties>\n' )
+            for name in RESOURCE_ATTRS:
+                if name in useD:
+                    fp.write( '<property name="'+name+'"' + \
+                              ' value="'+str( useD[name] )+'"/>\n' )
+            fp.write( '</properties>\n' )
+
     def make_execute_log_section(self, tcase, max_KB):
         ""
         xdir = tcase.getSpec().getDisplayString()
@@ -37,6 +37,13 @@ def XstatusString( tcase, test_dir, cwd ):
 
     if skipreason:
         s += ' skip_reason="'+skipreason+'"'
+    else:
+        toutreason = tcase.getStat().getReasonForTimeout()
+        if toutreason:
+            s += ' timeout_reason="'+toutreason+'"'
+        cachekey = tcase.getStat().getCacheKey( None )
+        if cachekey:
+            s += ' from_cache="'+cachekey+'"'
 
     return s
 
@@ -142,6 +149,45 @@ def pretty_time( nseconds ):
     return ss
 
 
+def pretty_memory( kilobytes ):
+    """
+    Returns a string with the given number of kilobytes written in a human
+    readable form.
+    """
+    if kilobytes >= 1024*1024:
+        return '%.1f GB' % ( float(kilobytes)/(1024*1024) )
+    if kilobytes >= 1024:
+        return '%.1f MB' % ( float(kilobytes)/1024 )
+    return str( int(kilobytes) )+' KB'
+
+
+def top_resource_users( tcaseL, maxnum=3 ):
+    """
+    Returns ( total CPU seconds, list of top CPU TestCase, list of top
+    memory TestCase ) for the tests with resource usage recorded.
+    """
+    cpuL = []
+    memL = []
+    total = 0.0
+
+    for tcase in tcaseL:
+        tstat = tcase.getStat()
+        cpu = tstat.getCPUTime( None )
+        if cpu != None:
+            xdir = tcase.getSpec().getDisplayString()
+            total += cpu
+            cpuL.append( ( cpu, xdir, tcase ) )
+            mem = tstat.getMaxMemory( None )
+            if mem != None:
+                memL.append( ( mem, xdir, tcase ) )
+
+    cpuL.sort( reverse=True )
+    memL.sort( reverse=True )
+
+    return total, [ T[2] for T in cpuL[:maxnum] ], \
+                  [ T[2] for T in memL[:maxnum] ]
+
+
 def ensure_TestSpec( testobj ):
     ""
     if isinstance( testobj, TestExec.TestExec ):
@@ -51,9 +51,11 @@ class ProcessBatch:
             sys.stdout.write( 'queue = '+str(queue) + '\n' + \
                               'account = '+str(account) + '\n\n' )
             sys.stdout.flush()
-            os.execv( '/bin/csh', ['/bin/csh', '-f', fname] )
+            shell = script_shell()
+            os.execv( shell[0], shell + [fname] )
 
-        cmd = '/bin/csh -f ' + fname + ' >& ' + outfile
+        cmd = ' '.join( script_shell() ) + ' ' + fname + \
+              ' > ' + outfile + ' 2>&1'
         out = '[forked process '+str(jobid)+']'
 
         # keep the child process ids as the queue ids
@@ -90,6 +92,16 @@ class ProcessBatch:
         return 'ps', out, '', jobD
 
 
+def script_shell():
+    """
+    The batch scripts written by vvtest run under csh or a Bourne shell, so
+    sh is used on machines without csh.
+    """
+    if os.path.exists( '/bin/csh' ):
+        return [ '/bin/csh', '-f' ]
+    return [ '/bin/sh' ]
+
+
 #########################################################################
 
 if __name__ == "__main__":
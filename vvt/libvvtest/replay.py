@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import sys
+
+from .execlist import TestExecList
+from .batchpack import predicted_runtime, get_num_procs
+from .outpututils import pretty_time
+
+
+"""
+Replays the tests of a finished test results directory through the
+TestExecList on a virtual clock.  Each test "runs" for its recorded runtime,
+and ends with its recorded result (so tests blocked by a failed dependency
+stay blocked).  Different processor counts and scheduling policies can be
+compared without running anything.
+"""
+
+POLICIES = [ 'longest', 'shortest', 'critical', 'name' ]
+
+
+class ReplaySimulator:
+
+    def __init__(self, tlist, usrplugin=None):
+        """
+        The 'tlist' is a TestList with the test results already read in.
+        """
+        self.tlist = tlist
+        self.plugin = usrplugin
+
+        self.tests = []
+        self.runtimes = {}   # id(TestCase) -> seconds
+        self.results = {}    # id(TestCase) -> result string
+        self.num_estimated = 0
+
+        self.recorded = self._record_tests()
+
+        self.critical = None
+
+    def _record_tests(self):
+        """
+        Saves the runtime and result of each test (which are reset when a
+        replay is done), and returns the recorded wall time of the run, or
+        None if unknown.
+        """
+        xlist = TestExecList( self.plugin, self.tlist )
+        xlist.createTestExecListOnly()
+
+        tmin = None
+        tmax = None
+        for tcase in xlist.getTestExecList():
+
+            tstat = tcase.getStat()
+
+            rt = tstat.getRuntime( None )
+            if rt == None:
+                rt = predicted_runtime( tcase ) or 0
+                self.num_estimated += 1
+
+            result = tstat.getResultStatus()
+            if result in [ 'notrun', 'notdone' ]:
+                result = 'pass'
+
+            self.tests.append( tcase )
+            self.runtimes[ id(tcase) ] = rt
+            self.results[ id(tcase) ] = result
+
+            start = tstat.getStartDate( None )
+            if start != None and tstat.isDone():
+                if tmin == None or start < tmin: tmin = start
+                if tmax == None or start+rt > tmax: tmax = start+rt
+
+        if tmin == None:
+            return None
+        return tmax - tmin
+
+    def numTests(self):
+        ""
+        return len( self.tests )
+
+    def numEstimated(self):
+        """
+        Number of tests without a recorded runtime, whose timeout (or zero)
+        is used instead.
+        """
+        return self.num_estimated
+
+    def getRecordedWallTime(self):
+        ""
+        return self.recorded
+
+    def getTotalWork(self):
+        """
+        The sum over the tests of number of processors times runtime.
+        """
+        return sum( [ get_num_procs(t) * self.runtimes[ id(t) ]
+                      for t in self.tests ] )
+
+    def getCriticalPath(self):
+        """
+        Returns ( length, list of TestCase ) of the longest chain of runtimes
+        through the test dependencies.  No schedule can finish sooner.
+        """
+        if self.critical == None:
+            self.critical = critical_path( self.tests, self.runtimes )
+        return self.critical
+
+    def run(self, numprocs, policy='longest'):
+        """
+        Replays the tests on 'numprocs' processors using the given policy for
+        choosing the next test to start (among tests with the same number of
+        processors), one of
+
+            longest  : longest runtime first (what vvtest does)
+            shortest : shortest runtime first
+            critical : longest path through the tests that depend on it first
+            name     : alphabetical by test name (no runtime knowledge)
+
+        Returns a ReplayResult.
+        """
+        self._reset_tests()
+
+        xlist = TestExecList( self.plugin, self.tlist )
+        xlist.createTestExecListOnly()
+        xlist.sortTestExecList( self._sort_key( policy ) )
+
+        plat = ReplayPlatform( numprocs )
+
+        tnow = 0.0
+        busy = 0.0
+        running = []  # list of ( finish time, num procs, TestCase )
+
+        while True:
+
+            tcase = xlist.popNext( plat )
+
+            if tcase != None:
+                np = plat.obtainProcs( get_num_procs( tcase ) )
+                rt = self.runtimes[ id(tcase) ]
+                tcase.getStat().markStarted( tnow )
+                running.append( ( tnow+rt, np, tcase ) )
+                busy += np * rt
+                continue
+
+            if len( running ) == 0:
+                break
+
+            running.sort( key=lambda T: T[0] )
+            tnow = running[0][0]
+            while len( running ) > 0 and running[0][0] <= tnow:
+                tfin,np,tcase = running.pop(0)
+                self._mark_done( tcase )
+                plat.giveProcs( np )
+                xlist.testDone( tcase, record=False )
+
+        blocked = xlist.popRemaining()
+
+        self._reset_tests()
+
+        return ReplayResult( numprocs, policy, tnow, busy,
+                             xlist.numDone(), len( blocked ) )
+
+    def _reset_tests(self):
+        ""
+        for tcase in self.tests:
+            tstat = tcase.getStat()
+            tstat.resetResults()
+            tstat.setRuntime( self.runtimes[ id(tcase) ] )
+
+    def _mark_done(self, tcase):
+        ""
+        tspec = tcase.getSpec()
+        tspec.setAttr( 'state', 'done' )
+        tspec.setAttr( 'result', self.results[ id(tcase) ] )
+        tspec.setAttr( 'xtime', self.runtimes[ id(tcase) ] )
+
+    def _sort_key(self, policy):
+        ""
+        if policy == 'longest':
+            return None
+
+        elif policy == 'shortest':
+            return lambda t: ( self.runtimes[ id(t) ],
+                               t.getSpec().getDisplayString() )
+
+        elif policy == 'critical':
+            levels = dependent_path_lengths( self.tests, self.runtimes )
+            return lambda t: ( -levels[ id(t) ],
+                               t.getSpec().getDisplayString() )
+
+        elif policy == 'name':
+            return lambda t: t.getSpec().getDisplayString()
+
+        raise ValueError( 'unknown replay policy: '+repr(policy) )
+
+
+class ReplayPlatform:
+    """
+    Stands in for the Platform in the TestExecList, counting processors only.
+    """
+
+    def __init__(self, numprocs):
+        ""
+        self.nprocs = max( 1, numprocs )
+        self.nfree = self.nprocs
+
+    def queryProcs(self, np, memory=None):
+        ""
+        return max( 1, np ) <= self.nfree
+
+    def queryMemory(self, memory):
+        ""
+        return True
+
+    def obtainProcs(self, np):
+        """
+        Returns the number of processors taken.  A test larger than the
+        machine gets all of it.
+        """
+        np = min( max( 1, np ), self.nprocs )
+        self.nfree = max( 0, self.nfree - np )
+        return np
+
+    def giveProcs(self, np):
+        ""
+        self.nfree = min( self.nprocs, self.nfree + np )
+
+
+class ReplayResult:
+
+    def __init__(self, numprocs, policy, makespan, busy, numrun, numblocked):
+        ""
+        self.nprocs = numprocs
+        self.policy = policy
+        self.makespan = makespan
+        self.busy = busy
+        self.numrun = numrun
+        self.numblocked = numblocked
+
+    def getMakespan(self):
+        ""
+        return self.makespan
+
+    def getIdleTime(self):
+        """
+        Processor-seconds with no test running, over the makespan.
+        """
+        return max( 0.0, self.nprocs * self.makespan - self.busy )
+
+    def getUtilization(self):
+        ""
+        if self.makespan <= 0:
+            return None
+        return self.busy / float( self.nprocs * self.makespan )
+
+
+def critical_path( tests, runtimes ):
+    """
+    Returns ( length, list of TestCase ) of the longest sum of runtimes
+    along a dependency chain, first test first.
+    """
+    ids = set( [ id(t) for t in tests ] )
+    memo = {}  # id -> ( finish, previous TestCase )
+
+    def finish( tcase ):
+        k = id(tcase)
+        if k not in memo:
+            memo[k] = ( 0, None )  # guards against cycles
+            start = 0
+            prev = None
+            for dep in tcase.getDependencies():
+                if id(dep) in ids:
+                    tm = finish( dep )
+                    if tm > start:
+                        start,prev = tm,dep
+            memo[k] = ( start + runtimes[k], prev )
+        return memo[k][0]
+
+    last = None
+    length = 0
+    for tcase in tests:
+        tm = finish( tcase )
+        if last == None or tm > length:
+            last,length = tcase,tm
+
+    path = []
+    while last != None:
+        path.append( last )
+        last = memo[ id(last) ][1]
+    path.reverse()
+
+    return length, path
+
+
+def dependent_path_lengths( tests, runtimes ):
+    """
+    Returns a map of id(TestCase) to the longest sum of runtimes from the
+    start of the test through the tests that (transitively) depend on it.
+    """
+    ids = set( [ id(t) for t in tests ] )
+
+    dependents = {}
+    for tcase in tests:
+        dependents[ id(tcase) ] = []
+    for tcase in tests:
+        for dep in tcase.getDependencies():
+            if id(dep) in ids:
+                dependents[ id(dep) ].append( tcase )
+
+    memo = {}
+
+    def level( tcase ):
+        k = id(tcase)
+        if k not in memo:
+            memo[k] = 0  # guards against cycles
+            tail = 0
+            for child in dependents[k]:
+                tail = max( tail, level( child ) )
+            memo[k] = runtimes[k] + tail
+        return memo[k]
+
+    for tcase in tests:
+        level( tcase )
+
+    return memo
+
+
+def write_replay_report( sim, resultL, fileobj=sys.stdout ):
+    """
+    Writes a summary of the test list and a table of the ReplayResult
+    objects in 'resultL'.
+    """
+    cplen,cpath = sim.getCriticalPath()
+    work = sim.getTotalWork()
+
+    lines = [ 'Replay of ' + str( sim.numTests() ) + ' tests' ]
+
+    tm = sim.getRecordedWallTime()
+    if tm != None:
+        lines.append( '    recorded wall time : ' + pretty_time( tm ) )
+
+    lines.append( '    total work         : ' + pretty_time( work ) + \
+                  ' (processor-seconds)' )
+
+    if len( cpath ) > 0:
+        names = [ t.getSpec().getDisplayString() for t in cpath ]
+        lines.append( '    critical path      : ' + pretty_time( cplen ) + \
+                      ' (' + ' -> '.join( names ) + ')' )
+
+    if sim.numEstimated() > 0:
+        lines.append( '    *** ' + str( sim.numEstimated() ) + ' test(s) '
+                      'have no recorded runtime; their timeout is used' )
+
+    lines.append( '' )
+    lines.append( '    %-6s %-9s %-12s %-12s %-8s %s' % \
+                  ( 'procs', 'policy', 'makespan', 'idle (p-s)',
+                    'util', 'lower bound' ) )
+
+    for res in resultL:
+        bound = max( cplen, work / float( res.nprocs ) )
+        util = res.getUtilization()
+        if util == None: ustr = '-'
+        else:            ustr = '%.1f%%' % ( 100*util )
+        line = '    %-6s %-9s %-12s %-12s %-8s %s' % \
+               ( res.nprocs, res.policy,
+                 pretty_time( res.getMakespan() ),
+                 int( res.getIdleTime() + 0.5 ),
+                 ustr, pretty_time( bound ) )
+        if res.numblocked > 0:
+            line += '  (' + str( res.numblocked ) + ' blocked)'
+        lines.append( line )
+
+    fileobj.write( '\n'.join( lines ) + '\n' )
+    fileobj.flush()
@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import time
+import glob
+import hashlib
+import json
+from os.path import join as pjoin, normpath, dirname
+
+from .userplugin import UserPluginError
+
+
+"""
+A content addressed store of passing test results.  The inputs of each test
+(the test file, the files it links, copies or lists as needed, its
+parameters, the platform and options, the project executables in the
+--bin-dir, a salt from the user plugin, and the inputs of the tests it
+depends on) are hashed.  A test whose hash is in the store passed before
+with exactly the same inputs, so it is marked as passed without running.
+
+The store is a directory containing one small file for each hash, so any
+number of vvtest processes (such as batch jobs) can share it.
+"""
+
+CACHE_VERSION = '1'
+
+# number of hash characters kept in the 'cached' test attribute
+SHORT_HASH_LENGTH = 12
+
+
+class ResultCache:
+
+    def __init__(self, directory, rtconfig, platobj, usrplugin=None):
+        ""
+        self.cachedir = directory
+        self.rtconfig = rtconfig
+        self.platobj = platobj
+        self.plugin = usrplugin
+
+        self.common = None
+        self.hashes = {}  # id(TestCase) -> hex digest
+
+    def getDirectory(self):
+        ""
+        return self.cachedir
+
+    def getTestHash(self, tcase):
+        """
+        Returns the hex digest of the inputs of the test, which includes the
+        hashes of the tests it depends on.  None is returned if the inputs
+        could not be determined (the test is never taken from the cache).
+        """
+        return self._compute_hash( tcase, set() )
+
+    def lookup(self, tcase):
+        """
+        Returns the cache entry (a dict) if the test passed before with the
+        same inputs, otherwise None.
+        """
+        hx = self.getTestHash( tcase )
+        if hx == None:
+            return None
+        return read_cache_entry( self._entry_filename( hx ) )
+
+    def selectCachedTests(self, tcaseL):
+        """
+        Returns the list of tests in 'tcaseL' that can be taken from the
+        cache.  A test that will run needs the execute directories of its
+        dependencies, so those are run too (even if they are in the cache).
+        """
+        hits = {}
+        for tcase in tcaseL:
+            if self.lookup( tcase ) != None:
+                hits[ id(tcase) ] = tcase
+
+        torun = [ t for t in tcaseL if id(t) not in hits ]
+        while len( torun ) > 0:
+            tcase = torun.pop()
+            for dep in tcase.getDependencies():
+                if hits.pop( id(dep), None ) != None:
+                    torun.append( dep )
+
+        return [ t for t in tcaseL if id(t) in hits ]
+
+    def markPassed(self, tcase):
+        """
+        Marks the test as passed from the cache.
+        """
+        short = self.getTestHash( tcase )[:SHORT_HASH_LENGTH]
+        tcase.getStat().markPassedFromCache( time.time(), short )
+
+    def store(self, tcase):
+        """
+        Adds the test to the cache if it passed (and was actually run).
+        Returns True if an entry was written.
+        """
+        tstat = tcase.getStat()
+        if not tstat.passed() or tstat.getCacheKey( None ) != None:
+            return False
+
+        hx = self.getTestHash( tcase )
+        if hx == None:
+            return False
+
+        tspec = tcase.getSpec()
+        entry = { 'test'     : tspec.getDisplayString(),
+                  'platform' : self.platobj.getName(),
+                  'date'     : tstat.getStartDate( None ),
+                  'runtime'  : tstat.getRuntime( None ) }
+
+        fn = self._entry_filename( hx )
+        try:
+            write_cache_entry( fn, entry )
+        except Exception:
+            print3( '*** warning: failed to write result cache entry for',
+                    tspec.getDisplayString()+':', sys.exc_info()[1] )
+            return False
+
+        return True
+
+    def _entry_filename(self, hexdigest):
+        ""
+        return pjoin( self.cachedir, hexdigest[:2], hexdigest )
+
+    def _compute_hash(self, tcase, stack):
+        ""
+        key = id(tcase)
+
+        if key not in self.hashes:
+            stack.add( key )
+            self.hashes[ key ] = self._hash_test_inputs( tcase, stack )
+            stack.remove( key )
+
+        return self.hashes[ key ]
+
+    def _hash_test_inputs(self, tcase, stack):
+        ""
+        tspec = tcase.getSpec()
+
+        hsh = hashlib.sha1()
+        update_hash( hsh, 'version', CACHE_VERSION )
+        update_hash( hsh, 'common', self._common_hash() )
+        update_hash( hsh, 'test', tspec.getDisplayString() )
+
+        params = list( tspec.getParameters().items() )
+        params.sort()
+        update_hash( hsh, 'params', repr( params ) )
+
+        srcdir = normpath( pjoin( tspec.getRootpath(),
+                                  dirname( tspec.getFilepath() ) ) )
+
+        hash_path( hsh, tspec.getFilename() )
+        for fn in tspec.getInsertFiles():
+            update_hash( hsh, 'insert', fn )
+            hash_path( hsh, fn )
+
+        srcL = list( tspec.getSourceFiles() )
+        srcL.sort()
+        for srcname in srcL:
+            update_hash( hsh, 'source', srcname )
+            hash_source_files( hsh, pjoin( srcdir, srcname ) )
+
+        if self.plugin != None:
+            try:
+                salt = self.plugin.testCacheSalt( tcase )
+            except UserPluginError:
+                return None
+            if salt != None:
+                update_hash( hsh, 'salt', salt )
+
+        depL = []
+        for dep in tcase.getDependencies():
+            if id(dep) not in stack:
+                hx = self._compute_hash( dep, stack )
+                if hx == None:
+                    return None
+                depL.append( hx )
+        depL.sort()
+        update_hash( hsh, 'depends', ' '.join( depL ) )
+
+        return hsh.hexdigest()
+
+    def _common_hash(self):
+        """
+        The hash of the inputs that are the same for every test, which is
+        only computed once.
+        """
+        if self.common == None:
+
+            hsh = hashlib.sha1()
+
+            update_hash( hsh, 'platform', self.platobj.getName() )
+            update_hash( hsh, 'compiler', str( self.platobj.getCompiler() ) )
+
+            optL = list( self.rtconfig.getOptionList() )
+            optL.sort()
+            update_hash( hsh, 'options', ' '.join( optL ) )
+
+            analyze = self.rtconfig.getAttr( 'analyze', 0 )
+            update_hash( hsh, 'analyze', str( int( bool( analyze ) ) ) )
+            for arg in self.rtconfig.getAttr( 'testargs', [] ):
+                update_hash( hsh, 'testarg', arg )
+
+            bindir = self.rtconfig.getAttr( 'exepath', None )
+            if bindir:
+                update_hash( hsh, 'bindir', bindir )
+                hash_path( hsh, bindir )
+
+            self.common = hsh.hexdigest()
+
+        return self.common
+
+
+def update_hash( hsh, label, value ):
+    ""
+    hsh.update( ( label + '=' + value + '\n' ).encode( 'utf-8' ) )
+
+
+def hash_source_files( hsh, srcname ):
+    """
+    Hashes the file(s) a link or copy source name refers to, which may be a
+    shell glob pattern (the same as when the files are linked or copied).
+    """
+    if os.path.exists( srcname ):
+        hash_path( hsh, srcname )
+    else:
+        fL = glob.glob( srcname )
+        fL.sort()
+        if len( fL ) == 0:
+            update_hash( hsh, 'missing', srcname )
+        for fn in fL:
+            update_hash( hsh, 'file', os.path.basename( fn ) )
+            hash_path( hsh, fn )
+
+
+def hash_path( hsh, path ):
+    """
+    Hashes the contents of a file, or of all the files under a directory.
+    """
+    if os.path.isdir( path ):
+        for root,dirs,files in os.walk( path ):
+            dirs.sort()
+            files.sort()
+            for fn in files:
+                fpath = pjoin( root, fn )
+                update_hash( hsh, 'file', os.path.relpath( fpath, path ) )
+                hash_file_contents( hsh, fpath )
+
+    elif os.path.exists( path ):
+        hash_file_contents( hsh, path )
+
+    else:
+        update_hash( hsh, 'missing', path )
+
+
+def hash_file_contents( hsh, filename ):
+    ""
+    try:
+        fp = open( filename, 'rb' )
+    except Exception:
+        update_hash( hsh, 'unreadable', filename )
+        return
+
+    try:
+        while True:
+            buf = fp.read( 1024*1024 )
+            if not buf:
+                break
+            hsh.update( buf )
+    finally:
+        fp.close()
+
+
+def read_cache_entry( filename ):
+    """
+    Returns the dict stored in a cache entry file, or None if the file does
+    not exist or cannot be read.  The cache directory may be shared, so the
+    contents are parsed as JSON rather than evaluated.
+    """
+    try:
+        fp = open( filename, 'r' )
+    except Exception:
+        return None
+
+    try:
+        try:
+            entry = json.loads( fp.read() )
+        except Exception:
+            return None
+    finally:
+        fp.close()
+
+    if type( entry ) != type( {} ):
+        return None
+
+    return entry
+
+
+def write_cache_entry( filename, entry ):
+    """
+    Writes the entry (through a temporary file so that readers never see a
+    partial file).
+    """
+    dname = os.path.dirname( filename )
+    if not os.path.isdir( dname ):
+        try:
+            os.makedirs( dname )
+        except OSError:
+            # another process may have just created it
+            if not os.path.isdir( dname ):
+                raise
+
+    tmpf = filename + '.' + os.uname()[1] + '.' + str( os.getpid() )
+
+    fp = open( tmpf, 'w' )
+    try:
+        fp.write( json.dumps( entry ) + '\n' )
+    finally:
+        fp.close()
+
+    os.rename( tmpf, filename )
+
+
+def print3( *args ):
+    ""
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import time
+
+from .workqueue import DirectoryLock
+
+
+history_filename = 'runtimes.history'
+
+# number of samples kept for each test/platform/np combination
+DEFAULT_MAX_SAMPLES = 20
+
+# weight given to the most recent sample in the exponentially weighted
+# moving average
+DEFAULT_EWMA_ALPHA = 0.3
+
+DEFAULT_TIMEOUT_QUANTILE = 0.95
+
+
+class RuntimeHistory:
+    """
+    A store of recent test runtimes, keyed by platform/compiler, number of
+    processors, and test display string.  Each line of the file is
+
+        <platid> <np> <date> <runtime> <result> <test display string>
+
+    with an optional "maxrss=<kilobytes>" token before the test display
+    string if the peak memory of the test was recorded.  Only the most
+    recent samples are kept for each key.
+    """
+
+    def __init__(self, filename, max_samples=DEFAULT_MAX_SAMPLES):
+        ""
+        self.fname = filename
+        self.maxN = max_samples
+
+        self.samples = {}  # (platid,np,testid) -> list of (date,runtime,result)
+        self.maxrss = {}   # (platid,np,testid,date) -> max memory in KB
+
+    def getFilename(self):
+        ""
+        return self.fname
+
+    def readFile(self):
+        """
+        Loads the samples from the history file, if it exists.  Malformed
+        lines are ignored.
+        """
+        if os.path.exists( self.fname ):
+
+            fp = open( self.fname, 'r' )
+            try:
+                for line in fp.readlines():
+                    L = line.strip().split( None, 5 )
+                    if len(L) == 6:
+                        try:
+                            np = int( L[1] )
+                            date = float( L[2] )
+                            rt = float( L[3] )
+                            testid,rss = split_maxrss_token( L[5] )
+                        except Exception:
+                            continue
+                        self.addSample( L[0], np, testid, date, rt, L[4], rss )
+            finally:
+                fp.close()
+
+    def writeFile(self):
+        """
+        Writes all samples to the history file (through a temporary file so
+        that readers never see a partial file).  Other vvtest executions may
+        have written the file since it was read, so the samples in the file
+        are merged in first.  The merge and write are done under a lock.
+        """
+        lock = DirectoryLock( self.fname + '.lock' )
+        lock.acquire()
+        try:
+            self._merge_file()
+            self._write_file()
+        finally:
+            lock.release()
+
+    def _merge_file(self):
+        ""
+        other = RuntimeHistory( self.fname, self.maxN )
+        other.readFile()
+
+        for key,sL in other.samples.items():
+            for date,rt,res in sL:
+                if ( date, rt, res ) not in self.samples.get( key, [] ):
+                    rss = other.maxrss.get( key + (date,), None )
+                    self.addSample( key[0], key[1], key[2],
+                                    date, rt, res, rss )
+
+    def _write_file(self):
+        ""
+        tmpf = self.fname + '.' + str( os.getpid() )
+
+        fp = open( tmpf, 'w' )
+        try:
+            keys = list( self.samples.keys() )
+            keys.sort()
+            for platid,np,testid in keys:
+                for date,rt,res in self.samples[ (platid,np,testid) ]:
+                    L = [ platid, str(np), str(date), str(rt), res ]
+                    rss = self.maxrss.get( (platid,np,testid,date), None )
+                    if rss != None:
+                        L.append( 'maxrss='+str(rss) )
+                    L.append( testid )
+                    fp.write( ' '.join( L ) + '\n' )
+        finally:
+            fp.close()
+
+        os.rename( tmpf, self.fname )
+
+    def addSample(self, platid, np, testid, date, runtime, result,
+                        maxrss=None):
+        ""
+        key = ( platid, int(np), testid )
+
+        sL = self.samples.get( key, None )
+        if sL == None:
+            sL = []
+            self.samples[ key ] = sL
+
+        sL.append( ( date, runtime, result ) )
+        sL.sort()
+
+        if maxrss != None:
+            self.maxrss[ key + (date,) ] = int( maxrss )
+
+        if len(sL) > self.maxN:
+            for T in sL[:len(sL)-self.maxN]:
+                self.maxrss.pop( key + (T[0],), None )
+            del sL[:len(sL)-self.maxN]
+
+    def getSamples(self, platid, np, testid):
+        """
+        Returns a list of (date,runtime,result), sorted by date.
+        """
+        return list( self.samples.get( ( platid, int(np), testid ), [] ) )
+
+    def recordResults(self, tlist, platid, since):
+        """
+        Adds a sample for each test in the TestList that finished on or after
+        the 'since' epoch date.  Returns the number of samples added.
+        """
+        cnt = 0
+
+        for tcase in tlist.getTests():
+
+            tstat = tcase.getStat()
+
+            # tests passed from the result cache did not actually run, and
+            # tests interrupted by vvtest did not run to completion
+            if tstat.isDone() and tstat.getCacheKey( None ) == None and \
+               not tstat.isInterrupted():
+
+                xdate = tstat.getStartDate( None )
+                rt = tstat.getRuntime( None )
+
+                # start dates are truncated to a hundredth of a second
+                if xdate != None and rt != None and xdate+0.01 >= since:
+                    tspec = tcase.getSpec()
+                    np = get_num_procs( tspec )
+                    self.addSample( platid, np, tspec.getDisplayString(),
+                                    int(xdate), rt, tstat.getResultStatus(),
+                                    tstat.getMaxMemory( None ) )
+                    cnt += 1
+
+        return cnt
+
+    def predict(self, platid, np, testid,
+                      quantile=DEFAULT_TIMEOUT_QUANTILE,
+                      alpha=DEFAULT_EWMA_ALPHA):
+        """
+        Returns ( expected runtime, upper runtime, last result ), where the
+        expected runtime is an exponentially weighted moving average of the
+        samples and the upper runtime is the 'quantile' of the samples.
+        Samples that timed out are not used in the statistics, since the
+        runtime is only a lower bound.  If there are no samples, then
+        ( None, None, None ) is returned.
+        """
+        sL = self.getSamples( platid, np, testid )
+
+        if len(sL) == 0:
+            return None,None,None
+
+        lastres = sL[-1][2]
+
+        rtL = [ rt for dt,rt,res in sL if res != 'timeout' ]
+        if len(rtL) == 0:
+            rtL = [ rt for dt,rt,res in sL ]
+
+        expect = compute_ewma( rtL, alpha )
+        upper = max( expect, compute_quantile( rtL, quantile ) )
+
+        return expect, upper, lastres
+
+    def getExpectedRuntimes(self, alpha=DEFAULT_EWMA_ALPHA):
+        """
+        Returns a dict mapping each test display string to its expected
+        runtime, computed from the samples of every platform/compiler (the
+        number of processors is part of the display string).
+        """
+        sampD = {}
+        for (platid,np,testid),sL in self.samples.items():
+            sampD.setdefault( testid, [] ).extend( sL )
+
+        rtD = {}
+        for testid,sL in sampD.items():
+            sL.sort()
+            rtL = [ rt for dt,rt,res in sL if res != 'timeout' ]
+            if len(rtL) == 0:
+                rtL = [ rt for dt,rt,res in sL ]
+            rtD[ testid ] = compute_ewma( rtL, alpha )
+
+        return rtD
+
+    def predictMemory(self, platid, np, testid):
+        """
+        Returns the largest max resident memory (in kilobytes) of the recent
+        samples, or None if no sample has the memory recorded.
+        """
+        mx = None
+        key = ( platid, int(np), testid )
+        for date,rt,res in self.samples.get( key, [] ):
+            rss = self.maxrss.get( key + (date,), None )
+            if rss != None and ( mx == None or rss > mx ):
+                mx = rss
+        return mx
+
+
+def split_maxrss_token( rest_of_line ):
+    """
+    Returns ( test display string, max rss or None ) from the end of a
+    history file line.
+    """
+    if rest_of_line.startswith( 'maxrss=' ):
+        tok,testid = rest_of_line.split( None, 1 )
+        return testid, int( tok.split( '=', 1 )[1] )
+    return rest_of_line, None
+
+
+def get_history_filename( testing_dir, test_dir ):
+    """
+    The history is stored in the TESTING_DIRECTORY, if defined, so that it
+    spans test results directories.  Otherwise it goes in the test results
+    directory.
+    """
+    if testing_dir and os.path.isdir( testing_dir ):
+        return os.path.join( testing_dir, history_filename )
+    return os.path.join( test_dir, history_filename )
+
+
+def get_num_procs( tspec ):
+    ""
+    return int( tspec.getParameters().get( 'np', 0 ) )
+
+
+def compute_ewma( values, alpha=DEFAULT_EWMA_ALPHA ):
+    """
+    Exponentially weighted moving average, with the last value in the list
+    being the most recent.
+    """
+    avg = None
+    for val in values:
+        if avg == None:
+            avg = float(val)
+        else:
+            avg = alpha*val + (1.0-alpha)*avg
+    return avg
+
+
+def compute_median( values ):
+    ""
+    return compute_quantile( values, 0.5 )
+
+
+def compute_quantile( values, q ):
+    """
+    The 'q' quantile of the values, using linear interpolation between the
+    closest ranks.  None is returned for an empty list.
+    """
+    if len(values) == 0:
+        return None
+
+    vL = list( values )
+    vL.sort()
+
+    q = min( 1.0, max( 0.0, float(q) ) )
+
+    pos = q * ( len(vL) - 1 )
+    i = int( pos )
+    if i+1 < len(vL):
+        return vL[i] + ( pos - i ) * ( vL[i+1] - vL[i] )
+    return float( vL[i] )
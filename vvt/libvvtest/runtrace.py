@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import time
+import json
+
+
+class RunTrace:
+    """
+    Records the wall clock time spent in each phase of a vvtest run, and the
+    start and stop of each test, which can be written as a JSON file in the
+    Chrome trace event format (viewable with chrome://tracing or Perfetto).
+
+    Phases are sequential: starting a phase ends the current one.  Each
+    running test occupies as many processor "slots" as it uses processors,
+    and each slot is shown as a separate lane in the trace.
+    """
+
+    def __init__(self, start_epoch=None, first_phase='startup'):
+        ""
+        self.tstart = start_epoch if start_epoch != None else time.time()
+
+        self.phases = []  # list of [ name, start, stop, subtimes ]
+        self.current = None
+
+        self.spans = []    # list of ( slot, name, start, stop, args )
+        self.running = {}  # test id -> ( slots, start )
+        self.busy = set()  # slot numbers in use
+
+        if first_phase:
+            self.phase( first_phase, self.tstart )
+
+    def phase(self, name, curtime=None):
+        """
+        Ends the current phase (if any) and starts a new one with the given
+        name.  If 'name' is None, no new phase is started.
+        """
+        tm = curtime if curtime != None else time.time()
+
+        if self.current != None:
+            self.current[2] = tm
+            self.current = None
+
+        if name != None:
+            self.current = [ name, tm, None, [] ]
+            self.phases.append( self.current )
+
+    def finish(self, curtime=None):
+        ""
+        self.phase( None, curtime )
+
+    def addSubtime(self, name, seconds):
+        """
+        Records the time spent in a part of the current phase, such as the
+        parsing of test files during the scan.
+        """
+        if self.current != None:
+            self.current[3].append( ( name, seconds ) )
+
+    def getPhaseTimes(self):
+        """
+        Returns a list of ( phase name, seconds ) in the order they occurred.
+        The times of phases with the same name are added together.
+        """
+        tL = []
+        tD = {}
+        for name,start,stop,subL in self.phases:
+            if stop != None:
+                if name in tD:
+                    tD[name] += stop - start
+                else:
+                    tD[name] = stop - start
+                    tL.append( name )
+
+        return [ ( name, tD[name] ) for name in tL ]
+
+    def testStarted(self, tcase, curtime=None):
+        ""
+        tm = curtime if curtime != None else time.time()
+
+        tspec = tcase.getSpec()
+        np = max( 1, int( tspec.getParameters().get( 'np', 0 ) ) )
+
+        slots = []
+        i = 0
+        while len(slots) < np:
+            if i not in self.busy:
+                slots.append( i )
+                self.busy.add( i )
+            i += 1
+
+        self.running[ tspec.getID() ] = ( slots, tm )
+
+    def testStopped(self, tcase, curtime=None):
+        ""
+        tm = curtime if curtime != None else time.time()
+
+        tspec = tcase.getSpec()
+        slots,start = self.running.pop( tspec.getID(), ( None, None ) )
+
+        if slots != None:
+            name = tspec.getDisplayString()
+            args = { 'result': tcase.getStat().getResultStatus(),
+                     'np': len(slots) }
+            for slot in slots:
+                self.busy.discard( slot )
+                self.spans.append( ( slot, name, start, tm, args ) )
+
+    def writeSummary(self):
+        """
+        Prints a one line summary of the phase times.
+        """
+        L = []
+        for name,start,stop,subL in self.phases:
+            if stop != None:
+                s = name+' '+format_seconds( stop-start )
+                if subL:
+                    s += ' (' + ', '.join( [ n+' '+format_seconds(t)
+                                             for n,t in subL ] ) + ')'
+                L.append( s )
+
+        print3( 'Phase times:', ', '.join( L ) )
+
+    def writeFile(self, filename):
+        """
+        Writes the trace events as JSON to the given file name.
+        """
+        fp = open( filename, 'w' )
+        try:
+            json.dump( self.makeTraceEvents(), fp, indent=1 )
+        finally:
+            fp.close()
+
+    def makeTraceEvents(self):
+        """
+        Returns the trace as a dictionary in the Chrome trace event format.
+        The phases are shown in process 1 and the tests in process 2, with
+        one thread per processor slot.
+        """
+        evL = []
+
+        evL.append( metadata_event( 'process_name', 1, 0, 'vvtest phases' ) )
+        evL.append( metadata_event( 'process_name', 2, 0, 'tests' ) )
+        evL.append( metadata_event( 'thread_name', 1, 0, 'phases' ) )
+
+        for name,start,stop,subL in self.phases:
+            if stop != None:
+                ev = self._complete_event( name, 'phase', 1, 0, start, stop )
+                if subL:
+                    ev['args'] = dict( [ ( n, round(t,6) ) for n,t in subL ] )
+                evL.append( ev )
+
+        slots = set()
+        for slot,name,start,stop,args in self.spans:
+            ev = self._complete_event( name, 'test', 2, slot+1, start, stop )
+            ev['args'] = dict( args )
+            evL.append( ev )
+            slots.add( slot )
+
+        for slot in sorted( slots ):
+            evL.append( metadata_event( 'thread_name', 2, slot+1,
+                                        'slot '+str(slot) ) )
+
+        return { 'traceEvents': evL, 'displayTimeUnit': 'ms' }
+
+    def _complete_event(self, name, category, pid, tid, start, stop):
+        ""
+        return { 'name': name, 'cat': category, 'ph': 'X',
+                 'pid': pid, 'tid': tid,
+                 'ts': int( ( start - self.tstart ) * 1.e6 ),
+                 'dur': int( max( 0, stop - start ) * 1.e6 ) }
+
+
+def metadata_event( kind, pid, tid, name ):
+    ""
+    return { 'name': kind, 'ph': 'M', 'pid': pid, 'tid': tid,
+             'args': { 'name': name } }
+
+
+def format_seconds( seconds ):
+    ""
+    if seconds < 10:
+        return '%.2fs' % seconds
+    return '%.1fs' % seconds
+
+
+def print3( *args ):
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
@@ -5,21 +5,40 @@
 # Government retains certain rights in this software.
 
 import os, sys
+import time
 
 from .errors import FatalError
 
 
 class TestFileScanner:
 
-    def __init__(self, testlist, force_params_dict=None):
+    def __init__(self, testlist, force_params_dict=None, parse_filter=None,
+                       scan_cache=None):
         """
         If 'force_params_dict' is not None, it must be a dictionary mapping
         parameter names to a list of parameter values.  Any test that contains
         a parameter in this dictionary will take on the given values for that
         parameter.
+
+        If 'parse_filter' is not None, it is called with the scan directory and
+        the relative path of each test file found in a directory scan, and
+        the file is only parsed if it returns True.
+
+        If 'scan_cache' is not None, it keeps the test files found in each
+        directory scan, such as a daemon.ScanCache.
         """
         self.tlist = testlist
         self.params = force_params_dict
+        self.filter = parse_filter
+        self.cache = scan_cache
+
+        self.parsetime = 0.0
+
+    def getParseTime(self):
+        """
+        The total seconds spent reading and parsing test files.
+        """
+        return self.parsetime
 
     def scanPaths(self, path_list):
         ""
@@ -37,19 +56,34 @@ class TestFileScanner:
 
         if os.path.isfile( bpath ):
             basedir,fname = os.path.split( bpath )
-            self.tlist.readTestFile( basedir, fname, self.params )
+            self._read_test_file( basedir, fname )
 
         else:
-            for root,dirs,files in os.walk( bpath ):
-                self._scan_recurse( bpath, root, dirs, files )
-
-    def _scan_recurse(self, basedir, d, dirs, files):
+            fileL = None
+            if self.cache != None:
+                fileL = self.cache.get( bpath )
+
+            if fileL == None:
+                fileL = []
+                dirL = []
+                for root,dirs,files in os.walk( bpath ):
+                    self._scan_recurse( bpath, root, dirs, files, fileL, dirL )
+                if self.cache != None:
+                    self.cache.put( bpath, dirL, fileL )
+
+            for fname in fileL:
+                if self.filter == None or self.filter( bpath, fname ):
+                    self._read_test_file( bpath, fname )
+
+    def _scan_recurse(self, basedir, d, dirs, files, fileL, dirL):
         """
         This function is given to os.walk to recursively scan a directory
         tree for test XML files.  The 'basedir' is the directory originally
-        sent to the os.walk function.
+        sent to the os.walk function.  The test files found are appended to
+        'fileL' and the directories scanned to 'dirL'.
         """
         d = os.path.normpath(d)
+        dirL.append( d )
 
         if basedir == d:
             reldir = '.'
@@ -64,8 +98,7 @@ class TestFileScanner:
             bn,ext = os.path.splitext(f)
             df = os.path.join(d,f)
             if bn and ext in ['.xml','.vvt']:
-                fname = os.path.join(reldir,f)
-                self.tlist.readTestFile( basedir, fname, self.params )
+                fileL.append( os.path.join(reldir,f) )
 
         linkdirs = []
         for subd in list(dirs):
@@ -87,4 +120,13 @@ class TestFileScanner:
         # manually recurse into soft linked directories
         for ld in linkdirs:
             for lroot,ldirs,lfiles in os.walk( ld ):
-                self._scan_recurse( basedir, lroot, ldirs, lfiles )
+                self._scan_recurse( basedir, lroot, ldirs, lfiles,
+                                    fileL, dirL )
+
+    def _read_test_file(self, basedir, fname):
+        ""
+        t0 = time.time()
+        try:
+            self.tlist.readTestFile( basedir, fname, self.params )
+        finally:
+            self.parsetime += time.time() - t0
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import sys
+
+from . import depend
+from .batchpack import get_num_procs
+from .timeout import default_timeout
+from .runhistory import RuntimeHistory
+
+
+"""
+Splits the active tests into a number of shards, such as for running parts
+of a test suite on different machines.  Tests that must run together (a
+parameterize/analyze group, the stages of a staged test, and tests
+connected by "depends on") form a group that is never split.  The groups
+are assigned longest first to the shard with the least work so far, where
+the work of a test is its number of processors times its runtime.
+
+The runtime is taken from an explicitly given runtimes file, else it is
+the timeout in the test specification (or the default timeout).  Local
+runtime data, such as the runtime history in the testing directory, is not
+used because it differs between machines.  All ties are broken by name, so
+every machine computes the same assignment from the same tests.
+"""
+
+
+def parse_shard_spec( spec ):
+    """
+    Parses "I/N" and returns the tuple ( I, N ), where 1 <= I <= N.  Raises
+    ValueError on error.
+    """
+    L = spec.strip().split( '/' )
+    try:
+        assert len(L) == 2
+        idx = int( L[0] )
+        num = int( L[1] )
+    except Exception:
+        raise ValueError( 'expected the form I/N, such as 2/4, '
+                          'got '+repr(spec) )
+
+    if num < 1 or idx < 1 or idx > num:
+        raise ValueError( 'shard index must be between one and the number '
+                          'of shards, got '+repr(spec) )
+
+    return idx, num
+
+
+def read_shard_runtimes( filename ):
+    """
+    Reads a runtime history file and returns a dict mapping test display
+    string to expected runtime.
+    """
+    hist = RuntimeHistory( filename )
+    hist.readFile()
+    return hist.getExpectedRuntimes()
+
+
+def select_shard( tcaseL, tcasemap, shard_index, num_shards, runtimes=None ):
+    """
+    Returns the list of tests in 'tcaseL' that are in the shard with index
+    'shard_index' (one based) of 'num_shards'.  The 'tcasemap' (TestSpec ID
+    to TestCase) is used to resolve dependency patterns.  If given, the
+    'runtimes' dict maps test display string to runtime.
+    """
+    shards = partition_tests( tcaseL, tcasemap, num_shards, runtimes )
+    return shards[ shard_index-1 ]
+
+
+def partition_tests( tcaseL, tcasemap, num_shards, runtimes=None ):
+    """
+    Returns a list of 'num_shards' lists of tests.
+    """
+    groupL = []
+    for tests in find_shard_groups( tcaseL, tcasemap ):
+        tests.sort( key=lambda t: t.getSpec().getDisplayString() )
+        work = 0
+        for tcase in tests:
+            work += get_num_procs( tcase ) * shard_runtime( tcase, runtimes )
+        name = tests[0].getSpec().getDisplayString()
+        groupL.append( ( -work, name, tests ) )
+
+    groupL.sort( key=lambda T: ( T[0], T[1] ) )
+
+    shards = [ [] for i in range( num_shards ) ]
+    load = [ ( 0, 0, i ) for i in range( num_shards ) ]
+
+    for negwork,name,tests in groupL:
+        work,cnt,i = min( load )
+        shards[i].extend( tests )
+        load[i] = ( work-negwork, cnt+len(tests), i )
+
+    return shards
+
+
+def shard_runtime( tcase, runtimes=None ):
+    """
+    The runtime of the test in the 'runtimes' dict, else the timeout in the
+    test specification, else the default timeout.  Only inputs that are the
+    same on every machine are used.
+    """
+    tspec = tcase.getSpec()
+
+    if runtimes:
+        rt = runtimes.get( tspec.getDisplayString(), None )
+        if rt != None:
+            return rt
+
+    tout = tspec.getTimeout()
+    if tout == None or tout < 1:
+        tout = default_timeout( tspec )
+
+    return tout
+
+
+def find_shard_groups( tcaseL, tcasemap ):
+    """
+    Partitions the tests into lists of tests that must be kept together.
+    """
+    parent = {}
+    for tcase in tcaseL:
+        parent[ id(tcase) ] = id(tcase)
+
+    def find( i ):
+        while parent[i] != i:
+            parent[i] = parent[ parent[i] ]
+            i = parent[i]
+        return i
+
+    def union( tcase1, tcase2 ):
+        if id(tcase2) in parent:
+            r1 = find( id(tcase1) )
+            r2 = find( id(tcase2) )
+            if r1 != r2:
+                parent[r1] = r2
+
+    # tests with an analyze test are kept with it, and the stages of a
+    # staged test are kept together
+    analyzeD = {}
+    for tcase in tcaseL:
+        tspec = tcase.getSpec()
+        if tspec.isAnalyze():
+            analyzeD[ ( tspec.getFilepath(), tspec.getName() ) ] = tcase
+
+    stageD = {}
+    for tcase in tcaseL:
+        tspec = tcase.getSpec()
+        key = ( tspec.getFilepath(), tspec.getName() )
+        if key in analyzeD:
+            union( tcase, analyzeD[key] )
+        if tspec.getStageID() != None:
+            key = ( tspec.getFilepath(), tspec.getExecuteDirectory() )
+            if key in stageD:
+                union( tcase, stageD[key] )
+            else:
+                stageD[key] = tcase
+
+    for tcase in tcaseL:
+        tspec = tcase.getSpec()
+        xdir = tspec.getExecuteDirectory()
+        for dep_pat,expr in tspec.getDependencies():
+            depL = depend.find_tests_by_pattern( xdir, dep_pat, tcasemap )
+            for dep_id in depL:
+                dep = tcasemap.get( dep_id, None )
+                if dep != None:
+                    union( tcase, dep )
+
+    groupD = {}
+    groupL = []
+    for tcase in tcaseL:
+        r = find( id(tcase) )
+        if r not in groupD:
+            groupD[r] = []
+            groupL.append( groupD[r] )
+        groupD[r].append( tcase )
+
+    return groupL
@@ -72,20 +72,7 @@ class BatchSLURM:
         
         x, out = self.runcmd( cmdL, workdir )
         
-        # output should contain something like the following
-        #    sbatch: Submitted batch job 291041
-        jobid = None
-        i = out.find( "Submitted batch job" )
-        if i >= 0:
-            L = out[i:].split()
-            if len(L) > 3:
-                try:
-                    jobid = int(L[3])
-                except Exception:
-                    if L[3]:
-                        jobid = L[3]
-                    else:
-                        jobid = None
+        jobid = parse_submit_output( out )
         
         if jobid == None:
             return cmd, out, None, "batch submission failed or could not parse " + \
@@ -106,6 +93,57 @@ class BatchSLURM:
         
         return cmd, out, jobid, ""
 
+    def submit_array(self, fnames, workdir, outfiles, arrayname,
+                           np, qtime, plat_attrs,
+                           queue=None, account=None, **kwargs):
+        """
+        Writes the script 'arrayname', which runs the script in 'fnames'
+        selected by SLURM_ARRAY_TASK_ID with its output going to the file in
+        'outfiles' at the same index, and submits it as an array job with a
+        single sbatch command.  Returns (cmd, out, job id list, error message).
+        The job ids are the array job id, an underscore, and the task index.
+        The job id list is None if an error occurred.
+        """
+        logfile = arrayname + '.%a'
+
+        fp = open( arrayname, 'w' )
+        try:
+            fp.write( '#!/bin/sh\n' + \
+                      self.header( np, qtime, workdir, logfile, plat_attrs ) + \
+                      '\n\ncase "$SLURM_ARRAY_TASK_ID" in\n' )
+            for i,fn in enumerate( fnames ):
+                fp.write( '  '+str(i)+') exec /bin/csh -f "'+fn+'" > "' + \
+                          outfiles[i]+'" 2>&1 ;;\n' )
+            fp.write( '  *) echo "unknown array task id '
+                      '$SLURM_ARRAY_TASK_ID"; exit 1 ;;\n' + \
+                      'esac\n' )
+        finally:
+            fp.close()
+
+        cmdL = [ 'sbatch', '--array=0-'+str( len(fnames)-1 ) ]
+        if queue != None:
+            cmdL.append('--partition='+queue)
+        if account != None:
+            cmdL.append('--account='+account)
+        if 'QoS' in kwargs and kwargs['QoS'] != None:
+            cmdL.append('--qos='+kwargs['QoS'])
+
+        cmdL.append('--workdir='+workdir)
+        cmdL.append(arrayname)
+        cmd = ' '.join( cmdL )
+
+        x, out = self.runcmd( cmdL, workdir )
+
+        jobid = parse_submit_output( out )
+
+        if jobid == None:
+            return cmd, out, None, "array submission failed or could not " + \
+                                   "parse output to obtain the job id"
+
+        jobidL = [ str(jobid)+'_'+str(i) for i in range( len(fnames) ) ]
+
+        return cmd, out, jobidL, ""
+
     def query(self, jobidL):
         """
         Determine the state of the given job ids.  Returns (cmd, out, err, stateD)
@@ -114,7 +152,8 @@ class BatchSLURM:
         not listed or it was listed but not pending or running.  The err value
         contains an error message if an error occurred when getting the states.
         """
-        cmdL = ['squeue', '--noheader', '-o', '%i %t']
+        # the tasks of array jobs are listed one per line, as <id>_<index>
+        cmdL = ['squeue', '--noheader', '--array', '-o', '%i %t']
         cmd = ' '.join( cmdL )
         x, out = self.runcmd(cmdL)
         
@@ -127,13 +166,11 @@ class BatchSLURM:
             try:
                 L = line.split()
                 if len(L) > 0:
-                    try:
+                    # python 3 would accept "<id>_<index>" as an integer
+                    if L[0].isdigit():
                         jid = int(L[0])
-                    except Exception:
-                        if L[0]:
-                            jid = L[0]
-                        else:
-                            raise
+                    else:
+                        jid = L[0]
                     st = L[1]
                     if jid in stateD:
                         if st in ['R']: st = 'running'
@@ -173,6 +210,28 @@ class BatchSLURM:
 
 #########################################################################
 
+def parse_submit_output( out ):
+    """
+    Returns the job id from the sbatch output, or None if not found.
+    """
+    # output should contain something like the following
+    #    sbatch: Submitted batch job 291041
+    jobid = None
+    i = out.find( "Submitted batch job" )
+    if i >= 0:
+        L = out[i:].split()
+        if len(L) > 3:
+            try:
+                jobid = int(L[3])
+            except Exception:
+                if L[3]:
+                    jobid = L[3]
+                else:
+                    jobid = None
+
+    return jobid
+
+
 def print3( *args ):
     sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
     sys.stdout.flush()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import time
+
+from .outpututils import pretty_time
+
+
+# seconds between samples of the system load
+DEFAULT_SAMPLE_INTERVAL = 2
+
+# launches resume once the pressure drops below this fraction of the limit
+DEFAULT_RESUME_FRACTION = 0.8
+
+
+class LoadThrottle:
+    """
+    Holds back new test launches while the CPU or memory pressure of the
+    machine is above a limit, and resumes when the pressure drops.  The
+    pressures are percentages taken from the Linux pressure stall
+    information (/proc/pressure/cpu and /proc/pressure/memory, the "some
+    avg10" value) when available.  Otherwise, the CPU pressure is the load
+    average in excess of the processors used by vvtest, as a percentage of
+    the number of cores, and the memory pressure is the percentage of memory
+    in use (from /proc/loadavg and /proc/meminfo).
+    """
+
+    def __init__(self, cpu_limit=None, mem_limit=None, numcores=1,
+                       procdir='/proc',
+                       interval=DEFAULT_SAMPLE_INTERVAL,
+                       resume_fraction=DEFAULT_RESUME_FRACTION):
+        ""
+        self.limits = { 'cpu':cpu_limit, 'mem':mem_limit }
+        self.ncores = max( 1, numcores )
+        self.procdir = procdir
+        self.interval = interval
+        self.resume = resume_fraction
+
+        self.holding = False
+        self.forced = False
+        self.tsample = None
+        self.thold = None
+        self.held = 0.0
+        self.numholds = 0
+
+    def holdLaunches(self, procs_in_use, curtime=None):
+        """
+        Returns True if new tests should not be launched now.  The
+        'procs_in_use' is the number of processors used by running tests.
+        Launches are never held if no tests are running, so that the test
+        run always makes progress.
+        """
+        tm = curtime if curtime != None else time.time()
+
+        if self.tsample == None or tm - self.tsample >= self.interval:
+            self.tsample = tm
+            self._update( procs_in_use, tm )
+
+        if self.holding and procs_in_use <= 0:
+            if not self.forced:
+                print3( 'Throttle: no tests running, launching a test '
+                        'despite the system load' )
+                self.forced = True
+            return False
+
+        return self.holding
+
+    def getHeldTime(self, curtime=None):
+        """
+        Total seconds that launches were held back.
+        """
+        tm = curtime if curtime != None else time.time()
+        if self.holding:
+            return self.held + tm - self.thold
+        return self.held
+
+    def getNumHolds(self):
+        ""
+        return self.numholds
+
+    def measure(self, procs_in_use):
+        """
+        Returns a dictionary with 'cpu' and 'mem' pressure percentages (a
+        value is None if it could not be determined).
+        """
+        cpu = read_pressure( os.path.join( self.procdir, 'pressure', 'cpu' ) )
+        if cpu == None:
+            load = read_load_average( os.path.join( self.procdir, 'loadavg' ) )
+            if load != None:
+                cpu = 100.0 * max( 0.0, load - procs_in_use ) / self.ncores
+
+        mem = read_pressure( os.path.join( self.procdir, 'pressure', 'memory' ) )
+        if mem == None:
+            total,avail = read_memory_info(
+                                os.path.join( self.procdir, 'meminfo' ) )
+            if total and avail != None:
+                mem = 100.0 * ( 1.0 - float(avail)/total )
+
+        return { 'cpu':cpu, 'mem':mem }
+
+    def _update(self, procs_in_use, tm):
+        ""
+        presD = self.measure( procs_in_use )
+
+        if self.holding:
+            if self._all_below( presD, self.resume ):
+                self.holding = False
+                self.held += tm - self.thold
+                print3( 'Throttle: resuming test launches after',
+                        pretty_time( tm - self.thold )+',',
+                        self._pressure_string( presD ) )
+        else:
+            if not self._all_below( presD, 1.0 ):
+                self.holding = True
+                self.forced = False
+                self.thold = tm
+                self.numholds += 1
+                print3( 'Throttle: holding test launches,',
+                        self._pressure_string( presD ) )
+
+    def _all_below(self, presD, fraction):
+        ""
+        for name,limit in self.limits.items():
+            val = presD.get( name, None )
+            if limit != None and val != None and val > fraction*limit:
+                return False
+        return True
+
+    def _pressure_string(self, presD):
+        ""
+        L = []
+        for name in [ 'cpu', 'mem' ]:
+            limit = self.limits[name]
+            val = presD.get( name, None )
+            if limit != None and val != None:
+                L.append( name+' pressure %.1f%% (limit %g%%)' % (val,limit) )
+        return ', '.join( L )
+
+
+def read_pressure( filename ):
+    """
+    Returns the "some avg10" percentage from a Linux pressure stall file, or
+    None if the file does not exist or cannot be parsed.
+    """
+    try:
+        fp = open( filename, 'r' )
+        try:
+            for line in fp.readlines():
+                L = line.split()
+                if len(L) > 1 and L[0] == 'some':
+                    for tok in L[1:]:
+                        if tok.startswith( 'avg10=' ):
+                            return float( tok.split('=',1)[1] )
+        finally:
+            fp.close()
+    except Exception:
+        pass
+
+    return None
+
+
+def read_load_average( filename ):
+    """
+    Returns the one minute load average, or None.
+    """
+    try:
+        fp = open( filename, 'r' )
+        try:
+            return float( fp.read().split()[0] )
+        finally:
+            fp.close()
+    except Exception:
+        return None
+
+
+def read_memory_info( filename ):
+    """
+    Returns ( MemTotal, MemAvailable ) in kilobytes, where a value is None
+    if not found.
+    """
+    total = None
+    avail = None
+
+    try:
+        fp = open( filename, 'r' )
+        try:
+            for line in fp.readlines():
+                L = line.split()
+                if len(L) >= 2:
+                    if L[0] == 'MemTotal:':
+                        total = int( L[1] )
+                    elif L[0] == 'MemAvailable:':
+                        avail = int( L[1] )
+        finally:
+            fp.close()
+    except Exception:
+        pass
+
+    return total, avail
+
+
+def print3( *args ):
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
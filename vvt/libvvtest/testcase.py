@@ -6,7 +6,10 @@ from . import depend
 from .teststatus import TestStatus
 
 
-class TestCase:
+class TestCase( object ):
+
+    __slots__ = [ 'tspec', 'texec', 'tstat', 'deps', 'depdirs',
+                  'has_dependent', 'prevresult' ]
 
     def __init__(self, testspec, testexec=None):
         ""
@@ -17,6 +20,7 @@ class TestCase:
         self.deps = []
         self.depdirs = {}  # xdir -> match pattern
         self.has_dependent = False
+        self.prevresult = None
 
     def getSpec(self):
         ""
@@ -42,6 +46,17 @@ class TestCase:
         ""
         return self.has_dependent
 
+    def setPreviousResult(self, result):
+        """
+        The result of the last recorded run of this test on this platform,
+        such as from the runtime history or the runtimes file.
+        """
+        self.prevresult = result
+
+    def getPreviousResult(self):
+        ""
+        return self.prevresult
+
     def addDependency(self, testcase, match_pattern=None, result_expr=None):
         ""
         testdep = depend.TestDependency( testcase, match_pattern, result_expr )
@@ -63,10 +78,19 @@ class TestCase:
         ""
         return len( self.deps )
 
-    def getBlockingDependency(self):
-        ""
+    def getDependencies(self):
+        """
+        Returns a list of the TestCase objects this test depends on.
+        """
+        return [ tdep.getTestCase() for tdep in self.deps ]
+
+    def getBlockingDependency(self, ignore=()):
+        """
+        Returns the first dependency TestCase that blocks this test from
+        running, or None.  Dependencies in 'ignore' are skipped.
+        """
         for tdep in self.deps:
-            if tdep.isBlocking():
+            if tdep.getTestCase() not in ignore and tdep.isBlocking():
                 return tdep.getTestCase()
 
         return None
@@ -10,6 +10,11 @@ import stat
 import tempfile
 import shutil
 
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
 from . import TestSpec
 from .paramset import ParameterSet
 from .testcase import TestCase
@@ -343,6 +348,56 @@ def string_to_test( strid ):
     return tcase
 
 
+def write_batch_specs( filename, tcaseL, rundate=None ):
+    """
+    Writes the given tests, including their fully constructed TestSpec
+    objects, in a compact binary form.  Batch jobs load this file with
+    read_batch_specs() instead of reading the test list and reparsing the
+    test source files.
+    """
+    specL = []
+    for tcase in tcaseL:
+        testdict = {}
+        insert_extended_test_info( tcase, testdict )
+        specL.append( ( tcase.getSpec(), testdict ) )
+
+    data = { 'version':version,
+             'python':sys.version_info[0],
+             'rundate':rundate,
+             'tests':specL }
+
+    fp = open( filename, 'wb' )
+    try:
+        pickle.dump( data, fp, 2 )
+    finally:
+        fp.close()
+
+
+def read_batch_specs( filename ):
+    """
+    Reads a file written by write_batch_specs() and returns the run date and
+    a list of TestCase objects.  An exception is raised if the file cannot
+    be read or was written by a different version.
+    """
+    fp = open( filename, 'rb' )
+    try:
+        data = pickle.load( fp )
+    finally:
+        fp.close()
+
+    if data.get( 'version', None ) != version or \
+       data.get( 'python', None ) != sys.version_info[0]:
+        raise Exception( 'incompatible batch test specs file: '+filename )
+
+    tcaseL = []
+    for tspec,testdict in data['tests']:
+        tcase = TestCase( tspec )
+        check_load_extended_info( tcase, testdict )
+        tcaseL.append( tcase )
+
+    return data['rundate'], tcaseL
+
+
 def insert_extended_test_info( tcase, testdict ):
     ""
     if tcase.hasDependent():
@@ -56,6 +56,14 @@ class TestRunner:
         wdir = pjoin( self.test_dir, xdir )
         texec.setRunDirectory( wdir )
 
+        idle = self.rtconfig.getAttr( 'idletimeout', None )
+        if idle:
+            watchL = []
+            if self.rtconfig.getAttr( 'logfile' ):
+                logfname = get_execution_log_filename( tcase, False )
+                watchL.append( pjoin( wdir, logfname ) )
+            texec.setIdleTimeout( idle, watchL )
+
         if not os.path.exists( wdir ):
             os.makedirs( wdir )
 
@@ -255,16 +263,42 @@ class ExecutionHandler:
 
             self.perms.set( os.path.abspath( "machinefile" ) )
 
-    def finishExecution(self, exit_status, timedout):
+    def check_bind_to_cores(self):
+        """
+        If the platform allocated cores to the test, the current (child)
+        process is pinned to them and the core list is placed in the
+        VVTEST_CPU_LIST environment variable.
+        """
+        obj = self.tcase.getExec().getResourceObject()
+        cores = getattr( obj, 'cores', None )
+
+        if cores:
+            os.environ['VVTEST_CPU_LIST'] = ','.join( [ str(c) for c in cores ] )
+            try:
+                os.sched_setaffinity( 0, cores )
+            except Exception:
+                print3( '*** warning: failed to bind test to cores',
+                        os.environ['VVTEST_CPU_LIST']+':', sys.exc_info()[1] )
+
+    def finishExecution(self, exit_status, timedout, hung=False,
+                              interrupted=False):
         ""
         tspec = self.tcase.getSpec()
         tstat = self.tcase.getStat()
 
-        if timedout > 0:
+        if hung:
+            tstat.markHung()
+        elif interrupted:
+            tstat.markInterrupted()
+        elif timedout > 0:
             tstat.markTimedOut()
         else:
             tstat.markDone( exit_status )
 
+        rusage = self.tcase.getExec().getResourceUsage()
+        if rusage != None:
+            tstat.setResourceUsage( rusage )
+
         rundir = self.tcase.getExec().getRunDirectory()
         self.perms.recurse( rundir )
 
@@ -304,6 +338,7 @@ class ExecutionHandler:
 
         self.check_run_preclean( baseline )
         self.check_write_mpi_machine_file()
+        self.check_bind_to_cores()
         self.check_set_working_files( baseline )
 
         self.set_PYTHONPATH( baseline )
@@ -312,7 +347,9 @@ class ExecutionHandler:
 
         cmd_list = self.make_execute_command( baseline, pyexe )
 
-        echo_test_execution_info( self.tcase.getSpec().getName(), cmd_list, tm )
+        obj = self.tcase.getExec().getResourceObject()
+        echo_test_execution_info( self.tcase.getSpec().getName(), cmd_list, tm,
+                                  getattr( obj, 'host', None ) )
 
         print3()
 
@@ -386,11 +423,14 @@ def get_execution_log_filename( tcase, baseline ):
     return logfname
 
 
-def echo_test_execution_info( testname, cmd_list, timeout ):
+def echo_test_execution_info( testname, cmd_list, timeout, host=None ):
     ""
     print3( "Starting test: "+testname )
     print3( "Directory    : "+os.getcwd() )
 
+    if host != None:
+        print3( "Host         : "+host )
+
     if cmd_list != None:
         print3( "Command      : "+' '.join( cmd_list ) )
 
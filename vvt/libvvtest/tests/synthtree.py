@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+"""
+Generates synthetic test trees of a given size and times the vvtest code
+paths that scale with the number of tests: scanning and parsing the test
+files, filtering, connecting dependencies, writing the test list, the
+scheduler loop, and reading the results back in.
+
+The trees are made of "blocks", each in its own directory.  A block has a
+plain script test, a test with two parameters, a staged test, a
+parameterize/analyze group, an XML parameterize/analyze group, and a chain
+of tests each depending on the previous one.  Every tenth block has the
+"slow" keyword, which is filtered out by the benchmark.
+"""
+
+import os, sys
+import time
+import json
+import platform
+import re
+
+import vvtestutils as vtu
+import testutils as util
+from testutils import print3
+
+import libvvtest.TestList as TestList
+from libvvtest.TestSpecCreator import TestCreator
+from libvvtest.RuntimeConfig import RuntimeConfig
+from libvvtest.FilterExpressions import WordExpression
+from libvvtest.filtering import TestFilter
+from libvvtest.userplugin import UserPluginBridge
+from libvvtest.scanner import TestFileScanner
+from libvvtest.execlist import TestExecList
+import libvvtest.vvplatform as vvplatform
+
+
+# the order of the timed phases in the benchmark results
+PHASES = [ 'scan', 'filter', 'write list', 'connect',
+           'schedule', 'read results' ]
+
+BLOCKS_PER_DIRECTORY = 100
+
+
+def tests_per_block( fanout=4, chain_length=5 ):
+    ""
+    return 1 + 2*fanout + 3 + (fanout+1) + (fanout+1) + chain_length
+
+
+def generate_test_tree( rootdir, numtests, fanout=4, chain_length=5 ):
+    """
+    Writes blocks of .vvt and .xml test files into 'rootdir' until at least
+    'numtests' tests would be generated.  The 'fanout' is the number of
+    values of the parameters, and 'chain_length' is the number of tests in
+    each dependency chain.  Returns the number of tests generated.
+    """
+    nblock = tests_per_block( fanout, chain_length )
+    numblocks = max( 1, ( numtests + nblock - 1 ) // nblock )
+
+    for ib in range( numblocks ):
+        bdir = os.path.join( rootdir,
+                             'd%04d' % ( ib // BLOCKS_PER_DIRECTORY ),
+                             'b%06d' % ib )
+        os.makedirs( bdir )
+        write_test_block( bdir, ib, fanout, chain_length )
+
+    return numblocks * nblock
+
+
+def write_test_block( bdir, ib, fanout, chain_length ):
+    ""
+    keys = 'bench block'+str(ib)
+    if ib % 10 == 0:
+        keys += ' slow'
+
+    vals = ' '.join( [ 's'+str(i) for i in range(fanout) ] )
+
+    write_script( bdir, 'plain', keys, [] )
+
+    write_script( bdir, 'param', keys,
+                  [ 'parameterize : np = 1 2',
+                    'parameterize : size = '+vals ] )
+
+    write_script( bdir, 'staged', keys,
+                  [ 'parameterize (staged) : np = 1 2 1' ] )
+
+    write_script( bdir, 'anal', keys,
+                  [ 'parameterize : size = '+vals,
+                    'analyze : -a' ] )
+
+    write_file( bdir, 'xmlgrp.xml', """\
+<rtest name="xmlgrp">
+  <keywords> """+keys+""" </keywords>
+  <parameterize size=\""""+vals+"""\"/>
+  <execute> true </execute>
+  <analyze> true </analyze>
+</rtest>
+""" )
+
+    for i in range( chain_length ):
+        specs = []
+        if i > 0:
+            specs.append( 'depends on : chain'+str(i-1) )
+        write_script( bdir, 'chain'+str(i), keys, specs )
+
+
+def write_script( bdir, name, keywords, specs ):
+    ""
+    lines = [ '#!/bin/sh', '#VVT: keywords : '+keywords ]
+    lines.extend( [ '#VVT: '+spec for spec in specs ] )
+    lines.append( 'exit 0' )
+    write_file( bdir, name+'.vvt', '\n'.join( lines ) + '\n' )
+
+
+def write_file( bdir, fname, content ):
+    ""
+    fp = open( os.path.join( bdir, fname ), 'w' )
+    try:
+        fp.write( content )
+    finally:
+        fp.close()
+
+
+class TreeBenchmark:
+    """
+    Times the vvtest phases on a test tree.  The tests are not launched;
+    in the scheduler loop, each test is started and finished immediately
+    (a no-op command), so only the bookkeeping of vvtest is measured.
+    """
+
+    def __init__(self, srcdir, test_dir, numprocs=8):
+        ""
+        self.srcdir = os.path.abspath( srcdir )
+        self.test_dir = os.path.abspath( test_dir )
+        self.numprocs = numprocs
+
+        self.times = {}
+        self.counts = {}
+        self.parsetime = 0.0
+
+    def run(self):
+        ""
+        tfile = os.path.join( self.test_dir, 'testlist' )
+
+        rtconfig = RuntimeConfig(
+                        keyword_expr=WordExpression( 'not slow' ),
+                        platform_name=vtu.core_platform_name(),
+                        vvtestdir=vtu.vvtdir,
+                        configdir=vtu.cfgdir,
+                        option_list=[] )
+        creator = TestCreator( rtconfig.platformName(), [] )
+        plug = UserPluginBridge( rtconfig, None )
+        testfilter = TestFilter( rtconfig, plug )
+        perms = vtu.make_fake_PermissionSetter()
+
+        tlist = TestList.TestList( tfile, rtconfig, creator, testfilter )
+
+        t0 = time.time()
+        scan = TestFileScanner( tlist )
+        scan.scanPaths( [ self.srcdir ] )
+        self.parsetime = scan.getParseTime()
+        self._mark( 'scan', t0 )
+        self.counts['scanned'] = len( tlist.getTests() )
+
+        t0 = time.time()
+        tlist.applyPermanentFilters()
+        tlist.determineActiveTests()
+        self._mark( 'filter', t0 )
+        self.counts['active'] = tlist.numActive()
+
+        t0 = time.time()
+        tlist.stringFileWrite()
+        self._mark( 'write list', t0 )
+
+        plat = vvplatform.Platform( vtu.vvtdir, {} )
+        plat.initProcs( self.numprocs, self.numprocs )
+
+        t0 = time.time()
+        xlist = TestExecList( plug, tlist )
+        xlist.createTestExecs( self.test_dir, plat, rtconfig, perms )
+        self._mark( 'connect', t0 )
+
+        t0 = time.time()
+        tlist.initializeResultsFile()
+        try:
+            run_noop_scheduler_loop( tlist, xlist, plat )
+        finally:
+            tlist.writeFinished()
+        self._mark( 'schedule', t0 )
+        self.counts['run'] = xlist.numDone()
+
+        t0 = time.time()
+        tlist2 = TestList.TestList( tfile, rtconfig, creator, testfilter )
+        tlist2.readTestList()
+        tlist2.readTestResults()
+        self._mark( 'read results', t0 )
+        self.counts['read'] = len( tlist2.getTests() )
+
+    def getTimes(self):
+        ""
+        return dict( self.times )
+
+    def getCounts(self):
+        ""
+        return dict( self.counts )
+
+    def getResults(self, **extra):
+        """
+        Returns a dictionary suitable for writing as JSON.
+        """
+        D = { 'vvtest_version': get_vvtest_version(),
+              'python': platform.python_version(),
+              'hostname': platform.node(),
+              'date': time.strftime( "%Y-%m-%d %H:%M:%S" ),
+              'numprocs': self.numprocs,
+              'counts': self.getCounts(),
+              'times': self.getTimes(),
+              'parse_time': round( self.parsetime, 6 ) }
+        D.update( extra )
+        return D
+
+    def writeSummary(self):
+        ""
+        for name in PHASES:
+            if name in self.times:
+                s = '%-14s %10.3f sec' % ( name, self.times[name] )
+                if name == 'scan':
+                    s += '  (parse %.3f)' % self.parsetime
+                print3( s )
+
+    def _mark(self, name, t0):
+        ""
+        self.times[ name ] = round( time.time() - t0, 6 )
+
+
+def run_noop_scheduler_loop( tlist, xlist, plat ):
+    """
+    Same as the loop in execute.run_test_list() but each test finishes the
+    moment it is started.  The running tests are finished once no more
+    tests can be started, so the processor accounting is exercised.
+    """
+    running = []
+
+    while True:
+        tcase = xlist.popNext( plat )
+
+        if tcase != None:
+            np = int( tcase.getSpec().getParameters().get( 'np', 0 ) )
+            job = plat.obtainProcs( np )
+            tcase.getStat().markStarted( time.time() )
+            tlist.appendTestResult( tcase )
+            running.append( ( tcase, job ) )
+
+        elif xlist.numRunning() == 0:
+            break
+
+        else:
+            for tc,job in running:
+                tc.getStat().markDone( 0 )
+                plat.giveProcs( job )
+                xlist.testDone( tc )
+            running = []
+
+
+def benchmark_test_tree( numtests, workdir='.', numprocs=8,
+                         fanout=4, chain_length=5, jsonfile=None ):
+    """
+    Generates a tree with about 'numtests' tests in 'workdir', runs the
+    benchmark, prints a summary, and returns the results dictionary (which
+    is also written to 'jsonfile', if given).
+    """
+    srcdir = os.path.join( workdir, 'synthtree' )
+    test_dir = os.path.join( workdir, 'TestResults.synthtree' )
+
+    t0 = time.time()
+    ngen = generate_test_tree( srcdir, numtests, fanout, chain_length )
+    tgen = time.time() - t0
+
+    bench = TreeBenchmark( srcdir, test_dir, numprocs )
+    bench.run()
+
+    D = bench.getResults( numtests=ngen, fanout=fanout,
+                          chain_length=chain_length,
+                          generate_time=round( tgen, 6 ) )
+
+    print3( 'Benchmark of', ngen, 'generated tests:' )
+    bench.writeSummary()
+
+    if jsonfile:
+        fp = open( jsonfile, 'w' )
+        try:
+            json.dump( D, fp, indent=2, sort_keys=True )
+        finally:
+            fp.close()
+
+    return D
+
+
+def get_vvtest_version():
+    ""
+    m = re.search( r'\nversion\s*=\s*[\'"]([^\'"]*)[\'"]',
+                   util.readfile( vtu.vvtest_file ) )
+    if m:
+        return m.group(1)
+    return None
@@ -10,7 +10,7 @@ import time
 
 RESULTS_KEYWORDS = [ 'notrun', 'notdone',
                      'fail', 'diff', 'pass',
-                     'timeout', 'skip' ]
+                     'timeout', 'hung', 'skip' ]
 
 
 # this is the exit status that tests use to indicate a diff
@@ -38,10 +38,24 @@ SKIP_REASON = {
         'nobaseline'         : 'no rebaseline specification',
         'depskip'            : 'analyze dependency skipped',
         'tsum'               : 'cummulative runtime exceeded',
+        'shard'              : 'in another shard',
+        'impact'             : 'not affected by the changed files',
     }
 
+# reason given for tests that were interrupted by the inactivity watchdog
+HUNG_REASON = 'no output or CPU activity'
 
-class TestStatus:
+# reason given for running tests that were interrupted by --fail-fast
+INTERRUPTED_REASON = 'interrupted after too many failures'
+
+# resource usage attributes of a finished test: user and system CPU seconds,
+# maximum resident set size in kilobytes, and block input/output operations
+RESOURCE_ATTRS = [ 'utime', 'stime', 'maxrss', 'inblock', 'oublock' ]
+
+
+class TestStatus( object ):
+
+    __slots__ = [ 'tspec' ]
 
     def __init__(self, testspec):
         ""
@@ -52,6 +66,11 @@ class TestStatus:
         self.tspec.setAttr( 'state', 'notrun' )
         self.tspec.removeAttr( 'xtime' )
         self.tspec.removeAttr( 'xdate' )
+        self.tspec.removeAttr( 'hung' )
+        self.tspec.removeAttr( 'interrupted' )
+        self.tspec.removeAttr( 'cached' )
+        for name in RESOURCE_ATTRS:
+            self.tspec.removeAttr( name )
 
     def getResultsKeywords(self):
         ""
@@ -74,6 +93,8 @@ class TestStatus:
         if result != None:
             if result == 'timeout':
                 kL.append( 'fail' )
+                if self.isHung():
+                    kL.append( 'hung' )
             kL.append( result )
 
         return kL
@@ -140,6 +161,14 @@ class TestStatus:
         ""
         self.tspec.setAttr( 'skip', 'tsum' )
 
+    def markSkipByShard(self):
+        ""
+        self.tspec.setAttr( 'skip', 'shard' )
+
+    def markSkipByChangeImpact(self):
+        ""
+        self.tspec.setAttr( 'skip', 'impact' )
+
     def markSkipByUserValidation(self, reason):
         ""
         self.tspec.setAttr( 'skip', reason )
@@ -243,11 +272,113 @@ class TestStatus:
         self.markDone( 1 )
         self.tspec.setAttr( 'result', 'timeout' )
 
+    def markHung(self):
+        """
+        A hung test is a timeout that was detected by inactivity rather than
+        by exceeding the timeout value.
+        """
+        self.markTimedOut()
+        self.tspec.setAttr( 'hung', True )
+
+    def isHung(self):
+        ""
+        return self.tspec.getAttr( 'result', None ) == 'timeout' and \
+               self.tspec.getAttr( 'hung', False )
+
+    def markInterrupted(self):
+        """
+        An interrupted test is a timeout caused by vvtest stopping early
+        (see --fail-fast) rather than by the test itself.
+        """
+        self.markTimedOut()
+        self.tspec.setAttr( 'interrupted', True )
+
+    def isInterrupted(self):
+        ""
+        return self.tspec.getAttr( 'result', None ) == 'timeout' and \
+               self.tspec.getAttr( 'interrupted', False )
+
+    def getReasonForTimeout(self):
+        ""
+        if self.isHung():
+            return HUNG_REASON
+        if self.isInterrupted():
+            return INTERRUPTED_REASON
+        return None
+
+    def markPassedFromCache(self, start_time, cache_key):
+        """
+        The test passed before with the same inputs (see the result cache),
+        so it is marked as passed without being run.  The 'cache_key' is a
+        (shortened) hash of the test inputs.
+        """
+        self.tspec.setAttr( 'state', 'done' )
+        self.tspec.setAttr( 'xdate', int( 100 * start_time ) * 0.01 )
+        self.setRuntime( 0 )
+        self.tspec.setAttr( 'result', 'pass' )
+        self.tspec.setAttr( 'cached', cache_key )
+
+    def getCacheKey(self, *default):
+        """
+        The cache key of a test that was passed from the result cache.
+        """
+        if len( default ) > 0:
+            return self.tspec.getAttr( 'cached', default[0] )
+        return self.tspec.getAttr( 'cached' )
+
+    def setResourceUsage(self, rusage):
+        """
+        Sets the resource attributes from a resource.struct_rusage object,
+        such as returned by os.wait4().
+        """
+        maxrss = rusage.ru_maxrss
+        if sys.platform == 'darwin':
+            maxrss = int( maxrss / 1024 )  # bytes on Mac, kilobytes elsewhere
+
+        self.tspec.setAttr( 'utime', round( rusage.ru_utime, 2 ) )
+        self.tspec.setAttr( 'stime', round( rusage.ru_stime, 2 ) )
+        self.tspec.setAttr( 'maxrss', int( maxrss ) )
+        self.tspec.setAttr( 'inblock', int( rusage.ru_inblock ) )
+        self.tspec.setAttr( 'oublock', int( rusage.ru_oublock ) )
+
+    def getResourceUsage(self):
+        """
+        Returns a dictionary of the resource attributes that are set, which
+        is empty if the test has not run or the usage was not recorded.
+        """
+        useD = {}
+        for name in RESOURCE_ATTRS:
+            val = self.tspec.getAttr( name, None )
+            if val != None:
+                useD[ name ] = val
+        return useD
+
+    def getCPUTime(self, *default):
+        """
+        The user plus system CPU time of a finished test.
+        """
+        ut = self.tspec.getAttr( 'utime', None )
+        st = self.tspec.getAttr( 'stime', None )
+        if ut == None or st == None:
+            if len( default ) > 0:
+                return default[0]
+            raise KeyError( "CPU time attributes not set" )
+        return ut + st
+
+    def getMaxMemory(self, *default):
+        """
+        The maximum resident set size (in kilobytes) of a finished test.
+        """
+        if len( default ) > 0:
+            return self.tspec.getAttr( 'maxrss', default[0] )
+        return self.tspec.getAttr( 'maxrss' )
+
 
 def copy_test_results( to_tcase, from_tcase ):
     ""
     for k,v in from_tcase.getSpec().getAttrs().items():
-        if k in ['state','xtime','xdate','result']:
+        if k in ['state','xtime','xdate','result','hung','cached'] or \
+           k in RESOURCE_ATTRS:
             to_tcase.getSpec().setAttr( k, v )
 
 
@@ -5,14 +5,17 @@
 # Government retains certain rights in this software.
 
 import os, sys
+import math
 
 from .fmtresults import LookupCache
+from . import runhistory
 
 
 class TimeHandler:
 
     def __init__(self, userplugin, platobj, cmdline_timeout,
-                       timeout_multiplier, max_timeout):
+                       timeout_multiplier, max_timeout,
+                       timeout_quantile=None):
         ""
         self.plugin = userplugin
         self.platobj = platobj
@@ -20,15 +23,32 @@ class TimeHandler:
         self.tmult = timeout_multiplier
         self.maxtime = max_timeout
 
-    def load(self, tlist):
+        self.quantile = timeout_quantile
+        if self.quantile == None:
+            self.quantile = runhistory.DEFAULT_TIMEOUT_QUANTILE
+
+    def getPlatformID(self):
+        ""
+        return self.platobj.getName()+'/'+self.platobj.getCompiler()
+
+    def load(self, tlist, history=None):
         """
         For each test, a 'runtimes' file will be read (if it exists) and the
         run time for this platform extracted.  This run time is saved as the
         test execute time.  Also, a timeout is calculated for each test and
         placed in the 'timeout' attribute.
+
+        If a RuntimeHistory is given and has samples for a test, then the
+        expected runtime is used as the test execute time, and the timeout
+        is computed from the upper quantile of the runtime samples.
+
+        The memory requirement of each test (in kilobytes) is placed in the
+        'memory' attribute, taken from the test specification or else from
+        the peak memory in the history.
         """
         pname = self.platobj.getName()
         cplr = self.platobj.getCompiler()
+        platid = self.getPlatformID()
 
         cache = LookupCache( pname, cplr, self.platobj.testingDirectory() )
 
@@ -41,8 +61,21 @@ class TimeHandler:
                 # grab explicit timeout value, if the test specifies it
                 tout = tspec.getTimeout()
 
-            # look for a previous runtime value
-            tlen,tresult = cache.getRunTime( tspec )
+            tlen = None
+            if history != None:
+                np = runhistory.get_num_procs( tspec )
+                tlen,tupper,tresult = history.predict( platid, np,
+                                                tspec.getDisplayString(),
+                                                self.quantile )
+                if tupper != None:
+                    tupper = int( math.ceil( tupper ) )
+
+            if tlen == None:
+                # look for a previous runtime value
+                tlen,tresult = cache.getRunTime( tspec )
+                tupper = tlen
+
+            tcase.setPreviousResult( tresult )
 
             if tlen != None:
 
@@ -52,9 +85,9 @@ class TimeHandler:
 
                 if tout == None:
                     if tresult == "timeout":
-                        tout = self._timeout_if_test_timed_out( tlen )
+                        tout = self._timeout_if_test_timed_out( tspec, tupper )
                     else:
-                        tout = self._timeout_from_previous_runtime( tlen )
+                        tout = self._timeout_from_previous_runtime( tupper )
 
             elif tout == None:
                 tout = self._default_timeout( tspec )
@@ -63,12 +96,45 @@ class TimeHandler:
 
             tcase.getSpec().setAttr( 'timeout', tout )
 
+            mem = self._memory_requirement( tspec, history, platid )
+            if mem != None:
+                tspec.setAttr( 'memory', mem )
+
         cache = None
 
-    def _timeout_if_test_timed_out(self, runtime):
+    def readRuntimeHistory(self, test_dir):
+        """
+        Creates and returns a RuntimeHistory object for this platform, read
+        from the testing directory (if defined) or the given test results
+        directory.
+        """
+        fn = runhistory.get_history_filename( self.platobj.testingDirectory(),
+                                              test_dir )
+        history = runhistory.RuntimeHistory( fn )
+        try:
+            history.readFile()
+        except Exception:
+            print3( '*** warning: failed to read runtime history file:',
+                    sys.exc_info()[1] )
+
+        return history
+
+    def recordRuntimeHistory(self, history, tlist, since):
+        """
+        Adds the runtimes of the tests that finished after the 'since' epoch
+        date to the history, then writes the history file.
+        """
+        if history.recordResults( tlist, self.getPlatformID(), since ) > 0:
+            try:
+                history.writeFile()
+            except Exception:
+                print3( '*** warning: failed to write runtime history file:',
+                        sys.exc_info()[1] )
+
+    def _timeout_if_test_timed_out(self, tspec, runtime):
         ""
         # for tests that timed out, make timeout much larger
-        if t.hasKeyword( "long" ):
+        if tspec.hasKeyword( "long" ):
             # only long tests get timeouts longer than an hour
             if runtime < 60*60:
                 tm = 4*60*60
@@ -95,15 +161,26 @@ class TimeHandler:
 
         return tm
 
+    def _memory_requirement(self, tspec, history, platid):
+        """
+        The recorded peak memory is the maximum resident size of the largest
+        process of the test, not the sum over its processes.  So for a
+        parallel test, the requirement is approximated as np times that.
+        """
+        mem = tspec.getMemory()
+
+        if mem == None and history != None:
+            np = runhistory.get_num_procs( tspec )
+            rss = history.predictMemory( platid, np, tspec.getDisplayString() )
+            if rss != None:
+                # allow for some variability in the peak memory
+                mem = int( math.ceil( 1.1*rss*max( 1, np ) ) )
+
+        return mem
+
     def _default_timeout(self, tspec):
         ""
-        # with no information, the default depends on 'long' keyword
-        if tspec.hasKeyword("long"):
-            tm = 5*60*60  # five hours
-        else:
-            tm = 60*60  # one hour
-
-        return tm
+        return default_timeout( tspec )
 
     def _apply_timeout_options(self, timeout):
         ""
@@ -118,3 +195,18 @@ class TimeHandler:
 
         return timeout
 
+
+def default_timeout( tspec ):
+    ""
+    # with no information, the default depends on 'long' keyword
+    if tspec.hasKeyword("long"):
+        tm = 5*60*60  # five hours
+    else:
+        tm = 60*60  # one hour
+
+    return tm
+
+
+def print3( *args ):
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
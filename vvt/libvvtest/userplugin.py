@@ -82,6 +82,26 @@ class UserPluginBridge:
 
         return pyexe
 
+    def testCacheSalt(self, tcase):
+        """
+        Returns None or a string that is added to the inputs of the test
+        when computing its result cache hash (see the --result-cache option).
+        """
+        rtn = None
+        if self.cachesalt != None:
+            specs = self._make_test_to_user_interface_dict( tcase )
+            try:
+                rtn = self.cachesalt( specs )
+                if rtn != None:
+                    rtn = str( rtn )
+            except Exception:
+                xs,tb = capture_traceback( sys.exc_info() )
+                self._check_print_exc( xs, tb )
+                # do not reuse results when the salt is unknown
+                raise UserPluginError( 'test_cache_salt() failed: '+xs )
+
+        return rtn
+
     def _probe_for_functions(self):
         ""
         self.validate = None
@@ -96,6 +116,10 @@ class UserPluginBridge:
         if self.plugin and hasattr( self.plugin, 'test_preload' ):
             self.preload = self.plugin.test_preload
 
+        self.cachesalt = None
+        if self.plugin and hasattr( self.plugin, 'test_cache_salt' ):
+            self.cachesalt = self.plugin.test_cache_salt
+
     def _check_print_exc(self, xs, tb):
         ""
         if xs not in self.exc_uniq:
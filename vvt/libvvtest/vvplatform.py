@@ -23,6 +23,15 @@ class Platform:
         self.nprocs = 0
         self.nfree = 0
 
+        self.maxmem = None  # kilobytes, or None if memory is not limited
+        self.freemem = 0
+
+        self.cores = None  # a CoreAllocator if tests are bound to cores
+
+        self.throttle = None  # a LoadThrottle if launches adapt to the load
+
+        self.hosts = None  # a HostPool if tests are run on a list of hosts
+
         self.platname = None
         self.cplrname = None
 
@@ -39,12 +48,28 @@ class Platform:
     def getCompiler(self): return self.cplrname
     def getOptions(self): return self.optdict
     def getMaxProcs(self): return self.maxprocs
+    def getMaxMemory(self): return self.maxmem
+    def getLoadThrottle(self): return self.throttle
+    def getHostPool(self): return self.hosts
+
+    def getNodeSize(self):
+        """
+        The number of processors per node of the batch system, or one if
+        there is no batch system.
+        """
+        if self.batch != None:
+            return max( 1, int( getattr( self.batch, 'ppn', 1 ) ) )
+        return 1
 
     def display(self):
         s = "Platform " + self.platname
+        if self.maxmem != None:
+            s += ", max memory = " + str( int( self.maxmem/1024 ) ) + " MB"
         if self.nprocs > 0:
             s += ", num procs = " + str(self.nprocs)
         s += ", max procs = " + str(self.maxprocs)
+        if self.hosts != None:
+            s += ", hosts = " + self.hosts.getDescription()
         print3( s )
 
     def getEnvironment(self):
@@ -149,6 +174,32 @@ class Platform:
         
         return jobid
 
+    def Qsubmit_array(self, workdir, outfiles, scriptnames, arrayname,
+                            np, queue_time):
+        """
+        Submits the scripts as one array job, if the batch system supports
+        it.  Returns the list of job ids, or None if the batch system does not
+        support arrays or the submission failed.
+        """
+        if not hasattr( self.batch, 'submit_array' ):
+            return None
+
+        q = self.attrs.get( 'queue', None )
+        acnt = self.attrs.get( 'account', None )
+        qt = self.attrs.get( 'walltime', queue_time )
+        cmd, out, jobidL, err = \
+                self.batch.submit_array( scriptnames, workdir, outfiles,
+                                         arrayname, np, qt, self.attrs,
+                                         q, acnt )
+        if err:
+            print3( cmd + os.linesep + out + os.linesep + err )
+            return None
+
+        for i,scriptname in enumerate( scriptnames ):
+            print3( "Job script", scriptname, "submitted with id", jobidL[i] )
+
+        return jobidL
+
     def Qquery(self, jobidL):
         """
         """
@@ -194,32 +245,142 @@ class Platform:
 
         self.nfree = self.nprocs
 
-    def queryProcs(self, np):
+    def initHostPool(self, hostlist):
+        """
+        If 'hostlist' is given (a list of ( host name, num procs )), the tests
+        are run on those hosts, which must share the file system with this
+        machine.  The number of processors becomes the total over the hosts,
+        and the maximum is the size of the largest host.  The ssh program can
+        be set with the VVTEST_SSH environment variable.  Not done for batch
+        systems.
+        """
+        if hostlist and self.batch == None and '--qsub-id' not in self.optdict:
+            from .hostpool import HostPool
+            pool = HostPool( hostlist, os.environ.get( 'VVTEST_SSH', None ) )
+            pool.connect( os.getcwd() )
+
+            self.hosts = pool
+            self.maxprocs = pool.maxHostProcs()
+            self.nprocs = pool.numProcs()
+            self.nfree = pool.numFree()
+
+    def initMemory(self, set_max):
+        """
+        Determines the amount of memory (in kilobytes) available to tests.
+
+            1. Use 'set_max' if not None
+            2. The "maxmemory" attribute if set by the platform plugin
+            3. Try to probe the system
+
+        If none of these work, or for batch systems or a pool of hosts, memory
+        is not limited.
+        """
+        if self.hosts != None:
+            return
+
+        if set_max == None:
+            mx = self.attrs.get( 'maxmemory', None )
+            if mx != None:
+                mx = parse_memory_size( mx )
+            elif self.batch == None:
+                mx = probe_max_memory()
+            self.maxmem = mx
+        else:
+            self.maxmem = int( set_max )
+
+        if self.maxmem != None:
+            self.freemem = self.maxmem
+
+    def initCores(self, bind):
+        """
+        If 'bind' is true (or the "bindcores" attribute is set by the platform
+        plugin), each test is pinned to a set of cores not used by any other
+        running test.  Binding is not done for batch systems or if the
+        process affinity cannot be set on this system.
+        """
+        if bind or self.attrs.get( 'bindcores', False ):
+            if self.batch == None and '--qsub-id' not in self.optdict and \
+               self.hosts == None and hasattr( os, 'sched_setaffinity' ):
+                self.cores = CoreAllocator( probe_numa_nodes() )
+
+    def initLoadThrottle(self, cpu_limit, mem_limit):
+        """
+        If either limit is not None, new test launches are held back while
+        the CPU or memory pressure on the machine is above the limit (a
+        percentage).  Not done for batch systems.
+        """
+        if cpu_limit != None or mem_limit != None:
+            if self.batch == None and '--qsub-id' not in self.optdict and \
+               self.hosts == None:
+                from .sysload import LoadThrottle
+                ncores = probe_max_processors() or self.maxprocs
+                self.throttle = LoadThrottle( cpu_limit, mem_limit, ncores )
+
+    def holdLaunches(self):
         """
+        True if new tests should not be started now due to load on the
+        machine from other processes.
+        """
+        if self.throttle == None:
+            return False
+        return self.throttle.holdLaunches( self.nprocs - self.nfree )
+
+    def queryProcs(self, np, memory=None):
+        """
+        True if 'np' processors and 'memory' kilobytes are available.  A
+        memory of None means the test did not specify a requirement.
         """
         if np <= 0: np = 1
-        return np <= self.nfree
+        if self.hosts != None:
+            return self.hosts.query( np )
+        return np <= self.nfree and self.queryMemory( memory )
 
-    def obtainProcs(self, np):
+    def queryMemory(self, memory):
+        ""
+        if memory == None or self.maxmem == None or self._serialBatchJob():
+            return True
+        return memory <= self.freemem
+
+    def obtainProcs(self, np, memory=None):
         """
         """
         if np <= 0: np = 1
 
-        if '--qsub-id' in self.optdict:
+        machine = os.uname()[1].strip()
+        slots = min( np, self.nprocs )
+
+        host = None
+        if self.hosts != None:
+            host = self.hosts.obtain( np )
+            self.nfree = self.hosts.numFree()
+            machine = host.getName()
+            slots = min( np, host.numProcs() )
+        elif self._serialBatchJob():
             assert self.nfree > 0
             self.nfree = 0
         else:
             self.nfree = max( 0, self.nfree - np )
+            if memory != None and self.maxmem != None:
+                self.freemem = max( 0, self.freemem - memory )
+
+        job_info = JobInfo( np, memory )
 
-        job_info = JobInfo( np )
+        if host != None:
+            job_info.host = host.getName()
+            job_info.launcher = self.hosts.getLauncher( host )
+
+        if self.cores != None:
+            job_info.cores = self.cores.allocate( np )
 
         pf = self.attrs.get( 'mpifile', '' )
         if pf == 'hostfile':
             # use OpenMPI style machine file
             job_info.mpi_opts = "--hostfile machinefile"
-            slots = min( np, self.nprocs )
-            job_info.machinefile = \
-                        os.uname()[1].strip() + " slots=" + str(slots) + '\n'
+            job_info.machinefile = machine + " slots=" + str(slots) + '\n'
+            if job_info.cores:
+                job_info.mpi_opts += " --cpu-set " + \
+                        make_cpu_list_string( job_info.cores ) + \
+                        " --bind-to core"
 
         elif pf == 'machinefile':
             # use MPICH style machine file
@@ -227,6 +388,9 @@ class Platform:
             job_info.machinefile = ''
             for i in range(np):
                 job_info.machinefile += machine + '\n'
+            if job_info.cores:
+                job_info.mpi_opts += " -bind-to user:" + \
+                        make_cpu_list_string( job_info.cores )
 
         mpiopts = self.attrs.get( 'mpiopts', '' )
         if mpiopts:
@@ -240,11 +404,26 @@ class Platform:
         np = job_info.np
         assert np > 0
 
-        if '--qsub-id' in self.optdict:
+        if self.hosts != None:
+            self.hosts.release( job_info.host, np )
+            self.nfree = self.hosts.numFree()
+        elif self._serialBatchJob():
             assert self.nfree == 0
             self.nfree = 1
         else:
             self.nfree = min( self.nprocs, self.nfree + np )
+            mem = job_info.memory
+            if mem != None and self.maxmem != None:
+                self.freemem = min( self.maxmem, self.freemem + mem )
+            if job_info.cores and self.cores != None:
+                self.cores.release( job_info.cores )
+
+    def _serialBatchJob(self):
+        """
+        Inside a batch job, the tests are run one at a time unless the job
+        was given a number of processors (-n) to pack its tests into.
+        """
+        return '--qsub-id' in self.optdict and '-n' not in self.optdict
 
     # ----------------------------------------------------------------
 
@@ -281,7 +460,9 @@ class Platform:
 def create_Platform_instance( vvtestdir, platname, platopts, usenv,
                               numprocs, maxprocs,
                               onopts, offopts,
-                              qsubid ):
+                              qsubid, maxmemory=None, bindcores=False,
+                              throttle_cpu=None, throttle_mem=None,
+                              hosts=None ):
     """
     This function is an adaptor around construct_Platform(), which passes
     through the command line arguments as a dictionary.  This design is
@@ -296,6 +477,11 @@ def create_Platform_instance( vvtestdir, platname, platopts, usenv,
     if onopts:           optdict['-o']         = onopts
     if offopts:          optdict['-O']         = offopts
     if qsubid != None:   optdict['--qsub-id']  = qsubid
+    if maxmemory != None: optdict['--max-memory'] = maxmemory
+    if bindcores:        optdict['--bind-cores'] = True
+    if throttle_cpu != None: optdict['--throttle-cpu'] = throttle_cpu
+    if throttle_mem != None: optdict['--throttle-mem'] = throttle_mem
+    if hosts:            optdict['--hosts'] = hosts
 
     return construct_Platform( vvtestdir, optdict )
 
@@ -374,6 +560,11 @@ def construct_Platform( vvtestdir, optdict, **kwargs ):
             platform_plugin.initialize( plat )
 
     plat.initProcs( optdict.get( '-n', None ), optdict.get( '-N', None ) )
+    plat.initHostPool( optdict.get( '--hosts', None ) )
+    plat.initMemory( optdict.get( '--max-memory', None ) )
+    plat.initCores( optdict.get( '--bind-cores', False ) )
+    plat.initLoadThrottle( optdict.get( '--throttle-cpu', None ),
+                           optdict.get( '--throttle-mem', None ) )
 
     return plat
 
@@ -386,11 +577,150 @@ class JobInfo:
     processor request, including a string to give to the mpirun command, if
     any.  It is returned to the Platform when the job finishes.
     """
-    def __init__(self, np):
+    def __init__(self, np, memory=None):
         self.np = np
+        self.memory = memory
+        self.cores = None  # list of core ids if the job is bound to cores
+        self.host = None  # the host name if run on a pool of hosts
+        self.launcher = None  # a RemoteLauncher if run on a pool of hosts
         self.mpi_opts = ''
 
 
+class CoreAllocator:
+    """
+    Hands out disjoint sets of processor cores.  The cores are grouped by
+    NUMA node, and a request is satisfied from a single node if possible.
+    """
+
+    def __init__(self, nodes):
+        """
+        The 'nodes' is a list of lists of core ids, one list per NUMA node.
+        """
+        self.nodes = [ list(L) for L in nodes if len(L) > 0 ]
+        self.free = [ set(L) for L in self.nodes ]
+
+        self.nodemap = {}  # core id -> node index
+        for i,L in enumerate( self.nodes ):
+            for core in L:
+                self.nodemap[ core ] = i
+
+    def numCores(self):
+        ""
+        return len( self.nodemap )
+
+    def numFree(self):
+        ""
+        return sum( [ len(fS) for fS in self.free ] )
+
+    def allocate(self, np):
+        """
+        Returns a sorted list of 'np' free core ids, or None if there are not
+        enough free cores.  The smallest node that can hold all the cores
+        is used, otherwise the cores are taken from the nodes with the most
+        free cores.
+        """
+        if np <= 0: np = 1
+
+        if np > self.numFree():
+            return None
+
+        fit = None
+        for i,fS in enumerate( self.free ):
+            if len(fS) >= np:
+                if fit == None or len(fS) < len( self.free[fit] ):
+                    fit = i
+
+        if fit != None:
+            idxL = [ fit ]
+        else:
+            idxL = list( range( len(self.free) ) )
+            idxL.sort( key=lambda i: -len( self.free[i] ) )
+
+        cores = []
+        for i in idxL:
+            take = sorted( self.free[i] )[ : np-len(cores) ]
+            self.free[i].difference_update( take )
+            cores.extend( take )
+            if len(cores) == np:
+                break
+
+        cores.sort()
+        return cores
+
+    def release(self, cores):
+        ""
+        for core in cores:
+            i = self.nodemap.get( core, None )
+            if i != None:
+                self.free[i].add( core )
+
+
+def probe_numa_nodes():
+    """
+    Returns a list of lists of core ids, one list for each NUMA node, using
+    /sys/devices/system/node.  Only cores this process may run on are
+    included.  If the probe fails, a single node is returned.
+    """
+    avail = None
+    if hasattr( os, 'sched_getaffinity' ):
+        try:
+            avail = set( os.sched_getaffinity(0) )
+        except Exception:
+            avail = None
+
+    nodeL = []
+
+    ndir = '/sys/devices/system/node'
+    if os.path.isdir( ndir ):
+        try:
+            nums = []
+            for fn in os.listdir( ndir ):
+                if re.match( 'node[0-9]+$', fn ):
+                    nums.append( int( fn[4:] ) )
+            nums.sort()
+            for n in nums:
+                fp = open( os.path.join( ndir, 'node'+str(n), 'cpulist' ), 'r' )
+                try:
+                    cores = parse_cpu_list( fp.read() )
+                finally:
+                    fp.close()
+                if avail != None:
+                    cores = [ c for c in cores if c in avail ]
+                if len(cores) > 0:
+                    nodeL.append( cores )
+        except Exception:
+            nodeL = []
+
+    if len( nodeL ) == 0:
+        if avail != None:
+            nodeL = [ sorted( avail ) ]
+        else:
+            nodeL = [ list( range( probe_max_processors() or 1 ) ) ]
+
+    return nodeL
+
+
+def parse_cpu_list( cpulist ):
+    """
+    Converts a Linux CPU list string, such as "0-3,8-11", to a list of ints.
+    """
+    cores = []
+    for tok in cpulist.strip().split(','):
+        tok = tok.strip()
+        if tok:
+            if '-' in tok:
+                a,b = tok.split('-',1)
+                cores.extend( range( int(a), int(b)+1 ) )
+            else:
+                cores.append( int(tok) )
+    return cores
+
+
+def make_cpu_list_string( cores ):
+    ""
+    return ','.join( [ str(c) for c in cores ] )
+
+
 def probe_max_processors():
     """
     Tries to determine the number of processors on the current machine.  On
@@ -426,6 +756,67 @@ def probe_max_processors():
     return mx
 
 
+def probe_max_memory():
+    """
+    Tries to determine the physical memory of the current machine, in
+    kilobytes.  On Linux systems, it uses /proc/meminfo.  On OSX systems, it
+    uses sysctl.  Returns None if the probe failed.
+    """
+    mx = None
+
+    if os.uname()[0].startswith( 'Darwin' ):
+        try:
+            fp = os.popen( 'sysctl -n hw.memsize 2>/dev/null' )
+            s = fp.read().strip()
+            fp.close()
+            mx = int( int(s) / 1024 )
+        except:
+            mx = None
+
+    if mx == None and os.path.exists( '/proc/meminfo' ):
+        try:
+            fp = open( '/proc/meminfo', 'r' )
+            for line in fp.readlines():
+                L = line.split()
+                if len(L) >= 2 and L[0] == 'MemTotal:':
+                    mx = int( L[1] )
+                    break
+            fp.close()
+        except:
+            mx = None
+
+    return mx
+
+
+memory_units = { 'K':1, 'M':1024, 'G':1024*1024, 'T':1024*1024*1024 }
+
+def parse_memory_size( value ):
+    """
+    Converts a memory size to an integer number of kilobytes.  A plain number
+    is in megabytes, or a K, M, G, or T suffix can be given (with an
+    optional B), such as "512", "1.5G", or "200MB".  A ValueError is raised
+    if the value cannot be converted or is not positive.
+    """
+    sval = str(value).strip().upper()
+    if sval.endswith( 'B' ):
+        sval = sval[:-1]
+
+    mult = 1024
+    if sval and sval[-1] in memory_units:
+        mult = memory_units[ sval[-1] ]
+        sval = sval[:-1]
+
+    try:
+        kb = int( float( sval ) * mult + 0.5 )
+    except Exception:
+        raise ValueError( 'invalid memory size: '+repr(value) )
+
+    if kb <= 0:
+        raise ValueError( 'memory size must be positive: '+repr(value) )
+
+    return kb
+
+
 ##########################################################################
 
 # determine the directory containing the current file
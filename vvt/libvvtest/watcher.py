@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import glob
+from os.path import join as pjoin
+
+from .errors import TestSpecError
+from .impact import InputIndex, test_key, is_glob_pattern
+from .testlistio import test_to_string, string_to_test
+
+
+"""
+Watches the files used by a set of tests for changes, for the vvtest --watch
+mode.  The tests are parsed once and kept in memory, together with an
+InputIndex of their input files (not written to disk).  The modification
+time and size of each input file (or of each file under an input directory,
+or matching an input glob pattern) is polled, so no file system notification
+support is needed.
+
+When a changed file affects a test, the test is parsed again so that changes
+to its specification (such as a new linked file) are picked up.
+"""
+
+# seconds between checks of the input files
+POLL_INTERVAL = 2
+
+
+class InputWatcher:
+
+    def __init__(self, creator):
+        """
+        The 'creator' is a TestCreator used to parse the tests.
+        """
+        self.creator = creator
+
+        self.index = InputIndex( None )
+        self.tests = {}   # test key -> test string from test_to_string()
+        self.stats = {}   # file -> ( modification time, size )
+
+    def getIndex(self):
+        ""
+        return self.index
+
+    def numTests(self):
+        ""
+        return len( self.tests )
+
+    def numFiles(self):
+        ""
+        return len( self.stats )
+
+    def addTests(self, tcaseL):
+        """
+        Parses and starts watching the tests in 'tcaseL', such as the tests
+        read from a test list file.  Tests that fail to parse are not watched
+        (with a warning).
+        """
+        keyL = []
+        for tcase in tcaseL:
+            key = test_key( tcase.getSpec() )
+            self.tests[ key ] = test_to_string( tcase )
+            keyL.append( key )
+
+        for key,msg in self._parse_tests( keyL ):
+            print3( '*** warning: not watching test', key+':', msg )
+            self.tests.pop( key )
+
+        self.stats = self._snapshot()
+
+    def poll(self):
+        """
+        Returns a sorted list of the files modified, created or removed since
+        the last poll (or since the tests were added).
+        """
+        cur = self._snapshot()
+
+        changed = set()
+        for fn,st in cur.items():
+            if self.stats.get( fn, None ) != st:
+                changed.add( fn )
+        for fn in self.stats.keys():
+            if fn not in cur:
+                changed.add( fn )
+
+        self.stats = cur
+
+        changed = list( changed )
+        changed.sort()
+
+        return changed
+
+    def refresh(self, changed):
+        """
+        Parses the tests affected by the 'changed' files again, and starts
+        watching any new input files.  Returns the set of affected test keys.
+        If a test fails to parse, a TestSpecError is raised (after the other
+        tests are refreshed).
+        """
+        keyL = [ k for k in self.index.findTests( changed ) if k in self.tests ]
+
+        errL = self._parse_tests( keyL )
+
+        for fn,st in self._snapshot().items():
+            if fn not in self.stats:
+                self.stats[fn] = st
+
+        if len( errL ) > 0:
+            key,msg = errL[0]
+            raise TestSpecError( 'failed to parse test '+key+': '+msg )
+
+        return set( keyL )
+
+    def _parse_tests(self, keyL):
+        """
+        Parses each test from its test string (so the specification starts
+        out empty), and updates the index.  Returns a list of ( key, message )
+        for each test that failed to parse.
+        """
+        errL = []
+
+        tcaseL = []
+        for key in keyL:
+            tcase = string_to_test( self.tests[key] )
+            try:
+                self.creator.reparse( tcase.getSpec() )
+            except TestSpecError:
+                errL.append( ( key, str( sys.exc_info()[1] ) ) )
+            else:
+                tcaseL.append( tcase )
+
+        self.index.update( tcaseL )
+
+        return errL
+
+    def _snapshot(self):
+        ""
+        stats = {}
+
+        for path in self.index.getInputFiles():
+            if is_glob_pattern( path ):
+                pathL = glob.glob( path )
+            else:
+                pathL = [ path ]
+
+            for path in pathL:
+                if os.path.isdir( path ):
+                    for dirpath,dirnames,filenames in os.walk( path ):
+                        for fn in filenames:
+                            add_file_stat( stats, pjoin( dirpath, fn ) )
+                else:
+                    add_file_stat( stats, path )
+
+        return stats
+
+
+def add_file_stat( stats, filename ):
+    ""
+    try:
+        st = os.stat( filename )
+    except OSError:
+        pass
+    else:
+        stats[ filename ] = ( st.st_mtime, st.st_size )
+
+
+def print3( *args ):
+    ""
+    sys.stdout.write( ' '.join( [ str(arg) for arg in args ] ) + '\n' )
+    sys.stdout.flush()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+# Copyright 2018 National Technology & Engineering Solutions of Sandia, LLC
+# (NTESS). Under the terms of Contract DE-NA0003525 with NTESS, the U.S.
+# Government retains certain rights in this software.
+
+import os, sys
+import time
+import json
+import shutil
+
+
+class WorkQueue:
+    """
+    A list of work items shared by batch jobs, where each item is a list of
+    test names (execute directories).  The queue is a directory containing
+
+        items   : one JSON list of test names per line
+        claimed : one line per claimed item, "<item index> <owner>"
+
+    Items are handed out in order.  Claiming is serialized with a
+    DirectoryLock.
+    """
+
+    def __init__(self, directory, lock_timeout=5*60):
+        ""
+        self.qdir = directory
+
+        self.itemsfile = os.path.join( directory, 'items' )
+        self.claimfile = os.path.join( directory, 'claimed' )
+        self.lock = DirectoryLock( os.path.join( directory, 'lock' ),
+                                   lock_timeout )
+
+    def create(self, items):
+        """
+        Writes a new queue containing the given lists of test names.
+        """
+        if os.path.exists( self.qdir ):
+            shutil.rmtree( self.qdir )
+        os.makedirs( self.qdir )
+
+        fp = open( self.itemsfile, 'w' )
+        try:
+            for names in items:
+                fp.write( json.dumps( list( names ) ) + '\n' )
+        finally:
+            fp.close()
+
+        fp = open( self.claimfile, 'w' )
+        fp.close()
+
+    def getDirectory(self):
+        ""
+        return self.qdir
+
+    def claim(self, owner):
+        """
+        Takes the next unclaimed item off the queue and returns its list of
+        test names, or None if all items have been claimed.
+        """
+        self.lock.acquire()
+        try:
+            idx = self._num_claimed()
+            names = self._read_item( idx )
+            if names != None:
+                fp = open( self.claimfile, 'a' )
+                try:
+                    fp.write( str(idx) + ' ' + str(owner) + '\n' )
+                finally:
+                    fp.close()
+        finally:
+            self.lock.release()
+
+        return names
+
+    def numItems(self):
+        ""
+        return len( _read_lines( self.itemsfile ) )
+
+    def getItems(self):
+        """
+        Returns the list of all the items (each a list of test names).
+        """
+        return [ json.loads( line ) for line in _read_lines( self.itemsfile ) ]
+
+    def getClaims(self):
+        """
+        Returns a list of ( item index, owner ) for the claimed items.
+        """
+        claims = []
+        for line in _read_lines( self.claimfile ):
+            idx,owner = line.split( ' ', 1 )
+            claims.append( ( int(idx), owner ) )
+        return claims
+
+    def _num_claimed(self):
+        ""
+        return len( _read_lines( self.claimfile ) )
+
+    def _read_item(self, idx):
+        ""
+        lines = _read_lines( self.itemsfile )
+        if idx < len( lines ):
+            return json.loads( lines[idx] )
+        return None
+
+
+
+class DirectoryLock:
+    """
+    A lock shared by processes (possibly on different machines), which is
+    held while the lock directory exists.  Creating a directory is atomic
+    on shared (NFS) file systems where file locks may not be.
+    """
+
+    def __init__(self, lockdir, lock_timeout=5*60):
+        ""
+        self.lockdir = lockdir
+        self.lock_timeout = lock_timeout
+
+    def acquire(self):
+        ""
+        while True:
+            try:
+                os.mkdir( self.lockdir )
+                return
+            except OSError:
+                if not os.path.isdir( os.path.dirname(
+                                        os.path.abspath( self.lockdir ) ) ):
+                    raise
+
+            self._break_stale_lock()
+            time.sleep( 0.05 )
+
+    def release(self):
+        ""
+        os.rmdir( self.lockdir )
+
+    def _break_stale_lock(self):
+        """
+        A process that dies while holding the lock would stop all the other
+        processes, so a lock older than the timeout is removed.
+        """
+        try:
+            age = time.time() - os.path.getmtime( self.lockdir )
+            if age > self.lock_timeout:
+                os.rmdir( self.lockdir )
+        except OSError:
+            pass
+
+
+def _read_lines( filename ):
+    ""
+    fp = open( filename, 'r' )
+    try:
+        lines = [ line.strip() for line in fp.readlines() ]
+    finally:
+        fp.close()
+    return [ line for line in lines if line ]
@@ -11,7 +11,6 @@ which returns a root XmlNode object.
 '''
 
 import sys
-sys.dont_write_bytecode = True
 sys.excepthook = sys.__excepthook__
 import os
 import re
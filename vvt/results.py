@@ -123,6 +123,8 @@ Lists all the test results in the given file sorted by date.
 
 -p    List the platform/compiler combinations present in the file rather
       than listing all the test results.
+-c    Sort the test results by CPU time (user plus system), largest first.
+-m    Sort the test results by maximum resident memory, largest first.
 """
 
 clean_help = """
@@ -264,7 +266,7 @@ def list_main( argv ):
     import getopt
     
     try:
-      optL,argL = getopt.getopt( sys.argv[2:], "p" )
+      optL,argL = getopt.getopt( sys.argv[2:], "pcm" )
     except getopt.error:
       sys.stderr.write( "*** results.py error: " + \
                         str(sys.exc_info()[1]) + os.linesep )
@@ -671,11 +673,23 @@ def write_runtimes( optD, fileL ):
 
 ########################################################################
 
+def listing_sort_key( aD, optD ):
+    """
+    the test date, or the resource usage if -c or -m is given
+    """
+    if '-c' in optD:
+      return aD.get( 'utime', 0 ) + aD.get( 'stime', 0 )
+    elif '-m' in optD:
+      return aD.get( 'maxrss', 0 )
+    return aD['xdate']
+
+
 def results_listing( fname, optD ):
     """
     by default, lists the tests by date
     the -p option means list the platform/compilers referenced by at least one
     test
+    the -c and -m options sort by CPU time and max memory, respectively
     """
     fmt,vers,hdr,nskip = fmtresults.read_file_header( fname )
     
@@ -695,7 +709,7 @@ def results_listing( fname, optD ):
           for tn in src.testList(d):
             aD = src.testAttrs(d,tn)
             if 'xdate' in aD:
-              tL.append( ( aD['xdate'], tn, d, aD ) )
+              tL.append( ( listing_sort_key( aD, optD ), tn, d, aD ) )
         tL.sort()
         tL.reverse()
         for xdate,tn,d,aD in tL:
@@ -723,7 +737,7 @@ def results_listing( fname, optD ):
             for pc in src.platformList(d,tn):
               aD = src.testAttrs(d,tn,pc)
               if 'xdate' in aD:
-                tL.append( ( aD['xdate'], tn, d, pc, aD ) )
+                tL.append( ( listing_sort_key( aD, optD ), tn, d, pc, aD ) )
         tL.sort()
         tL.reverse()
         for xdate,tn,d,pc,aD in tL: